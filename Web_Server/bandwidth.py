@@ -0,0 +1,374 @@
+import itertools
+import json
+import os
+import re
+import threading
+import time
+
+# 下载带宽整形：全局和每个客户端 IP 各有一个令牌桶限制发送速率；同时进行的大文件传输按加权公平排队（WFQ）
+# 分配带宽，每个客户端的权重由它的各个传输平分，打开多个下载不能多占带宽。
+# 接口调用、缩略图、小文件等交互请求不排队，只从令牌桶中扣除发送的字节，因而优先于大文件传输。
+# 限速为 0 表示不限制；全局和客户端限速都为 0 时不包装响应体（保留 sendfile 零拷贝）。
+# 多进程部署时每个工作进程各自限速，配置通过 config_path 文件在进程间同步
+
+# 每次申请发送的字节数：越小速率越平滑，调度开销越大
+QUANTUM = 64 * 1024
+# 令牌桶容量（按速率计算的秒数），决定空闲之后允许的突发量
+BURST_SECONDS = 0.25
+# 等待令牌的最长时间（秒），之后重新检查（配置可能已修改）
+MAX_WAIT = 0.25
+# 重新读取配置文件的间隔（秒）
+RELOAD_INTERVAL = 1.0
+# 不活跃客户端的清理间隔（秒）
+PRUNE_INTERVAL = 60
+
+DEFAULT_CONFIG = {
+    # 全局与每个客户端的限速（字节/秒），0 表示不限制
+    'global_limit': 0,
+    'client_limit': 0,
+    # 不超过该大小（字节）的响应视为交互请求，不排队
+    'interactive_size': 1024 * 1024,
+    # 在线预览（inline、HLS）与普通下载的权重
+    'preview_weight': 4,
+    'bulk_weight': 1,
+}
+
+_SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+# 解析字节数：整数，或带 K/M/G/T 单位的字符串（如 "10M"、"512KiB"，按 1024 计）
+def parse_size(value):
+    if isinstance(value, bool):
+        raise ValueError(f'无效的大小: {value}')
+    if isinstance(value, (int, float)):
+        size = value
+    else:
+        match = _SIZE_PATTERN.match(str(value))
+        if not match:
+            raise ValueError(f'无效的大小: {value}')
+        size = float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()]
+    if size < 0:
+        raise ValueError(f'大小不能为负数: {value}')
+    return int(size)
+
+
+def _parse_weight(value):
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'无效的权重: {value}')
+    if not 0 < weight <= 1000:
+        raise ValueError(f'权重必须在 (0, 1000] 范围内: {value}')
+    return weight
+
+
+# 校验并规范化配置（只包含给出的键），未知的键或无效的值抛出 ValueError
+def normalize_config(values):
+    config = {}
+    for key, value in values.items():
+        if key not in DEFAULT_CONFIG:
+            raise ValueError(f'未知的配置项: {key}')
+        config[key] = _parse_weight(value) if key.endswith('_weight') else parse_size(value)
+    return config
+
+
+class TokenBucket:
+    def __init__(self, rate=0):
+        self.rate = 0
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    @property
+    def capacity(self):
+        return max(self.rate * BURST_SECONDS, QUANTUM)
+
+    def set_rate(self, rate):
+        unlimited = self.rate <= 0
+        self.rate = rate
+        if rate > 0:
+            # 从不限速切换为限速时从满桶开始
+            self.tokens = self.capacity if unlimited else min(self.tokens, self.capacity)
+
+    def refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.capacity)
+        self.updated = now
+
+    # 余额为正即可发送（允许透支一次），长期速率仍等于 rate，且申请量可以超过桶容量
+    def available(self):
+        return self.rate <= 0 or self.tokens > 0
+
+    def consume(self, amount):
+        if self.rate > 0:
+            self.tokens -= amount
+
+    # 余额恢复为正所需的时间（秒）
+    def delay(self):
+        return 0.0 if self.available() else -self.tokens / self.rate
+
+    def full(self):
+        return self.rate <= 0 or self.tokens >= self.capacity
+
+
+class _Client:
+    def __init__(self, address, rate):
+        self.address = address
+        self.bucket = TokenBucket(rate)
+        self.transfers = 0
+
+
+class Transfer:
+    def __init__(self, client, kind, weight):
+        self.client = client
+        self.kind = kind
+        self.weight = weight
+        # 该传输上一次申请的虚拟完成时间
+        self.finish_tag = 0.0
+        self.sent = 0
+        self.waited = 0.0
+        self.started = time.monotonic()
+
+
+class _Request:
+    __slots__ = ('tag', 'sequence', 'transfer', 'size', 'event', 'granted')
+
+    def __init__(self, tag, sequence, transfer, size):
+        self.tag = tag
+        self.sequence = sequence
+        self.transfer = transfer
+        self.size = size
+        self.event = threading.Event()
+        self.granted = False
+
+
+class BandwidthScheduler:
+    # config: 初始配置（见 DEFAULT_CONFIG）；config_path 非空时从该文件读取运行时修改的配置，
+    # update() 时写入该文件，其他工作进程在 RELOAD_INTERVAL 内读取到新配置
+    def __init__(self, config=None, config_path=''):
+        self.config_path = config_path
+        self.defaults = dict(DEFAULT_CONFIG, **normalize_config(config or {}))
+        self.config = dict(self.defaults)
+        self._lock = threading.Lock()
+        self._global = TokenBucket()
+        self._clients = {}
+        self._waiting = []
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+        self._transfers = set()
+        self._config_mtime = None
+        self._checked = 0.0
+        self._pruned = time.monotonic()
+        self._apply(self.config)
+        self.refresh(force=True)
+
+    @property
+    def enabled(self):
+        return self.config['global_limit'] > 0 or self.config['client_limit'] > 0
+
+    @property
+    def active_transfers(self):
+        return len(self._transfers)
+
+    def _apply(self, config):
+        with self._lock:
+            self.config = config
+            self._global.set_rate(config['global_limit'])
+            for client in self._clients.values():
+                client.bucket.set_rate(config['client_limit'])
+            # 限速放宽后立即放行满足条件的等待者
+            self._dispatch(time.monotonic())
+
+    # 配置文件被其他进程修改时重新读取（最多每 RELOAD_INTERVAL 秒检查一次）
+    def refresh(self, force=False):
+        if not self.config_path:
+            return
+        now = time.monotonic()
+        if not force and now - self._checked < RELOAD_INTERVAL:
+            return
+        self._checked = now
+        try:
+            mtime = os.stat(self.config_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._config_mtime:
+            return
+        self._config_mtime = mtime
+        config = dict(self.defaults)
+        if mtime is not None:
+            try:
+                with open(self.config_path, encoding='utf-8') as f:
+                    config.update(normalize_config(json.load(f)))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 读取带宽配置失败: {e}")
+                return
+        self._apply(config)
+
+    # 修改配置（只需给出要修改的键），保存到配置文件，返回修改后的完整配置
+    def update(self, values):
+        config = dict(self.config, **normalize_config(values))
+        if self.config_path:
+            temp_path = f'{self.config_path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=2)
+            os.replace(temp_path, self.config_path)
+            self._config_mtime = os.stat(self.config_path).st_mtime_ns
+        self._apply(config)
+        return dict(config)
+
+    def weight(self, kind):
+        return self.config.get(f'{kind}_weight', self.config['bulk_weight'])
+
+    def _client(self, address, now):
+        client = self._clients.get(address)
+        if client is None:
+            client = self._clients[address] = _Client(address, self.config['client_limit'])
+            client.bucket.updated = now
+        if now - self._pruned > PRUNE_INTERVAL:
+            self._prune(now)
+        return client
+
+    # 删除没有进行中的传输且令牌桶已满（没有透支）的客户端
+    def _prune(self, now):
+        self._pruned = now
+        for address, client in list(self._clients.items()):
+            client.bucket.refill(now)
+            if client.transfers == 0 and client.bucket.full():
+                del self._clients[address]
+
+    # 开始一个需要排队的传输，kind 为 'preview' 或 'bulk'
+    def open(self, address, kind):
+        with self._lock:
+            client = self._client(address, time.monotonic())
+            client.transfers += 1
+            transfer = Transfer(client, kind, self.weight(kind))
+            self._transfers.add(transfer)
+            return transfer
+
+    def close(self, transfer):
+        with self._lock:
+            if transfer in self._transfers:
+                self._transfers.discard(transfer)
+                transfer.client.transfers -= 1
+
+    # 交互请求：不等待，只扣除发送的字节（透支部分由之后的大文件传输等待补回）
+    def charge(self, address, size):
+        if not self.enabled or size <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._global.refill(now)
+            self._global.consume(size)
+            bucket = self._client(address, now).bucket
+            bucket.refill(now)
+            bucket.consume(size)
+
+    # 申请发送 size 字节，阻塞到全局和该客户端的令牌桶都有余额，并且轮到该传输
+    def acquire(self, transfer, size):
+        if not self.enabled:
+            transfer.sent += size
+            return
+        started = time.monotonic()
+        with self._lock:
+            # 虚拟时间按权重推进：权重越大，同样的字节数推进越少，越早被放行
+            weight = transfer.weight / max(transfer.client.transfers, 1)
+            start = max(self._virtual_time, transfer.finish_tag)
+            transfer.finish_tag = start + size / weight
+            request = _Request(transfer.finish_tag, next(self._sequence), transfer, size)
+            self._waiting.append(request)
+            delay = self._dispatch(started)
+        try:
+            while not request.granted:
+                request.event.wait(delay)
+                with self._lock:
+                    if request.granted:
+                        break
+                    delay = self._dispatch(time.monotonic())
+        finally:
+            if not request.granted:
+                with self._lock:
+                    if request in self._waiting:
+                        self._waiting.remove(request)
+        transfer.sent += size
+        transfer.waited += time.monotonic() - started
+
+    # 按虚拟完成时间从小到大放行等待者（须持有锁），返回下次检查前应等待的时间
+    def _dispatch(self, now):
+        self._global.refill(now)
+        delay = MAX_WAIT
+        remaining = []
+        self._waiting.sort(key=lambda request: (request.tag, request.sequence))
+        for index, request in enumerate(self._waiting):
+            if not self._global.available():
+                delay = min(delay, self._global.delay())
+                remaining.extend(self._waiting[index:])
+                break
+            bucket = request.transfer.client.bucket
+            bucket.refill(now)
+            if not bucket.available():
+                # 该客户端已达到限速，后面其他客户端的请求可以先发送
+                delay = min(delay, bucket.delay())
+                remaining.append(request)
+                continue
+            self._global.consume(request.size)
+            bucket.consume(request.size)
+            self._virtual_time = max(self._virtual_time, request.tag)
+            request.granted = True
+            request.event.set()
+        self._waiting = remaining
+        return max(delay, 0.001)
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            transfers = [{
+                'client': transfer.client.address,
+                'kind': transfer.kind,
+                'sent': transfer.sent,
+                'waited': round(transfer.waited, 3),
+                'rate': int(transfer.sent / max(now - transfer.started, 0.001))
+            } for transfer in self._transfers]
+        return {'enabled': self.enabled, 'config': dict(self.config), 'transfers': transfers}
+
+
+# 按调度器限速发送的响应体：把原响应体的数据切成 QUANTUM 大小逐块申请发送，关闭时结束传输。
+# length 为响应的 Content-Length（未知时为 None），发送到该长度即停止：file_wrapper 从 Range 起点读到文件末尾，
+# 原本由服务器的 sendfile 按 Content-Length 截断，包装后需要在这里截断。
+# on_close(transfer) 可选，在传输结束时调用（用于记录指标）
+class ShapedBody:
+    def __init__(self, scheduler, transfer, body, length=None, on_close=None):
+        self.scheduler = scheduler
+        self.transfer = transfer
+        self.body = body
+        self.length = length
+        self.on_close = on_close
+        self._closed = False
+
+    def __iter__(self):
+        remaining = self.length
+        if remaining == 0:
+            return
+        for chunk in self.body:
+            if remaining is not None and len(chunk) > remaining:
+                chunk = chunk[:remaining]
+            for offset in range(0, len(chunk), QUANTUM):
+                piece = chunk[offset:offset + QUANTUM] if len(chunk) > QUANTUM else chunk
+                self.scheduler.acquire(self.transfer, len(piece))
+                yield piece
+            if remaining is not None:
+                remaining -= len(chunk)
+                if remaining <= 0:
+                    return
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.scheduler.close(self.transfer)
+            if self.on_close is not None:
+                self.on_close(self.transfer)
@@ -0,0 +1,219 @@
+import errno
+import os
+import sqlite3
+import threading
+
+# 不支持硬链接的文件系统返回的错误码
+LINK_UNSUPPORTED_ERRNOS = {errno.EPERM, errno.EXDEV, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP}
+
+TABLES = '''
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS blobs_inode ON blobs (dev, ino);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('total_size', 0);
+CREATE TRIGGER IF NOT EXISTS blobs_insert AFTER INSERT ON blobs BEGIN
+    UPDATE meta SET value = value + NEW.size WHERE key = 'total_size';
+END;
+CREATE TABLE IF NOT EXISTS aliases (
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    target TEXT NOT NULL,
+    PRIMARY KEY (sha256, size)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS aliases_target ON aliases (target);
+CREATE TRIGGER IF NOT EXISTS blobs_delete AFTER DELETE ON blobs BEGIN
+    UPDATE meta SET value = value - OLD.size WHERE key = 'total_size';
+    DELETE FROM aliases WHERE target = OLD.sha256;
+END;
+'''
+
+
+# 内容寻址的去重存储
+# 文件内容按 SHA-256 只保存一份（root/ab/cd/<sha256>），用户可见的文件是指向它的硬链接，
+# 引用计数即 inode 的链接数：最后一个用户文件删除后（仅剩存储区自身的链接）才释放空间。
+# 内容的大小和 inode 记录在 SQLite 数据库（db_path，WAL 模式）中，多个工作进程共享；
+# 存入、链接、释放在同一个写事务中操作文件系统，写事务的锁同时用作进程间的互斥锁。
+# 上传时被改写过的内容（如 faststart 重排）记录原始内容 (sha256, size) 到存储内容的别名，
+# 相同原始内容再次上传或秒传时链接到改写后的内容；别名随目标内容释放一起删除
+class BlobStore:
+    def __init__(self, root, db_path):
+        self.root = root
+        self.db_path = db_path
+        self.enabled = True
+        self._local = threading.local()
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    # 每个线程一个连接；fork 出的工作进程不能使用父进程的连接，按进程号区分
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            try:
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('PRAGMA synchronous=NORMAL')
+            except sqlite3.DatabaseError:
+                connection.close()
+                raise
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    # 写事务（BEGIN IMMEDIATE，其他进程的写事务等待）
+    def _write(self, func):
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(connection)
+            connection.execute('COMMIT')
+            return result
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def start(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.enabled = self._probe_hard_links()
+        if not self.enabled:
+            print(f"⚠️ 存储目录不支持硬链接，已关闭内容去重")
+            return
+        try:
+            self._connect().executescript(TABLES)
+        except sqlite3.DatabaseError as e:
+            print(f"⚠️ 去重存储数据库损坏，从磁盘重建: {e}")
+            self._local.connection.close()
+            self._local.connection = None
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
+            self._connect().executescript(TABLES)
+        self._write(self._sync)
+
+    # 与磁盘对账：清理没有任何用户文件引用的孤立内容，补充缺失的记录，删除文件已不存在的记录
+    def _sync(self, connection):
+        known = {sha256: (size, dev, ino) for sha256, size, dev, ino in
+                 connection.execute('SELECT sha256, size, dev, ino FROM blobs')}
+        for dirpath, _, filenames in os.walk(self.root):
+            for sha256 in filenames:
+                path = os.path.join(dirpath, sha256)
+                stat = os.stat(path)
+                if stat.st_nlink <= 1:
+                    os.remove(path)
+                    continue
+                row = (stat.st_size, stat.st_dev, stat.st_ino)
+                if known.pop(sha256, None) != row:
+                    connection.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+                    connection.execute('INSERT INTO blobs (sha256, size, dev, ino) VALUES (?, ?, ?, ?)',
+                                       (sha256,) + row)
+        connection.executemany('DELETE FROM blobs WHERE sha256 = ?', [(sha256,) for sha256 in known])
+
+    def _probe_hard_links(self):
+        source = os.path.join(self.root, '.link-probe')
+        target = source + '.link'
+        try:
+            with open(source, 'wb'):
+                pass
+            os.link(source, target)
+            os.remove(target)
+            return True
+        except OSError as e:
+            if e.errno in LINK_UNSUPPORTED_ERRNOS:
+                return False
+            raise
+        finally:
+            if os.path.exists(source):
+                os.remove(source)
+
+    # 去重存储占用的空间（由触发器维护）
+    @property
+    def total_size(self):
+        if not self.enabled:
+            return 0
+        return self._connect().execute("SELECT value FROM meta WHERE key = 'total_size'").fetchone()[0]
+
+    # 根据用户文件的 stat 结果反查内容哈希，非去重存储的文件返回 None
+    def content_id(self, stat):
+        if not self.enabled:
+            return None
+        row = self._connect().execute('SELECT sha256 FROM blobs WHERE dev = ? AND ino = ?',
+                                      (stat.st_dev, stat.st_ino)).fetchone()
+        return row[0] if row else None
+
+    # 保存临时文件并在 dest 创建指向内容的硬链接；内容已存在时直接丢弃临时文件。
+    # alias 为临时文件改写前的 (sha256, size)，在同一事务中记录别名。
+    # 返回 True 表示命中已有内容（未占用新的存储空间）
+    def store(self, temp_path, sha256, dest, alias=None):
+        if not self.enabled:
+            os.replace(temp_path, dest)
+            return False
+
+        blob_path = self.blob_path(sha256)
+
+        def store_blob(connection):
+            existed = connection.execute('SELECT 1 FROM blobs WHERE sha256 = ?', (sha256,)).fetchone() is not None
+            if not existed:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                # 以硬链接代替重命名：路径已存在时失败而不是替换 inode，已有的用户文件仍与其共享内容
+                try:
+                    os.link(temp_path, blob_path)
+                except FileExistsError:
+                    existed = True
+                else:
+                    # 内容被多个文件共享，禁止通过任一链接原地修改
+                    os.chmod(blob_path, 0o444)
+                    stat = os.stat(blob_path)
+                    connection.execute('INSERT OR REPLACE INTO blobs (sha256, size, dev, ino) VALUES (?, ?, ?, ?)',
+                                       (sha256, stat.st_size, stat.st_dev, stat.st_ino))
+            if alias is not None:
+                connection.execute('INSERT OR REPLACE INTO aliases (sha256, size, target) VALUES (?, ?, ?)',
+                                   alias + (sha256,))
+            os.remove(temp_path)
+            os.link(blob_path, dest)
+            return existed
+        return self._write(store_blob)
+
+    # 为已有内容创建新的硬链接（无需传输文件内容），(sha256, size) 为别名时链接到改写后的内容。
+    # 返回实际链接的内容哈希；内容不存在或大小不符时返回 None
+    def link(self, sha256, size, dest):
+        if not self.enabled:
+            return None
+
+        def link_blob(connection):
+            row = connection.execute('SELECT target FROM aliases WHERE sha256 = ? AND size = ?',
+                                     (sha256, size)).fetchone()
+            if row is not None:
+                target = row[0]
+            else:
+                row = connection.execute('SELECT size FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+                if row is None or row[0] != size:
+                    return None
+                target = sha256
+            os.link(self.blob_path(target), dest)
+            return target
+        return self._write(link_blob)
+
+    # 用户文件删除后调用：内容不再被任何用户文件引用时释放存储空间
+    def release(self, sha256):
+        blob_path = self.blob_path(sha256)
+
+        def release_blob(connection):
+            try:
+                stat = os.stat(blob_path)
+            except FileNotFoundError:
+                connection.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+                return False
+            if stat.st_nlink > 1:
+                return False
+            os.remove(blob_path)
+            connection.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+            return True
+        return self._write(release_blob)
@@ -0,0 +1,260 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from upload_stream import UploadError
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# 写入分块时每次读取请求体的大小
+COPY_BUFFER_SIZE = 1024 * 1024
+# 会话 ID（uuid4 十六进制），用于拼接会话文件路径前必须校验
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+# 把有序的分块序号合并为字节区间 [[start, end), ...]
+def chunks_to_ranges(chunks, chunk_size, total_size):
+    ranges = []
+    for index in sorted(chunks):
+        start = index * chunk_size
+        end = min(start + chunk_size, total_size)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+# 分块上传会话管理
+# 每个会话对应 sessions_dir 下的 <id>.part（预分配大小的数据文件）和 <id>.json（会话状态），
+# 分块可乱序、并发写入（按偏移量定位写），服务重启后会话仍可继续；超时未更新的会话由后台线程清理。
+# 会话状态只保存在磁盘上，每次操作重新读取，多个工作进程处理同一会话的请求；
+# 修改状态时对数据文件加 flock 排他锁（同一进程内的不同线程分别打开文件，同样互斥）
+class UploadSessionManager:
+    def __init__(self, sessions_dir, max_size, session_ttl=24 * 3600, gc_interval=600):
+        self.sessions_dir = sessions_dir
+        self.max_size = max_size
+        self.session_ttl = session_ttl
+        self.gc_interval = gc_interval
+        # 不支持 flock 的平台只在进程内互斥
+        self._lock = threading.Lock()
+        self._gc_thread = None
+        self._stop_event = threading.Event()
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.sessions_dir, upload_id + '.part')
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.sessions_dir, upload_id + '.json')
+
+    def start(self):
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        self.collect_garbage()
+        self.start_background()
+
+    # 启动后台清理线程；fork 出的工作进程中需要重新调用
+    def start_background(self):
+        if not self.gc_interval:
+            return
+        if self._gc_thread is None or not self._gc_thread.is_alive():
+            self._gc_thread = threading.Thread(target=self._gc_loop, name='upload-session-gc', daemon=True)
+            self._gc_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    # 原子写入会话状态文件
+    def _save(self, session):
+        data = dict(session, received=sorted(session['received']))
+        temp_path = f"{self._meta_path(session['upload_id'])}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self._meta_path(session['upload_id']))
+
+    def _load(self, upload_id):
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise UploadError('上传会话不存在或已过期', 404)
+        try:
+            with open(self._meta_path(upload_id), encoding='utf-8') as f:
+                session = json.load(f)
+            session['received'] = set(session['received'])
+            return session
+        except FileNotFoundError:
+            raise UploadError('上传会话不存在或已过期', 404)
+        except (ValueError, KeyError):
+            raise UploadError('上传会话状态已损坏', 410)
+
+    # 持有会话的排他锁期间读取并返回会话状态；会话已完成、取消或过期时抛出 404
+    @contextlib.contextmanager
+    def _locked(self, upload_id):
+        self._load(upload_id)
+        if fcntl is None:
+            with self._lock:
+                yield self._load(upload_id)
+            return
+        try:
+            lock_file = open(self._data_path(upload_id), 'rb')
+        except FileNotFoundError:
+            raise UploadError('上传会话不存在或已过期', 404)
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # 等待锁期间会话可能已被其他进程完成或删除
+            yield self._load(upload_id)
+
+    def create(self, filename, size, chunk_size=None):
+        if size < 0:
+            raise UploadError('文件大小无效')
+        if self.max_size is not None and size > self.max_size:
+            raise UploadError('文件大小超过限制', 413)
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise UploadError(f'分块大小必须在 {MIN_CHUNK_SIZE} 到 {MAX_CHUNK_SIZE} 字节之间')
+
+        upload_id = uuid.uuid4().hex
+        now = time.time()
+        session = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'chunk_size': chunk_size,
+            'total_chunks': max(1, (size + chunk_size - 1) // chunk_size),
+            'received': set(),
+            'created': now,
+            'updated': now
+        }
+
+        # 预分配数据文件（稀疏文件），分块按偏移量直接写入
+        with open(self._data_path(upload_id), 'wb') as f:
+            f.truncate(size)
+        self._save(session)
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        session = self._load(upload_id)
+        received = session['received']
+        return {
+            'upload_id': upload_id,
+            'filename': session['filename'],
+            'size': session['size'],
+            'chunk_size': session['chunk_size'],
+            'total_chunks': session['total_chunks'],
+            'received_chunks': len(received),
+            'received_ranges': chunks_to_ranges(received, session['chunk_size'], session['size']),
+            'missing_chunks': [i for i in range(session['total_chunks']) if i not in received],
+            'expires_at': session['updated'] + self.session_ttl
+        }
+
+    # 从 stream 读取一个分块并写入对应偏移量；同一分块重复上传会覆盖原内容
+    def write_chunk(self, upload_id, index, stream, length):
+        session = self._load(upload_id)
+        if not 0 <= index < session['total_chunks']:
+            raise UploadError('分块序号超出范围')
+
+        offset = index * session['chunk_size']
+        expected = min(session['chunk_size'], session['size'] - offset)
+        if length is not None and length != expected:
+            raise UploadError(f'分块 {index} 的大小应为 {expected} 字节')
+
+        try:
+            fd = os.open(self._data_path(upload_id), os.O_WRONLY)
+        except FileNotFoundError:
+            raise UploadError('上传会话不存在或已过期', 404)
+        try:
+            written = 0
+            while written < expected:
+                data = stream.read(min(COPY_BUFFER_SIZE, expected - written))
+                if not data:
+                    break
+                view = memoryview(data)
+                while view:
+                    n = os.pwrite(fd, view, offset + written)
+                    view = view[n:]
+                    written += n
+        finally:
+            os.close(fd)
+
+        if written != expected or stream.read(1):
+            raise UploadError(f'分块 {index} 的大小应为 {expected} 字节')
+
+        with self._locked(upload_id) as session:
+            session['received'].add(index)
+            session['updated'] = time.time()
+            self._save(session)
+        return len(session['received'])
+
+    # 所有分块到齐后完成上传：删除会话状态（之后其他请求均返回 404），计算 SHA-256，
+    # 返回数据文件路径交给调用方重命名
+    def finalize(self, upload_id):
+        with self._locked(upload_id) as session:
+            missing = session['total_chunks'] - len(session['received'])
+            if missing:
+                raise UploadError(f'还有 {missing} 个分块未上传', 409)
+            os.remove(self._meta_path(upload_id))
+
+        data_path = self._data_path(upload_id)
+        hasher = hashlib.sha256()
+        with open(data_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+                hasher.update(chunk)
+
+        return {
+            'filename': session['filename'],
+            'temp_path': data_path,
+            'size': session['size'],
+            'sha256': hasher.hexdigest()
+        }
+
+    def abort(self, upload_id):
+        with self._locked(upload_id):
+            self._remove_files(upload_id)
+
+    def _remove_files(self, upload_id):
+        for path in (self._meta_path(upload_id), self._data_path(upload_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # 清理超时未更新的会话，以及超过有效期仍缺少另一半的残留文件
+    # （创建会话时先写数据文件再写状态文件，未过期的不清理，避免与其他进程的创建交错）；返回清理的会话数
+    def collect_garbage(self):
+        deadline = time.time() - self.session_ttl
+        removed = 0
+        for name in os.listdir(self.sessions_dir):
+            upload_id, extension = os.path.splitext(name)
+            if extension == '.json':
+                try:
+                    with self._locked(upload_id) as session:
+                        if session['updated'] < deadline:
+                            self._remove_files(upload_id)
+                            removed += 1
+                    continue
+                except UploadError:
+                    pass
+            if extension in ('.json', '.part') and UPLOAD_ID_PATTERN.match(upload_id):
+                try:
+                    incomplete = not (os.path.exists(self._meta_path(upload_id))
+                                      and os.path.exists(self._data_path(upload_id)))
+                    if incomplete and os.path.getmtime(os.path.join(self.sessions_dir, name)) < deadline:
+                        self._remove_files(upload_id)
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def _gc_loop(self):
+        while not self._stop_event.wait(self.gc_interval):
+            try:
+                self.collect_garbage()
+            except Exception as e:
+                print(f"⚠️ 清理上传会话失败: {e}")
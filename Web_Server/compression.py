@@ -0,0 +1,183 @@
+import gzip
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 需要压缩传输的文本类文件扩展名
+COMPRESSIBLE_EXTENSIONS = {'txt', 'csv', 'json', 'xml', 'js', 'css', 'html', 'svg'}
+# 小于该大小的文件不值得压缩
+MIN_COMPRESS_SIZE = 1024
+# 压缩后至少节省 10% 才保留压缩版本
+MAX_COMPRESS_RATIO = 0.9
+# 预压缩版本尚未生成时，允许实时 gzip 压缩的最大文件大小
+ON_THE_FLY_MAX_SIZE = 32 * 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _gzip_file(source, target):
+    with open(source, 'rb') as src, gzip.GzipFile(filename='', mode='wb', fileobj=target, compresslevel=9, mtime=0) as dst:
+        for chunk in iter(lambda: src.read(COPY_BUFFER_SIZE), b''):
+            dst.write(chunk)
+
+
+def _brotli_file(source, target):
+    compressor = brotli.Compressor(quality=11)
+    with open(source, 'rb') as src:
+        for chunk in iter(lambda: src.read(COPY_BUFFER_SIZE), b''):
+            target.write(compressor.process(chunk))
+    target.write(compressor.finish())
+
+
+def _zstd_file(source, target):
+    with open(source, 'rb') as src:
+        zstandard.ZstdCompressor(level=19).copy_stream(src, target)
+
+
+# 可用的编码，按服务端偏好排序：(Content-Encoding, 缓存文件后缀, 压缩函数)
+ENCODERS = [(name, suffix, func) for name, suffix, func, available in (
+    ('br', 'br', _brotli_file, brotli is not None),
+    ('zstd', 'zst', _zstd_file, zstandard is not None),
+    ('gzip', 'gz', _gzip_file, True),
+) if available]
+
+
+def is_compressible(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+# 内存中压缩 JSON 等响应体，返回 (编码, 压缩后数据)；客户端不支持时返回 (None, None)
+def compress_bytes(data, accept_encodings):
+    encoding = accept_encodings.best_match(
+        [name for name in ('br', 'gzip') if name != 'br' or brotli is not None])
+    if encoding == 'br':
+        return encoding, brotli.compress(data, quality=5)
+    if encoding == 'gzip':
+        return encoding, gzip.compress(data, compresslevel=6, mtime=0)
+    return None, None
+
+
+# 实时 gzip 压缩文件内容的生成器（用于预压缩版本尚未生成时）
+def gzip_stream(path):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+    yield compressor.flush()
+
+
+# 预压缩版本缓存：上传后在后台线程中生成各编码的压缩文件，保存在 cache_dir/<文件名>.<后缀>；
+# source_path(filename) 返回原文件路径
+class CompressionCache:
+    def __init__(self, cache_dir, source_path, max_workers=2):
+        self.cache_dir = cache_dir
+        self.source_path = source_path
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_pid = None
+        self._pending = set()
+        # 压缩收益不足、只提供原始内容的文件
+        self._incompressible = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def variant_path(self, filename, suffix):
+        return os.path.join(self.cache_dir, f'{filename}.{suffix}')
+
+    # 线程池按进程创建，fork 出的工作进程不会继承父进程的线程
+    def _get_executor(self):
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='compress')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def schedule(self, filename):
+        if not is_compressible(filename):
+            return
+        with self._lock:
+            if filename in self._pending or filename in self._incompressible:
+                return
+            self._pending.add(filename)
+            executor = self._get_executor()
+        executor.submit(self._compress, filename)
+
+    def _compress(self, filename):
+        try:
+            source = self.source_path(filename)
+            size = os.path.getsize(source)
+            if size < MIN_COMPRESS_SIZE:
+                with self._lock:
+                    self._incompressible.add(filename)
+                return
+
+            for _, suffix, func in ENCODERS:
+                target = self.variant_path(filename, suffix)
+                temp_path = target + '.tmp'
+                with open(temp_path, 'wb') as f:
+                    func(source, f)
+                if os.path.getsize(temp_path) > size * MAX_COMPRESS_RATIO:
+                    os.remove(temp_path)
+                    with self._lock:
+                        self._incompressible.add(filename)
+                    return
+                os.replace(temp_path, target)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ 压缩文件失败 {filename}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(filename)
+
+    # 根据 Accept-Encoding 选择压缩版本，返回 (编码, 压缩文件路径)：
+    # 压缩版本尚未生成时返回 ('gzip', None)，由调用方实时压缩；不需要压缩时返回 (None, None)
+    def negotiate(self, filename, stat, accept_encodings):
+        if not is_compressible(filename) or stat.st_size < MIN_COMPRESS_SIZE:
+            return None, None
+        with self._lock:
+            if filename in self._incompressible:
+                return None, None
+
+        available = {}
+        for name, suffix, _ in ENCODERS:
+            path = self.variant_path(filename, suffix)
+            try:
+                # 原文件在压缩之后被修改过时，压缩版本视为过期
+                if os.path.getmtime(path) >= stat.st_mtime:
+                    available[name] = path
+            except OSError:
+                pass
+
+        if len(available) < len(ENCODERS):
+            self.schedule(filename)
+
+        if available:
+            encoding = accept_encodings.best_match(list(available))
+            if encoding is not None:
+                return encoding, available[encoding]
+        if stat.st_size <= ON_THE_FLY_MAX_SIZE and 'gzip' not in available and accept_encodings.best_match(['gzip']):
+            return 'gzip', None
+        return None, None
+
+    def remove(self, filename):
+        with self._lock:
+            self._incompressible.discard(filename)
+        for _, suffix, _ in ENCODERS:
+            try:
+                os.remove(self.variant_path(filename, suffix))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,443 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from file_index import MAX_CACHED_TOTALS, SORT_KEYS, decode_cursor, encode_cursor, make_record
+
+# SQLite 文件元数据目录（与 FileIndex 接口相同）：
+# 记录保存在 WAL 模式的 SQLite 数据库中，按类型、上传时间、大小、原文件名建立索引，
+# 各工作进程共享同一份数据（上传/删除后其他进程立即可见）。统计计数器由触发器在同一事务中维护，
+# 统计接口的开销与文件数无关。数据库不存在或损坏时从磁盘重建
+
+# 排序字段 -> 列名（name 按 Python 的 str.lower() 结果排序，与 FileIndex 一致）
+SORT_COLUMNS = {'date': 'upload_time', 'size': 'size', 'name': 'name_key'}
+# 批量删除时每条 SQL 语句中的文件名数量
+DELETE_BATCH_SIZE = 500
+
+TABLES = '''
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    upload_time REAL NOT NULL,
+    upload_date TEXT NOT NULL,
+    type TEXT NOT NULL,
+    original_name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    sha256 TEXT,
+    media TEXT
+) WITHOUT ROWID;
+-- 统计计数器：kind 为 type（按类型）、day（按上传日期）或 unshared（未进入去重存储的文件）
+CREATE TABLE IF NOT EXISTS counters (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0);
+'''
+
+INDEXES = {
+    'files_time': 'files (upload_time, filename)',
+    'files_size': 'files (size, filename)',
+    'files_name': 'files (name_key, filename)',
+    'files_type_time': 'files (type, upload_time, filename)',
+    'files_type_size': 'files (type, size, filename)',
+    'files_type_name': 'files (type, name_key, filename)',
+}
+
+# 计数器与版本号由触发器在写入记录的同一事务中更新
+TRIGGERS = {
+    'files_insert': '''AFTER INSERT ON files BEGIN
+        INSERT INTO counters (kind, key, count, size) VALUES ('type', NEW.type, 1, NEW.size)
+            ON CONFLICT (kind, key) DO UPDATE SET count = count + 1, size = size + excluded.size;
+        INSERT INTO counters (kind, key, count, size) VALUES ('day', substr(NEW.upload_date, 1, 10), 1, NEW.size)
+            ON CONFLICT (kind, key) DO UPDATE SET count = count + 1, size = size + excluded.size;
+        INSERT INTO counters (kind, key, count, size) SELECT 'unshared', '', 1, NEW.size WHERE NEW.sha256 IS NULL
+            ON CONFLICT (kind, key) DO UPDATE SET count = count + 1, size = size + excluded.size;
+        UPDATE meta SET value = value + 1 WHERE key = 'generation';
+    END''',
+    'files_delete': '''AFTER DELETE ON files BEGIN
+        UPDATE counters SET count = count - 1, size = size - OLD.size
+            WHERE (kind = 'type' AND key = OLD.type) OR (kind = 'day' AND key = substr(OLD.upload_date, 1, 10))
+               OR (kind = 'unshared' AND OLD.sha256 IS NULL);
+        DELETE FROM counters WHERE count = 0;
+        UPDATE meta SET value = value + 1 WHERE key = 'generation';
+    END''',
+}
+
+# 重建时由全部记录一次性计算计数器
+REBUILD_COUNTERS = '''
+INSERT INTO counters (kind, key, count, size)
+    SELECT 'type', type, count(*), sum(size) FROM files GROUP BY type
+    UNION ALL SELECT 'day', substr(upload_date, 1, 10), count(*), sum(size) FROM files GROUP BY 2
+    UNION ALL SELECT 'unshared', '', count(*), sum(size) FROM files WHERE sha256 IS NULL HAVING count(*) > 0
+'''
+
+
+def _create_indexes_and_triggers(connection):
+    for name, definition in INDEXES.items():
+        connection.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {definition}')
+    for name, definition in TRIGGERS.items():
+        connection.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {definition}')
+
+
+COLUMNS = ('filename', 'size', 'mtime', 'upload_time', 'upload_date', 'type', 'original_name', 'sha256', 'media')
+INSERT_SQL = ('INSERT INTO files (filename, size, mtime, upload_time, upload_date, type, original_name, '
+              'name_key, sha256) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+
+def _record_row(record):
+    return (record['filename'], record['size'], record['mtime'], record['upload_time'], record['upload_date'],
+            record['type'], record['original_name'], SORT_KEYS['name'](record), record['sha256'])
+
+
+# 数据库行 -> 与 FileIndex 相同的记录字典；media 列为 NULL 表示尚未探测（记录中不含 media 键）
+def _row_record(row):
+    record = dict(zip(COLUMNS, row))
+    media = record.pop('media')
+    if media is not None:
+        record['media'] = json.loads(media)
+    return record
+
+
+class FileCatalog:
+    # storage 为 StorageLayout；content_id(stat) 可选，返回文件内容的 SHA-256（去重存储中的文件）或 None
+    def __init__(self, db_path, storage, get_file_type, reconcile_interval=300, content_id=None):
+        self.db_path = db_path
+        self.storage = storage
+        self.get_file_type = get_file_type
+        self.content_id = content_id
+        self.reconcile_interval = reconcile_interval
+        self._local = threading.local()
+        # 带过滤条件的总数缓存（按进程）：(过滤条件, 参数) -> (generation, 总数)
+        self._filter_totals = {}
+        self._reconcile_thread = None
+        self._stop_event = threading.Event()
+
+    # 每个线程一个连接；fork 出的工作进程不能使用父进程的连接，按进程号区分
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            try:
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('PRAGMA synchronous=NORMAL')
+            except sqlite3.DatabaseError:
+                connection.close()
+                raise
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    # 写事务（BEGIN IMMEDIATE，多个进程同时写入时等待而不是在提交时失败）
+    def _write(self, func):
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(connection)
+            connection.execute('COMMIT')
+            return result
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _make_record(self, filename, stat, sha256=None):
+        if sha256 is None and self.content_id is not None:
+            sha256 = self.content_id(stat)
+        return make_record(filename, stat, self.get_file_type(filename), sha256)
+
+    def _create_schema(self):
+        connection = self._connect()
+        connection.executescript(TABLES)
+        _create_indexes_and_triggers(connection)
+
+    # 打开数据库，返回是否需要从磁盘重建（数据库不存在或无法读取）
+    def _open(self):
+        os.makedirs(self.storage.root, exist_ok=True)
+        missing = not os.path.exists(self.db_path)
+        try:
+            self._create_schema()
+            self._connect().execute('SELECT count(*) FROM counters').fetchone()
+        except sqlite3.DatabaseError as e:
+            print(f"⚠️ 文件目录数据库损坏，从磁盘重建: {e}")
+            if getattr(self._local, 'connection', None) is not None:
+                self._local.connection.close()
+                self._local.connection = None
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
+            self._create_schema()
+            missing = True
+        return missing
+
+    # 从磁盘重建全部记录。在同一事务中先删除索引和触发器，按主键顺序批量插入后再重建索引、
+    # 一次性计算计数器，比逐条维护索引和触发器快一个数量级
+    def build(self):
+        rows = sorted(_record_row(self._make_record(filename, stat))
+                      for filename, stat in self.storage.scan().items())
+
+        def rebuild(connection):
+            for name in TRIGGERS:
+                connection.execute(f'DROP TRIGGER IF EXISTS {name}')
+            for name in INDEXES:
+                connection.execute(f'DROP INDEX IF EXISTS {name}')
+            connection.execute('DELETE FROM files')
+            connection.execute('DELETE FROM counters')
+            connection.executemany(INSERT_SQL, rows)
+            _create_indexes_and_triggers(connection)
+            connection.execute(REBUILD_COUNTERS)
+            connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+        self._write(rebuild)
+
+    # 与磁盘对账，返回 (新增数, 删除数, 变更数)
+    def reconcile(self):
+        scanned = self.storage.scan()
+        known = {filename: (size, mtime) for filename, size, mtime in
+                 self._connect().execute('SELECT filename, size, mtime FROM files')}
+        removed = [filename for filename in known if filename not in scanned]
+        added = []
+        changed = []
+        for filename, stat in scanned.items():
+            if filename not in known:
+                added.append(filename)
+            elif known[filename] != (stat.st_size, stat.st_mtime):
+                changed.append(filename)
+        if not (removed or added or changed):
+            return 0, 0, 0
+
+        rows = [_record_row(self._make_record(filename, scanned[filename])) for filename in added + changed]
+
+        def apply(connection):
+            for filename in removed + changed:
+                connection.execute('DELETE FROM files WHERE filename = ?', (filename,))
+            connection.executemany(INSERT_SQL, rows)
+        self._write(apply)
+        return len(added), len(removed), len(changed)
+
+    # 数据库不存在时从磁盘重建；已存在时直接使用，并在后台与磁盘对账一次（发现服务停止期间的外部修改）
+    def start(self):
+        if self._open():
+            self.build()
+        elif self.reconcile_interval:
+            threading.Thread(target=self._reconcile_once, name='file-catalog-reconcile', daemon=True).start()
+        self.start_background()
+
+    # 启动后台对账线程；fork 出的工作进程中需要重新调用
+    def start_background(self):
+        if not self.reconcile_interval:
+            return
+        if self._reconcile_thread is None or not self._reconcile_thread.is_alive():
+            self._reconcile_thread = threading.Thread(
+                target=self._reconcile_loop, name='file-catalog-reconcile', daemon=True)
+            self._reconcile_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _reconcile_once(self):
+        try:
+            self.reconcile()
+        except Exception as e:
+            print(f"⚠️ 文件目录对账失败: {e}")
+
+    def _reconcile_loop(self):
+        while not self._stop_event.wait(self.reconcile_interval):
+            self._reconcile_once()
+
+    # 每次目录内容变化时递增（由触发器维护），用作列表类接口的 ETag
+    @property
+    def generation(self):
+        return self._connect().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    # 新增或更新文件记录（stat 缺省时从磁盘读取一次）
+    def add(self, filename, sha256=None, stat=None):
+        stat = stat or os.stat(self.storage.path(filename))
+        record = self._make_record(filename, stat, sha256)
+
+        def upsert(connection):
+            connection.execute('DELETE FROM files WHERE filename = ?', (filename,))
+            connection.execute(INSERT_SQL, _record_row(record))
+        self._write(upsert)
+        return record
+
+    def remove(self, filename):
+        return self.remove_many([filename]).get(filename)
+
+    # 批量删除：在一个事务中完成
+    def remove_many(self, filenames):
+        filenames = list(filenames)
+
+        def delete(connection):
+            removed = {}
+            for i in range(0, len(filenames), DELETE_BATCH_SIZE):
+                batch = filenames[i:i + DELETE_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                for row in connection.execute(
+                        f'SELECT {", ".join(COLUMNS)} FROM files WHERE filename IN ({placeholders})', batch):
+                    removed[row[0]] = _row_record(row)
+                connection.execute(f'DELETE FROM files WHERE filename IN ({placeholders})', batch)
+            return removed
+        return self._write(delete) if filenames else {}
+
+    # 缓存媒体元数据探测结果（不影响计数器）。列表中包含媒体信息，因此递增版本号，缓存的列表重新验证时取得新内容
+    def set_media(self, filename, media):
+        self.set_media_many([(filename, media)])
+
+    # 批量缓存探测结果：[(文件名, 媒体信息), ...]，在一个事务中写入
+    def set_media_many(self, items):
+        rows = [(json.dumps(media, ensure_ascii=False), filename) for filename, media in items]
+
+        def update(connection):
+            connection.executemany('UPDATE files SET media = ? WHERE filename = ?', rows)
+            connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+        if rows:
+            self._write(update)
+
+    # 尚未探测媒体信息的文件名
+    def unprobed(self):
+        return [row[0] for row in self._connect().execute('SELECT filename FROM files WHERE media IS NULL')]
+
+    def get(self, filename):
+        row = self._connect().execute(f'SELECT {", ".join(COLUMNS)} FROM files WHERE filename = ?',
+                                      (filename,)).fetchone()
+        return _row_record(row) if row else None
+
+    def __contains__(self, filename):
+        return self._connect().execute('SELECT 1 FROM files WHERE filename = ?', (filename,)).fetchone() is not None
+
+    def __len__(self):
+        return self._connect().execute("SELECT coalesce(sum(count), 0) FROM counters WHERE kind = 'type'").fetchone()[0]
+
+    # 统计信息，只读取计数器表，开销与文件数无关
+    def stats(self, days=7):
+        today = datetime.now().date()
+        first_day = (today - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        counters = {'type': {}, 'day': {}, 'unshared': {}}
+        rows = self._connect().execute(
+            "SELECT kind, key, count, size FROM counters WHERE kind != 'day' OR key >= ?", (first_day,))
+        for kind, key, count, size in rows:
+            counters[kind][key] = {'count': count, 'size': size}
+
+        history = []
+        for offset in range(days - 1, -1, -1):
+            day = (today - timedelta(days=offset)).strftime('%Y-%m-%d')
+            bucket = counters['day'].get(day, {'count': 0, 'size': 0})
+            history.append({'date': day, 'count': bucket['count'], 'size': bucket['size']})
+
+        types = counters['type']
+        return {
+            'total_files': sum(bucket['count'] for bucket in types.values()),
+            'uploaded_today': counters['day'].get(today.strftime('%Y-%m-%d'), {}).get('count', 0),
+            'total_size': sum(bucket['size'] for bucket in types.values()),
+            'unshared_size': counters['unshared'].get('', {}).get('size', 0),
+            'types': types,
+            'history': history
+        }
+
+    # 返回所有记录，按上传时间倒序
+    def list_records(self):
+        rows = self._connect().execute(
+            f'SELECT {", ".join(COLUMNS)} FROM files ORDER BY upload_time DESC, filename DESC')
+        return [_row_record(row) for row in rows]
+
+    # 分页查询（参数与返回值同 FileIndex.query）。
+    # 排序字段与单一类型条件走复合索引，单页开销为 O(页大小 + log n)，多取一项判断是否还有下一页；
+    # 无过滤条件（或只按类型过滤）时总数取自计数器表，其余情况计数一次并按过滤条件缓存到目录下次变化为止
+    def query(self, sort='date', order='desc', file_types=None, name=None,
+              min_size=None, max_size=None, start_time=None, end_time=None,
+              page=1, per_page=None, cursor=None):
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f'不支持的排序字段: {sort}')
+        if order not in ('asc', 'desc'):
+            raise ValueError(f'不支持的排序方向: {order}')
+        column = SORT_COLUMNS[sort]
+
+        conditions = []
+        params = []
+        if file_types:
+            conditions.append(f'type IN ({",".join("?" * len(file_types))})')
+            params.extend(file_types)
+        filtered = bool(conditions)
+        if name:
+            conditions.append('instr(name_key, ?) > 0')
+            params.append(name.lower())
+        if min_size is not None:
+            conditions.append('size >= ?')
+            params.append(min_size)
+        if max_size is not None:
+            conditions.append('size <= ?')
+            params.append(max_size)
+        if start_time is not None:
+            conditions.append('upload_time >= ?')
+            params.append(start_time)
+        if end_time is not None:
+            conditions.append('upload_time < ?')
+            params.append(end_time)
+        only_type_filter = len(conditions) == (1 if filtered else 0)
+        # total 统计全部满足过滤条件的项（与游标无关），游标条件只用于取当前页
+        filter_where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        filter_params = list(params)
+
+        offset = 0
+        if cursor is not None:
+            cursor_key = decode_cursor(cursor)
+            if isinstance(cursor_key[0], str) != (sort == 'name'):
+                raise ValueError('分页游标与排序字段不匹配')
+            conditions.append(f'({column}, filename) {">" if order == "asc" else "<"} (?, ?)')
+            params.extend(cursor_key)
+        elif per_page:
+            offset = (page - 1) * per_page
+
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        direction = 'ASC' if order == 'asc' else 'DESC'
+        sql = (f'SELECT {", ".join(COLUMNS)}, {column} FROM files {where} '
+               f'ORDER BY {column} {direction}, filename {direction}')
+        page_params = list(params)
+        if per_page:
+            sql += ' LIMIT ? OFFSET ?'
+            page_params.extend([per_page + 1, offset])
+
+        connection = self._connect()
+        # 同一读事务中查询当前页和总数，两者一致
+        connection.execute('BEGIN')
+        try:
+            rows = connection.execute(sql, page_params).fetchall()
+            if per_page is None and cursor is None:
+                total = len(rows)
+            elif only_type_filter:
+                type_condition = f'AND key IN ({",".join("?" * len(file_types))})' if filtered else ''
+                total = connection.execute(
+                    f"SELECT coalesce(sum(count), 0) FROM counters WHERE kind = 'type' {type_condition}",
+                    file_types or []).fetchone()[0]
+            else:
+                generation = connection.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+                filter_key = (filter_where, tuple(filter_params))
+                cached = self._filter_totals.get(filter_key)
+                if cached is not None and cached[0] == generation:
+                    total = cached[1]
+                else:
+                    total = connection.execute(f'SELECT count(*) FROM files {filter_where}',
+                                               filter_params).fetchone()[0]
+                    if len(self._filter_totals) >= MAX_CACHED_TOTALS:
+                        self._filter_totals.clear()
+                    self._filter_totals[filter_key] = (generation, total)
+        finally:
+            connection.execute('COMMIT')
+
+        has_more = per_page is not None and len(rows) > per_page
+        if has_more:
+            rows = rows[:per_page]
+        return {
+            'records': [_row_record(row[:-1]) for row in rows],
+            'total': total,
+            'has_more': has_more,
+            'next_cursor': encode_cursor((rows[-1][-1], rows[-1][0])) if has_more else None
+        }
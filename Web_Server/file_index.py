@@ -0,0 +1,410 @@
+import base64
+import bisect
+import itertools
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+# 上传文件名格式：YYYYMMDD_HHMMSS_uuid前8位_原文件名
+UNIQUE_NAME_PATTERN = re.compile(r'^(\d{8}_\d{6})_[0-9a-f]{8}_(.+)$')
+
+
+# 按过滤条件缓存的总数最多保留的条目数
+MAX_CACHED_TOTALS = 256
+
+# 支持的排序字段 -> 排序键
+SORT_KEYS = {
+    'date': lambda record: record['upload_time'],
+    'size': lambda record: record['size'],
+    'name': lambda record: record['original_name'].lower()
+}
+
+
+def parse_original_name(filename):
+    match = UNIQUE_NAME_PATTERN.match(filename)
+    return match.group(2) if match else filename
+
+
+# 上传时间以文件名中的时间戳为准（去重存储的硬链接共享同一个 mtime），无法解析时返回 None
+def parse_upload_time(filename):
+    match = UNIQUE_NAME_PATTERN.match(filename)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').timestamp()
+    except ValueError:
+        return None
+
+
+# 单个文件的元数据记录
+def make_record(filename, stat, file_type, sha256=None):
+    upload_time = parse_upload_time(filename) or stat.st_mtime
+    return {
+        'filename': filename,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'upload_time': upload_time,
+        'type': file_type,
+        'original_name': parse_original_name(filename),
+        'sha256': sha256,
+        'upload_date': datetime.fromtimestamp(upload_time).strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+# 分页游标：对客户端不透明，内容为上一页最后一项的 (排序键, 文件名)
+def encode_cursor(key):
+    raw = json.dumps(list(key), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, filename = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError):
+        raise ValueError('无效的分页游标')
+    if not isinstance(value, (int, float, str)) or not isinstance(filename, str):
+        raise ValueError('无效的分页游标')
+    return value, filename
+
+
+# 进程内文件元数据索引
+# 启动时扫描一次目录，上传/删除时原地更新，后台线程定期与磁盘对账以发现外部修改
+class FileIndex:
+    # storage 为 StorageLayout（文件所在的分片/平铺目录）；
+    # content_id(stat) 可选，返回文件内容的 SHA-256（去重存储中的文件）或 None
+    def __init__(self, storage, get_file_type, reconcile_interval=300, content_id=None):
+        self.storage = storage
+        self.get_file_type = get_file_type
+        self.content_id = content_id
+        self.reconcile_interval = reconcile_interval
+        self._records = {}
+        # (排序字段, 文件类型或 None) -> 按 (排序键, 文件名) 升序排列的列表
+        self._sorted = {}
+        # 增量维护的统计计数器：总大小、按类型、按上传日期（YYYY-MM-DD）
+        self._total_size = 0
+        # 未进入去重存储的文件占用的空间
+        self._unshared_size = 0
+        self._type_stats = {}
+        self._daily_stats = {}
+        # 每次索引内容变化时递增，用作列表类接口的 ETag
+        self.generation = 0
+        # 带过滤条件的总数缓存：过滤条件 -> (generation, 总数)，翻页时不必重新遍历候选区间
+        self._filter_totals = {}
+        self._lock = threading.RLock()
+        self._reconcile_thread = None
+        self._stop_event = threading.Event()
+
+    # 根据 stat 结果构造单个文件的元数据记录
+    def _make_record(self, filename, stat, sha256=None):
+        if sha256 is None and self.content_id is not None:
+            sha256 = self.content_id(stat)
+        return make_record(filename, stat, self.get_file_type(filename), sha256)
+
+    # 扫描根目录与分片目录，返回 {文件名: stat 结果}
+    def _scan(self):
+        return self.storage.scan()
+
+    def build(self):
+        os.makedirs(self.storage.root, exist_ok=True)
+        records = {}
+        for filename, stat in self._scan().items():
+            records[filename] = self._make_record(filename, stat)
+
+        sorted_lists = {}
+        for record in records.values():
+            for sort, key_func in SORT_KEYS.items():
+                key = (key_func(record), record['filename'])
+                sorted_lists.setdefault((sort, None), []).append(key)
+                sorted_lists.setdefault((sort, record['type']), []).append(key)
+        for keys in sorted_lists.values():
+            keys.sort()
+
+        with self._lock:
+            self._records = records
+            self._sorted = sorted_lists
+            self.generation += 1
+            self._total_size = 0
+            self._unshared_size = 0
+            self._type_stats = {}
+            self._daily_stats = {}
+            for record in records.values():
+                self._count_locked(record, 1)
+
+    # 与磁盘对账，返回 (新增数, 删除数, 变更数)
+    def reconcile(self):
+        scanned = self._scan()
+        added = removed = changed = 0
+
+        with self._lock:
+            for filename in list(self._records):
+                if filename not in scanned:
+                    self._remove_locked(filename)
+                    removed += 1
+
+            for filename, stat in scanned.items():
+                record = self._records.get(filename)
+                if record is None:
+                    added += 1
+                elif record['size'] != stat.st_size or record['mtime'] != stat.st_mtime:
+                    changed += 1
+                    self._remove_locked(filename)
+                else:
+                    continue
+                self._add_locked(self._make_record(filename, stat))
+
+        return added, removed, changed
+
+    def start(self):
+        self.build()
+        self.start_background()
+
+    # 启动后台对账线程；fork 出的工作进程中需要重新调用
+    def start_background(self):
+        if not self.reconcile_interval:
+            return
+        if self._reconcile_thread is None or not self._reconcile_thread.is_alive():
+            self._reconcile_thread = threading.Thread(
+                target=self._reconcile_loop, name='file-index-reconcile', daemon=True)
+            self._reconcile_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _reconcile_loop(self):
+        while not self._stop_event.wait(self.reconcile_interval):
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"⚠️ 文件索引对账失败: {e}")
+
+    # 更新统计计数器，sign 为 1（新增）或 -1（删除）
+    def _count_locked(self, record, sign):
+        self._total_size += sign * record['size']
+        if record['sha256'] is None:
+            self._unshared_size += sign * record['size']
+        for stats, key in ((self._type_stats, record['type']),
+                           (self._daily_stats, record['upload_date'][:10])):
+            bucket = stats.setdefault(key, {'count': 0, 'size': 0})
+            bucket['count'] += sign
+            bucket['size'] += sign * record['size']
+            if bucket['count'] == 0:
+                del stats[key]
+
+    def _add_locked(self, record):
+        self._records[record['filename']] = record
+        self.generation += 1
+        self._count_locked(record, 1)
+        for sort, key_func in SORT_KEYS.items():
+            key = (key_func(record), record['filename'])
+            bisect.insort(self._sorted.setdefault((sort, None), []), key)
+            bisect.insort(self._sorted.setdefault((sort, record['type']), []), key)
+
+    def _remove_locked(self, filename):
+        record = self._records.pop(filename, None)
+        if record is None:
+            return None
+        self.generation += 1
+        self._count_locked(record, -1)
+
+        for sort, key_func in SORT_KEYS.items():
+            key = (key_func(record), filename)
+            for keys in (self._sorted[(sort, None)], self._sorted[(sort, record['type'])]):
+                i = bisect.bisect_left(keys, key)
+                if i < len(keys) and keys[i] == key:
+                    del keys[i]
+        return record
+
+    # 新增或更新文件记录（stat 缺省时从磁盘读取一次；替换文件前可传入新文件的 stat，先更新索引）
+    def add(self, filename, sha256=None, stat=None):
+        stat = stat or os.stat(self.storage.path(filename))
+        record = self._make_record(filename, stat, sha256)
+        with self._lock:
+            self._remove_locked(filename)
+            self._add_locked(record)
+        return record
+
+    def remove(self, filename):
+        with self._lock:
+            return self._remove_locked(filename)
+
+    # 批量删除：一次加锁，排序列表只重建一遍（逐个删除时每个文件都要在各排序列表中移动元素）
+    def remove_many(self, filenames):
+        with self._lock:
+            removed = {}
+            for filename in filenames:
+                record = self._records.pop(filename, None)
+                if record is not None:
+                    removed[filename] = record
+                    self._count_locked(record, -1)
+            if removed:
+                self.generation += 1
+                for key, keys in self._sorted.items():
+                    keys[:] = [item for item in keys if item[1] not in removed]
+            return removed
+
+    # 缓存媒体元数据探测结果；不影响排序与统计，但列表中包含媒体信息，因此递增版本号
+    def set_media(self, filename, media):
+        self.set_media_many([(filename, media)])
+
+    # 批量缓存探测结果：[(文件名, 媒体信息), ...]
+    def set_media_many(self, items):
+        with self._lock:
+            changed = False
+            for filename, media in items:
+                record = self._records.get(filename)
+                if record is not None:
+                    record['media'] = media
+                    changed = True
+            if changed:
+                self.generation += 1
+
+    # 尚未探测媒体信息的文件名
+    def unprobed(self):
+        with self._lock:
+            return [filename for filename, record in self._records.items() if 'media' not in record]
+
+    def get(self, filename):
+        with self._lock:
+            return self._records.get(filename)
+
+    def __contains__(self, filename):
+        with self._lock:
+            return filename in self._records
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+    # 统计信息，开销与文件数无关；按日期分桶，跨天时自然切换到新的"今日"桶
+    def stats(self, days=7):
+        today = datetime.now().date()
+        with self._lock:
+            history = []
+            for offset in range(days - 1, -1, -1):
+                day = (today - timedelta(days=offset)).strftime('%Y-%m-%d')
+                bucket = self._daily_stats.get(day, {'count': 0, 'size': 0})
+                history.append({'date': day, 'count': bucket['count'], 'size': bucket['size']})
+
+            return {
+                'total_files': len(self._records),
+                'uploaded_today': self._daily_stats.get(today.strftime('%Y-%m-%d'), {}).get('count', 0),
+                'total_size': self._total_size,
+                'unshared_size': self._unshared_size,
+                'types': {name: dict(bucket) for name, bucket in self._type_stats.items()},
+                'history': history
+            }
+
+    # 返回所有记录的快照，按上传时间倒序
+    def list_records(self):
+        with self._lock:
+            keys = self._sorted.get(('date', None), [])
+            return [self._records[filename] for _, filename in reversed(keys)]
+
+    # 分页查询，返回 records（当前页）、total（满足过滤条件的总数，与游标无关）、
+    # has_more（当前页之后是否还有项）和 next_cursor。
+    # 排序字段上的范围条件通过二分查找定位，无其他过滤条件时单页开销为 O(页大小 + log n)；
+    # 名称子串、多类型及非排序字段的范围条件在候选区间内逐条过滤，取到下一页的第一项即停止，
+    # 总数按过滤条件缓存到索引下次变化为止
+    def query(self, sort='date', order='desc', file_types=None, name=None,
+              min_size=None, max_size=None, start_time=None, end_time=None,
+              page=1, per_page=None, cursor=None):
+        if sort not in SORT_KEYS:
+            raise ValueError(f'不支持的排序字段: {sort}')
+        if order not in ('asc', 'desc'):
+            raise ValueError(f'不支持的排序方向: {order}')
+
+        predicates = []
+        list_type = None
+        if file_types:
+            if len(file_types) == 1:
+                list_type = file_types[0]
+            else:
+                type_set = set(file_types)
+                predicates.append(lambda r: r['type'] in type_set)
+        if name:
+            needle = name.lower()
+            predicates.append(lambda r: needle in r['original_name'].lower())
+
+        # 排序字段上的范围用二分定位，其余范围作为过滤条件
+        low = high = None
+        if min_size is not None or max_size is not None:
+            if sort == 'size':
+                low, high = min_size, max_size
+            else:
+                if min_size is not None:
+                    predicates.append(lambda r: r['size'] >= min_size)
+                if max_size is not None:
+                    predicates.append(lambda r: r['size'] <= max_size)
+        if start_time is not None or end_time is not None:
+            if sort == 'date':
+                low, high = start_time, end_time
+            else:
+                if start_time is not None:
+                    predicates.append(lambda r: r['upload_time'] >= start_time)
+                if end_time is not None:
+                    predicates.append(lambda r: r['upload_time'] < end_time)
+
+        with self._lock:
+            keys = self._sorted.get((sort, list_type), [])
+            lo = 0 if low is None else bisect.bisect_left(keys, (low,))
+            if high is None:
+                hi = len(keys)
+            elif sort == 'size':
+                # 大小上限为闭区间，时间上限为开区间
+                hi = bisect.bisect_left(keys, (high + 1,))
+            else:
+                hi = bisect.bisect_left(keys, (high,))
+
+            # total 为满足过滤条件的全部项数；带游标时只在游标之后的区间 [lo, hi) 中取当前页
+            full_lo, full_hi = lo, hi
+            offset = 0
+            if cursor is not None:
+                cursor_key = decode_cursor(cursor)
+                if isinstance(cursor_key[0], str) != (sort == 'name'):
+                    raise ValueError('分页游标与排序字段不匹配')
+                if order == 'asc':
+                    lo = max(lo, bisect.bisect_right(keys, cursor_key, lo, hi))
+                else:
+                    hi = min(hi, bisect.bisect_left(keys, cursor_key, lo, hi))
+            elif per_page:
+                offset = (page - 1) * per_page
+
+            if order == 'asc':
+                positions = range(lo, hi)
+            else:
+                positions = range(hi - 1, lo - 1, -1)
+
+            # 多取一项判断是否还有下一页
+            limit = offset + per_page + 1 if per_page else None
+            if not predicates:
+                total = max(full_hi - full_lo, 0)
+                page_keys = [keys[i] for i in positions[offset:limit]]
+            else:
+                matches = (keys[i] for i in positions
+                           if all(predicate(self._records[keys[i][1]]) for predicate in predicates))
+                page_keys = list(itertools.islice(matches, offset, limit))
+                filter_key = (tuple(sorted(file_types or ())), name, min_size, max_size, start_time, end_time)
+                cached = self._filter_totals.get(filter_key)
+                if cached is not None and cached[0] == self.generation:
+                    total = cached[1]
+                else:
+                    total = sum(1 for i in range(full_lo, full_hi)
+                                if all(predicate(self._records[keys[i][1]]) for predicate in predicates))
+                    if len(self._filter_totals) >= MAX_CACHED_TOTALS:
+                        self._filter_totals.clear()
+                    self._filter_totals[filter_key] = (self.generation, total)
+            has_more = per_page is not None and len(page_keys) > per_page
+            if has_more:
+                page_keys = page_keys[:per_page]
+
+            records = [self._records[filename] for _, filename in page_keys]
+
+        return {
+            'records': records,
+            'total': total,
+            'has_more': has_more,
+            'next_cursor': encode_cursor(page_keys[-1]) if has_more else None
+        }
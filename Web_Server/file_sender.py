@@ -0,0 +1,282 @@
+import mimetypes
+import os
+import unicodedata
+import uuid
+from urllib.parse import quote
+
+from flask import Response, request
+from werkzeug.http import http_date
+
+# 缓冲读取时每次读取的块大小
+READ_CHUNK_SIZE = 1024 * 1024
+# 内容不会变化的文件（带时间戳和 uuid 的上传文件名）可被浏览器和 CDN 长期缓存
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# 其他文件每次使用前需要重新验证
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+# 单个请求允许的最大区间数，超过时按整个文件返回，防止构造大量小区间消耗资源
+MAX_RANGES = 16
+
+
+# 强 ETag：优先使用内容哈希，否则由大小、修改时间和 inode 组成
+def make_etag(stat, sha256=None):
+    if sha256:
+        return f'"{sha256}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}-{stat.st_ino:x}"'
+
+
+def content_disposition(filename, as_attachment):
+    disposition = 'attachment' if as_attachment else 'inline'
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        quoted = quote(filename, safe="!#$&+^`|~")
+        return f'{disposition}; filename="{simple}"; filename*=UTF-8\'\'{quoted}'
+    escaped = filename.replace('\\', '\\\\').replace('"', '\\"')
+    return f'{disposition}; filename="{escaped}"'
+
+
+# 按 [start, end) 读取文件片段的可迭代对象，响应结束时关闭文件
+class FileRangeIterator:
+    def __init__(self, file, segments, chunk_size=READ_CHUNK_SIZE):
+        self.file = file
+        # segments: [(前缀字节, start, end), ...] 以及可选的结尾字节
+        self.segments = segments
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        for prefix, start, end in self.segments:
+            if prefix:
+                yield prefix
+            if start is None:
+                continue
+            self.file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = self.file.read(min(self.chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    def close(self):
+        self.file.close()
+
+
+def piece_length(piece):
+    return len(piece) if isinstance(piece, bytes) else piece[1]
+
+
+# 由内存中的字节串与源文件片段 (偏移, 长度) 依次拼接而成的虚拟文件，按 [start, end) 读取
+class PieceIterator:
+    def __init__(self, file, pieces, start, end, chunk_size=READ_CHUNK_SIZE):
+        self.file = file
+        self.pieces = pieces
+        self.start = start
+        self.end = end
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        position = 0
+        for piece in self.pieces:
+            piece_start, position = position, position + piece_length(piece)
+            first = max(self.start, piece_start)
+            last = min(self.end, position)
+            if first >= last:
+                continue
+            if isinstance(piece, bytes):
+                yield piece[first - piece_start:last - piece_start]
+                continue
+            self.file.seek(piece[0] + first - piece_start)
+            remaining = last - first
+            while remaining > 0:
+                data = self.file.read(min(self.chunk_size, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+
+    def close(self):
+        self.file.close()
+
+
+# 解析 Range 请求头，返回排序合并后的 [(start, end), ...]；
+# 不含有效区间时返回 None，区间全部超出文件范围时返回空列表
+def resolve_ranges(size):
+    if request.range is None or request.range.units != 'bytes':
+        return None
+
+    ranges = []
+    for start, stop in request.range.ranges:
+        if start < 0:
+            # 后缀区间：最后 N 个字节
+            start = max(size + start, 0)
+            stop = size
+        else:
+            stop = size if stop is None else min(stop, size)
+        if start < stop:
+            ranges.append((start, stop))
+
+    ranges.sort()
+    merged = []
+    for start, stop in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+# If-None-Match / If-Modified-Since 条件：客户端缓存仍然有效时返回 True
+def not_modified(etag, mtime):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag.strip('"'))
+    if request.if_modified_since is not None:
+        return int(mtime) <= int(request.if_modified_since.timestamp())
+    return False
+
+
+# If-Range 条件：ETag 或最后修改时间与当前文件一致时才按 Range 返回部分内容。
+# ETag 按强比较：弱 ETag（W/"..."）不能保证字节一致，永远不匹配（Werkzeug 解析后丢弃了 W/ 前缀，需检查原始请求头）
+def if_range_matches(etag, mtime):
+    if_range = request.if_range
+    if if_range.etag is None and if_range.date is None:
+        return True
+    if if_range.etag is not None:
+        if request.headers.get('If-Range', '').lstrip().startswith('W/'):
+            return False
+        return f'"{if_range.etag}"' == etag
+    return int(if_range.date.timestamp()) == int(mtime)
+
+
+# 文件下载响应：支持条件请求（304）、单区间/多区间 Range、If-Range 与强 ETag。
+# 单个连续片段交给服务器的 wsgi.file_wrapper（如 gunicorn 会使用 os.sendfile 零拷贝发送
+# Content-Length 指定的字节数），没有时退化为大块缓冲读取。
+# 发送预压缩版本时由调用方传入 etag（区分不同编码）和 Content-Encoding 等附加响应头；
+# file 为调用方已打开的 path（响应结束时关闭），ETag 需要与打开的文件对应时使用
+def send_file_response(path, download_name, as_attachment=True, sha256=None, immutable=False,
+                       etag=None, extra_headers=None, file=None):
+    file = file or open(path, 'rb')
+    try:
+        stat = os.fstat(file.fileno())
+        size = stat.st_size
+        etag = etag or make_etag(stat, sha256)
+        mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'ETag': etag,
+            'Last-Modified': http_date(stat.st_mtime),
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            'Content-Disposition': content_disposition(download_name, as_attachment)
+        }
+        if extra_headers:
+            headers.update(extra_headers)
+
+        if request.method in ('GET', 'HEAD') and not_modified(etag, stat.st_mtime):
+            file.close()
+            return Response(status=304, headers=headers)
+
+        ranges = resolve_ranges(size)
+        if ranges is not None and not if_range_matches(etag, stat.st_mtime):
+            ranges = None
+        if ranges is not None and len(ranges) > MAX_RANGES:
+            ranges = None
+
+        if ranges == []:
+            file.close()
+            headers['Content-Range'] = f'bytes */{size}'
+            return Response(status=416, headers=headers)
+
+        if ranges is None:
+            status = 200
+            start, end = 0, size
+        elif len(ranges) == 1:
+            status = 206
+            start, end = ranges[0]
+            headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+        else:
+            return _multipart_response(file, ranges, size, mimetype, headers)
+
+        headers['Content-Length'] = str(end - start)
+        file_wrapper = request.environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            file.seek(start)
+            body = file_wrapper(file, READ_CHUNK_SIZE)
+        else:
+            body = FileRangeIterator(file, [(b'', start, end)])
+
+        return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
+    except BaseException:
+        file.close()
+        raise
+
+
+def _multipart_response(file, ranges, size, mimetype, headers):
+    boundary = uuid.uuid4().hex
+    segments = []
+    length = 0
+    for i, (start, end) in enumerate(ranges):
+        separator = '' if i == 0 else '\r\n'
+        prefix = (f'{separator}--{boundary}\r\n'
+                  f'Content-Type: {mimetype}\r\n'
+                  f'Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n').encode('latin-1')
+        segments.append((prefix, start, end))
+        length += len(prefix) + end - start
+    epilogue = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+    segments.append((epilogue, None, None))
+    length += len(epilogue)
+
+    headers['Content-Length'] = str(length)
+    return Response(FileRangeIterator(file, segments), status=206, headers=headers,
+                    mimetype=f'multipart/byteranges; boundary={boundary}', direct_passthrough=True)
+
+
+# 虚拟内容的下载响应：size 为总长度，make_body(start, end) 返回 [start, end) 区间内容的可迭代对象。
+# 支持条件请求与单区间 Range；多区间请求按整个内容返回。不需要返回内容（304/416）时不调用 make_body
+def send_virtual_response(size, mtime, make_body, download_name, etag, as_attachment=True, immutable=False):
+    mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': http_date(mtime),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        'Content-Disposition': content_disposition(download_name, as_attachment)
+    }
+
+    if request.method in ('GET', 'HEAD') and not_modified(etag, mtime):
+        return Response(status=304, headers=headers)
+
+    ranges = resolve_ranges(size)
+    if ranges is not None and (not if_range_matches(etag, mtime) or len(ranges) > 1):
+        ranges = None
+    if ranges == []:
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(status=416, headers=headers)
+
+    if ranges is None:
+        status = 200
+        start, end = 0, size
+    else:
+        status = 206
+        start, end = ranges[0]
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+    headers['Content-Length'] = str(end - start)
+    return Response(make_body(start, end), status=status, headers=headers,
+                    mimetype=mimetype, direct_passthrough=True)
+
+
+# 虚拟文件下载响应（如 MP4 剪辑）：内容由 pieces 拼接而成，不在磁盘上生成副本。
+# file 为已打开的源文件，响应结束时关闭
+def send_pieces_response(file, pieces, download_name, etag, as_attachment=True, immutable=False):
+    try:
+        response = send_virtual_response(
+            sum(piece_length(piece) for piece in pieces), os.fstat(file.fileno()).st_mtime,
+            lambda start, end: PieceIterator(file, pieces, start, end),
+            download_name, etag, as_attachment=as_attachment, immutable=immutable)
+    except BaseException:
+        file.close()
+        raise
+    if not isinstance(response.response, PieceIterator):
+        file.close()
+    return response
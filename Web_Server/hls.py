@@ -0,0 +1,206 @@
+import bisect
+import math
+import os
+import struct
+import threading
+
+from mp4_tools import Box, load_movie
+
+# HLS 点播：把已有 MP4 的采样表切分为按关键帧对齐的片段，描述为一个虚拟的分片 MP4（fMP4）。
+# 普通 MP4 的字节区间不是合法的 HLS 片段，因此每个片段由生成的 moof 加上原文件中对应的采样数据组成；
+# 整个虚拟文件以 (字节串 | (源偏移, 长度)) 片段列表表示，不在磁盘上生成副本，
+# 播放列表用 EXT-X-MAP 与 EXT-X-BYTERANGE 引用其中的初始化段和各个媒体片段
+
+# 目标片段时长（秒），片段在时长达到该值后的第一个关键帧处切分
+SEGMENT_DURATION = 6
+# 缓存的文件数
+PLAN_CACHE_SIZE = 8
+
+# trun 采样标志：关键帧不依赖其他帧；非关键帧依赖其他帧且标记为非同步采样
+SYNC_SAMPLE_FLAGS = 0x02000000
+NON_SYNC_SAMPLE_FLAGS = 0x01010000
+# 清空后保留在 stbl 中的盒子（采样数据全部放在 moof 中描述）
+INIT_STBL_BOXES = (b'stsd',)
+
+
+def _full_box(box_type, version, flags, payload):
+    return Box(box_type, struct.pack('>I', (version << 24) | flags) + payload)
+
+
+def _empty_table(box_type):
+    if box_type == b'stsz':
+        return _full_box(box_type, 0, 0, struct.pack('>II', 0, 0))
+    return _full_box(box_type, 0, 0, struct.pack('>I', 0))
+
+
+# 初始化段：ftyp + moov（采样表清空，增加 mvex/trex 声明分片）
+def build_init_segment(movie):
+    moov = movie.parse_moov()
+    for trak, track in zip(moov.find_all(b'trak'), movie.tracks):
+        stbl = trak.find(b'mdia').find(b'minf').find(b'stbl')
+        stbl.children = ([box for box in stbl.children if box.type in INIT_STBL_BOXES] +
+                         [_empty_table(box_type) for box_type in (b'stts', b'stsc', b'stsz', b'stco')])
+    moov.children.append(Box(b'mvex', None, [
+        _full_box(b'trex', 0, 0, struct.pack('>IIIII', track.track_id, 1, 0, 0, 0))
+        for track in movie.tracks
+    ]))
+    ftyp = Box(b'ftyp', b'iso6' + struct.pack('>I', 0) + b'iso6mp41').to_bytes()
+    return ftyp + moov.to_bytes()
+
+
+# 按参考轨道（视频轨）的关键帧切分片段，返回各片段起点在参考轨道中的采样编号（最后一项为采样总数）
+def segment_boundaries(movie, segment_duration=SEGMENT_DURATION):
+    reference = movie.reference_track()
+    sync_samples = reference.sync_samples
+    if sync_samples is None:
+        sync_samples = range(reference.sample_count)
+
+    target = segment_duration * reference.timescale
+    boundaries = [0]
+    for sample in sync_samples:
+        if reference.decode_times[sample] - reference.decode_times[boundaries[-1]] >= target:
+            boundaries.append(sample)
+    boundaries.append(reference.sample_count)
+    return boundaries
+
+
+# 参考轨道时间 ticks（参考轨道时间刻度）之后的第一个采样；用整数比较，避免浮点误差导致片段边界错位
+def _first_sample_at(track, reference, ticks):
+    if ticks >= reference.total_duration:
+        return track.sample_count
+    threshold = -(-ticks * track.timescale // reference.timescale)
+    return bisect.bisect_left(track.decode_times, threshold)
+
+
+# 同一轨道中连续且在源文件中相邻的采样合并为一个片段
+def _sample_pieces(track, first, last):
+    pieces = []
+    for sample in range(first, last):
+        offset = track.sample_offsets[sample]
+        size = track.sample_sizes[sample]
+        if pieces and pieces[-1][0] + pieces[-1][1] == offset:
+            pieces[-1] = (pieces[-1][0], pieces[-1][1] + size)
+        else:
+            pieces.append((offset, size))
+    return pieces
+
+
+def _traf(track, first, last, data_offset):
+    tfhd = _full_box(b'tfhd', 0, 0x020000, struct.pack('>I', track.track_id))
+    tfdt = _full_box(b'tfdt', 1, 0, struct.pack('>Q', track.decode_times[first]))
+
+    flags = 0x000001 | 0x000100 | 0x000200 | 0x000400
+    offsets = track.composition_offsets
+    if offsets is not None:
+        flags |= 0x000800
+    sync = None if track.sync_samples is None else set(
+        track.sync_samples[bisect.bisect_left(track.sync_samples, first):
+                           bisect.bisect_left(track.sync_samples, last)])
+
+    entries = []
+    for sample in range(first, last):
+        sample_flags = SYNC_SAMPLE_FLAGS if sync is None or sample in sync else NON_SYNC_SAMPLE_FLAGS
+        entries.append(struct.pack('>III', track.durations[sample], track.sample_sizes[sample], sample_flags))
+        if offsets is not None:
+            entries.append(struct.pack('>i', offsets[sample] if offsets[sample] < 0x80000000
+                                       else offsets[sample] - 0x100000000))
+    # version 1 的 trun 中合成时间偏移为有符号数
+    trun = _full_box(b'trun', 1, flags, struct.pack('>Ii', last - first, data_offset) + b''.join(entries))
+    return Box(b'traf', None, [tfhd, tfdt, trun])
+
+
+# 生成一个媒体片段（参考轨道的采样 [first, last)）：moof + mdat 头（字节串）与各轨道的采样数据片段
+def build_media_segment(movie, sequence, first, last):
+    reference = movie.reference_track()
+    start = reference.decode_times[first]
+    end = reference.decode_times[last] if last < reference.sample_count else reference.total_duration
+    ranges = []
+    for track in movie.tracks:
+        if track is reference:
+            track_first, track_last = first, last
+        else:
+            track_first = _first_sample_at(track, reference, start) if first else 0
+            track_last = _first_sample_at(track, reference, end) if last < reference.sample_count \
+                else track.sample_count
+        if track_first < track_last:
+            ranges.append((track, track_first, track_last))
+
+    data_sizes = [sum(track.sample_sizes[first:last]) for track, first, last in ranges]
+    mdat_size = 8 + sum(data_sizes)
+
+    # moof 的大小与数据偏移的取值无关，先按 0 计算大小再填入实际偏移
+    def moof_bytes(moof_size):
+        data_offset = moof_size + 8
+        trafs = []
+        for (track, first, last), size in zip(ranges, data_sizes):
+            trafs.append(_traf(track, first, last, data_offset))
+            data_offset += size
+        mfhd = _full_box(b'mfhd', 0, 0, struct.pack('>I', sequence))
+        return Box(b'moof', None, [mfhd] + trafs).to_bytes()
+
+    moof = moof_bytes(len(moof_bytes(0)))
+    pieces = [moof + struct.pack('>I4s', mdat_size, b'mdat')]
+    for track, first, last in ranges:
+        pieces.extend(_sample_pieces(track, first, last))
+    return pieces
+
+
+class HlsPlan:
+    def __init__(self, movie, segment_duration=SEGMENT_DURATION):
+        init = build_init_segment(movie)
+        self.pieces = [init]
+        self.init_size = len(init)
+        # [(时长, 字节长度, 字节偏移), ...]
+        self.segments = []
+        position = self.init_size
+        reference = movie.reference_track()
+        boundaries = segment_boundaries(movie, segment_duration)
+        for sequence, (first, last) in enumerate(zip(boundaries, boundaries[1:]), 1):
+            pieces = build_media_segment(movie, sequence, first, last)
+            end = reference.decode_times[last] if last < reference.sample_count else reference.total_duration
+            duration = (end - reference.decode_times[first]) / reference.timescale
+            length = sum(len(piece) if isinstance(piece, bytes) else piece[1] for piece in pieces)
+            self.segments.append((duration, length, position))
+            self.pieces.extend(pieces)
+            position += length
+        self.size = position
+
+    # EXT-X-BYTERANGE 播放列表，所有片段引用同一个虚拟 fMP4 地址
+    def playlist(self, media_url):
+        target = max(math.ceil(duration) for duration, _, _ in self.segments)
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:7',
+            f'#EXT-X-TARGETDURATION:{target}',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXT-X-PLAYLIST-TYPE:VOD',
+            '#EXT-X-INDEPENDENT-SEGMENTS',
+            f'#EXT-X-MAP:URI="{media_url}",BYTERANGE="{self.init_size}@0"',
+        ]
+        for duration, length, offset in self.segments:
+            lines.append(f'#EXTINF:{duration:.3f},')
+            lines.append(f'#EXT-X-BYTERANGE:{length}@{offset}')
+            lines.append(media_url)
+        lines.append('#EXT-X-ENDLIST')
+        return '\n'.join(lines) + '\n'
+
+
+_plan_cache = {}
+_plan_cache_lock = threading.Lock()
+
+
+# 返回文件的 HLS 切分方案；按 (路径, inode, 修改时间) 缓存，file 为已打开的源文件
+def load_plan(path, file):
+    stat = os.fstat(file.fileno())
+    key = (path, stat.st_ino, stat.st_mtime_ns)
+    with _plan_cache_lock:
+        plan = _plan_cache.get(key)
+    if plan is not None:
+        return plan
+
+    plan = HlsPlan(load_movie(path, file))
+    with _plan_cache_lock:
+        if len(_plan_cache) >= PLAN_CACHE_SIZE:
+            _plan_cache.pop(next(iter(_plan_cache)))
+        _plan_cache[key] = plan
+    return plan
@@ -0,0 +1,655 @@
+import math
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+# 只读取容器头部的媒体元数据探测（纯 Python，不解码音视频数据）
+# 返回字典，按格式包含 format、duration（秒）、width、height、video_codec、audio_codec、
+# sample_rate、channels、bitrate（比特/秒）等字段；无法识别的文件返回 None
+
+# 一次最多读取的头部数据量（moov 等元数据盒子超过该大小时放弃）
+MAX_HEADER_SIZE = 64 * 1024 * 1024
+# 查找 MP3 帧同步时最多扫描的字节数
+SCAN_SIZE = 256 * 1024
+# 后台探测每批写入的文件数
+PROBE_BATCH_SIZE = 200
+
+
+class ProbeError(Exception):
+    pass
+
+
+def probe_media(path):
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        head = f.read(64)
+        for matches, parser in PARSERS:
+            if matches(head, path):
+                f.seek(0)
+                try:
+                    info = parser(f, size)
+                except (ProbeError, struct.error, ValueError, IndexError, OverflowError):
+                    return None
+                if info is None:
+                    return None
+                duration = info.get('duration')
+                if duration is not None:
+                    # 损坏的文件可能记录负数、NaN、无穷大或极小的时长
+                    if 0 < duration < math.inf and round(duration, 3) > 0:
+                        info['duration'] = round(duration, 3)
+                        info.setdefault('bitrate', int(size * 8 / info['duration']))
+                    else:
+                        del info['duration']
+                return info
+    return None
+
+
+# length 可能来自文件中的长度字段，超过 MAX_HEADER_SIZE 时放弃，避免按伪造的长度分配内存
+def _read_exact(f, length):
+    if not 0 <= length <= MAX_HEADER_SIZE:
+        raise ProbeError('无效的数据长度')
+    data = f.read(length)
+    if len(data) < length:
+        raise ProbeError('文件不完整')
+    return data
+
+
+# ---------- 图片 ----------
+
+def _probe_png(f, size):
+    data = _read_exact(f, 33)
+    if data[12:16] != b'IHDR':
+        raise ProbeError('缺少 IHDR')
+    width, height = struct.unpack('>II', data[16:24])
+    return {'format': 'png', 'width': width, 'height': height}
+
+
+def _probe_gif(f, size):
+    data = _read_exact(f, 10)
+    width, height = struct.unpack('<HH', data[6:10])
+    return {'format': 'gif', 'width': width, 'height': height}
+
+
+def _probe_bmp(f, size):
+    data = _read_exact(f, 26)
+    width, height = struct.unpack('<ii', data[18:26])
+    return {'format': 'bmp', 'width': width, 'height': abs(height)}
+
+
+# SOF 标记（不含 DHT/JPG/DAC）中记录图像尺寸
+# SOF 之前一般只有 EXIF、ICC 等元数据段（每段不超过 64 KB），查找 SOF 时最多读取 JPEG_SCAN_SIZE 字节
+JPEG_SCAN_SIZE = 512 * 1024
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _probe_jpeg(f, size):
+    # 一次读入文件开头，在缓冲区内逐段跳过（段长度在标记之后），直到找到 SOF；遇到 SOS/EOI 说明没有尺寸信息
+    data = f.read(JPEG_SCAN_SIZE)
+    pos = 2
+    while True:
+        pos = data.find(b'\xff', pos)
+        if pos < 0:
+            raise ProbeError('未找到 SOF 标记')
+        while pos < len(data) and data[pos] == 0xFF:
+            pos += 1
+        if pos >= len(data):
+            raise ProbeError('未找到 SOF 标记')
+        marker = data[pos]
+        pos += 1
+        if marker in (0x00, 0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):
+            raise ProbeError('未找到 SOF 标记')
+        if pos + 2 > len(data):
+            raise ProbeError('未找到 SOF 标记')
+        length = struct.unpack_from('>H', data, pos)[0]
+        if length < 2:
+            raise ProbeError('无效的段长度')
+        if marker in JPEG_SOF_MARKERS:
+            if pos + 7 > len(data):
+                raise ProbeError('文件不完整')
+            height, width = struct.unpack_from('>HH', data, pos + 3)
+            return {'format': 'jpeg', 'width': width, 'height': height}
+        pos += length
+
+
+def _probe_webp(f, size):
+    data = _read_exact(f, 30)
+    chunk = data[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', data[26:30])
+        return {'format': 'webp', 'width': width & 0x3FFF, 'height': height & 0x3FFF}
+    if chunk == b'VP8L':
+        bits = struct.unpack('<I', data[21:25])[0]
+        return {'format': 'webp', 'width': (bits & 0x3FFF) + 1, 'height': ((bits >> 14) & 0x3FFF) + 1}
+    if chunk == b'VP8X':
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return {'format': 'webp', 'width': width, 'height': height}
+    raise ProbeError('未知的 WebP 格式')
+
+
+# ---------- 音频 ----------
+
+WAV_CODECS = {1: 'pcm', 3: 'pcm_float', 6: 'alaw', 7: 'mulaw', 0x55: 'mp3', 0xFFFE: 'pcm'}
+
+
+def _probe_wav(f, size):
+    f.seek(12)
+    info = {'format': 'wav'}
+    byte_rate = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, chunk_size = struct.unpack('<4sI', header)
+        if chunk_id == b'fmt ':
+            if chunk_size < 16:
+                raise ProbeError('无效的 fmt 块')
+            data = _read_exact(f, 16)
+            codec, channels, sample_rate, byte_rate = struct.unpack('<HHII', data[:12])
+            info.update({'audio_codec': WAV_CODECS.get(codec, f'0x{codec:04x}'),
+                         'channels': channels, 'sample_rate': sample_rate,
+                         'bitrate': byte_rate * 8})
+            f.seek(chunk_size - 16 + (chunk_size & 1), os.SEEK_CUR)
+        elif chunk_id == b'data':
+            # 流式录制的文件 data 大小可能未填写（0 或 0xFFFFFFFF），以文件剩余长度为准
+            data_size = chunk_size
+            if data_size in (0, 0xFFFFFFFF) or f.tell() + data_size > size:
+                data_size = size - f.tell()
+            if byte_rate:
+                info['duration'] = data_size / byte_rate
+            break
+        else:
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+    return info
+
+
+def _probe_flac(f, size):
+    f.seek(4)
+    while True:
+        header = _read_exact(f, 4)
+        last = header[0] & 0x80
+        block_type = header[0] & 0x7F
+        length = int.from_bytes(header[1:4], 'big')
+        if block_type == 0:
+            data = _read_exact(f, 18)
+            bits = int.from_bytes(data[10:18], 'big')
+            sample_rate = bits >> 44
+            channels = ((bits >> 41) & 0x7) + 1
+            total_samples = bits & 0xFFFFFFFFF
+            info = {'format': 'flac', 'audio_codec': 'flac', 'sample_rate': sample_rate, 'channels': channels}
+            if sample_rate and total_samples:
+                info['duration'] = total_samples / sample_rate
+            return info
+        if last:
+            break
+        f.seek(length, os.SEEK_CUR)
+    raise ProbeError('缺少 STREAMINFO')
+
+
+MP3_BITRATES = {
+    # (MPEG-1, Layer) -> kbps
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    # MPEG-2/2.5
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+
+def _parse_mp3_header(header):
+    if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = {0: 25, 2: 2, 3: 1}.get((header[1] >> 3) & 0x3)
+    layer = {1: 3, 2: 2, 3: 1}.get((header[1] >> 1) & 0x3)
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x3
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    channels = 1 if header[3] >> 6 == 3 else 2
+    if layer == 1:
+        samples = 384
+    elif layer == 3 and version != 1:
+        samples = 576
+    else:
+        samples = 1152
+    return {'version': version, 'layer': layer, 'bitrate': bitrate, 'sample_rate': sample_rate,
+            'channels': channels, 'samples': samples}
+
+
+def _probe_mp3(f, size):
+    start = 0
+    head = _read_exact(f, 10)
+    if head[:3] == b'ID3':
+        # ID3v2 标签大小为 4 个 7 位的同步安全整数
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+
+    f.seek(start)
+    data = f.read(SCAN_SIZE)
+    for offset in range(len(data) - 4):
+        frame = _parse_mp3_header(data[offset:offset + 4])
+        if frame is not None:
+            break
+    else:
+        raise ProbeError('未找到 MP3 帧')
+
+    info = {'format': 'mp3', 'audio_codec': 'mp3', 'sample_rate': frame['sample_rate'],
+            'channels': frame['channels']}
+    # VBR 文件的第一帧中带有 Xing/Info 或 VBRI 头，记录总帧数
+    frames = None
+    for tag in (b'Xing', b'Info'):
+        pos = data.find(tag, offset, offset + 64)
+        if pos != -1:
+            flags = struct.unpack('>I', data[pos + 4:pos + 8])[0]
+            if flags & 0x1:
+                frames = struct.unpack('>I', data[pos + 8:pos + 12])[0]
+            break
+    if frames is None and data[offset + 36:offset + 40] == b'VBRI':
+        frames = struct.unpack('>I', data[offset + 50:offset + 54])[0]
+
+    if frames:
+        info['duration'] = frames * frame['samples'] / frame['sample_rate']
+    else:
+        info['bitrate'] = frame['bitrate']
+        info['duration'] = (size - start - offset) * 8 / frame['bitrate']
+    return info
+
+
+# ---------- MP4 / MOV ----------
+
+MP4_CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts'}
+
+
+# 遍历 data[start:end] 中的盒子，返回 [(类型, 内容起点, 内容终点), ...]
+def iter_boxes(data, start=0, end=None):
+    end = len(data) if end is None else end
+    boxes = []
+    pos = start
+    while pos + 8 <= end:
+        box_size, box_type = struct.unpack('>I4s', data[pos:pos + 8])
+        header = 8
+        if box_size == 1:
+            box_size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+            header = 16
+        elif box_size == 0:
+            box_size = end - pos
+        if box_size < header or pos + box_size > end:
+            break
+        boxes.append((box_type, pos + header, pos + box_size))
+        pos += box_size
+    return boxes
+
+
+# 在文件顶层查找指定盒子，返回 (内容起点, 内容长度)
+def find_top_level_box(f, size, wanted):
+    pos = 0
+    while pos + 8 <= size:
+        f.seek(pos)
+        header = _read_exact(f, 8)
+        box_size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if box_size == 1:
+            box_size = struct.unpack('>Q', _read_exact(f, 8))[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = size - pos
+        if box_size < header_size:
+            raise ProbeError('无效的盒子大小')
+        if box_type == wanted:
+            return pos + header_size, box_size - header_size
+        pos += box_size
+    return None
+
+
+MP4_CODECS = {
+    'avc1': 'h264', 'avc3': 'h264', 'hvc1': 'hevc', 'hev1': 'hevc', 'vp09': 'vp9', 'av01': 'av1',
+    'mp4v': 'mpeg4', 'mp4a': 'aac', 'Opus': 'opus', 'fLaC': 'flac', 'ac-3': 'ac3', '.mp3': 'mp3',
+}
+
+
+def _fourcc(value):
+    fourcc = value.decode('latin-1').strip()
+    return MP4_CODECS.get(fourcc, fourcc)
+
+
+def _probe_mp4(f, size):
+    found = find_top_level_box(f, size, b'moov')
+    if found is None:
+        raise ProbeError('缺少 moov')
+    start, length = found
+    if length > MAX_HEADER_SIZE:
+        raise ProbeError('moov 过大')
+    f.seek(start)
+    moov = _read_exact(f, length)
+
+    f.seek(8)
+    brand = f.read(4)
+    info = {'format': 'mov' if brand == b'qt  ' else 'mp4'}
+    for box_type, box_start, box_end in iter_boxes(moov):
+        if box_type == b'mvhd':
+            version = moov[box_start]
+            if version == 1:
+                timescale, duration = struct.unpack('>IQ', moov[box_start + 20:box_start + 32])
+            else:
+                timescale, duration = struct.unpack('>II', moov[box_start + 12:box_start + 20])
+            if timescale:
+                info['duration'] = duration / timescale
+        elif box_type == b'trak':
+            _probe_mp4_track(moov, box_start, box_end, info)
+    return info
+
+
+def _probe_mp4_track(data, start, end, info):
+    handler = None
+    width = height = None
+    codec = None
+    audio = {}
+    stack = [(start, end)]
+    while stack:
+        box_start, box_end = stack.pop()
+        for box_type, child_start, child_end in iter_boxes(data, box_start, box_end):
+            if box_type in MP4_CONTAINER_BOXES:
+                stack.append((child_start, child_end))
+            elif box_type == b'tkhd':
+                # 宽高为 16.16 定点数，位于 tkhd 末尾
+                width, height = struct.unpack('>II', data[child_end - 8:child_end])
+                width >>= 16
+                height >>= 16
+            elif box_type == b'hdlr' and handler is None:
+                # MOV 的 minf 中还有数据引用处理器（dhlr），只取 mdia 中的媒体处理器类型
+                handler = data[child_start + 8:child_start + 12]
+            elif box_type == b'stsd':
+                entries = iter_boxes(data, child_start + 8, child_end)
+                if entries:
+                    entry_type, entry_start, _ = entries[0]
+                    codec = _fourcc(entry_type)
+                    # 音频采样描述：声道数位于偏移 16，采样率（16.16）位于偏移 24
+                    audio['channels'] = struct.unpack('>H', data[entry_start + 16:entry_start + 18])[0]
+                    audio['sample_rate'] = struct.unpack('>I', data[entry_start + 24:entry_start + 28])[0] >> 16
+
+    if handler == b'vide' and 'video_codec' not in info:
+        info['video_codec'] = codec
+        if width and height:
+            info['width'] = width
+            info['height'] = height
+    elif handler == b'soun' and 'audio_codec' not in info:
+        info['audio_codec'] = codec
+        info.update(audio)
+
+
+# ---------- Matroska / WebM ----------
+
+EBML_HEADER = 0x1A45DFA3
+MKV_SEGMENT = 0x18538067
+MKV_INFO = 0x1549A966
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_CLUSTER = 0x1F43B675
+MKV_UNKNOWN_SIZE = -1
+
+
+def _read_vint(f, keep_marker=False):
+    first = f.read(1)
+    if not first:
+        raise ProbeError('文件不完整')
+    first = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ProbeError('无效的 EBML 长度')
+    value = first if keep_marker else first & (mask - 1)
+    all_ones = value == mask - 1
+    for byte in _read_exact(f, length - 1):
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    if not keep_marker and all_ones:
+        return MKV_UNKNOWN_SIZE
+    return value
+
+
+def _read_element_header(f):
+    element_id = _read_vint(f, keep_marker=True)
+    element_size = _read_vint(f)
+    return element_id, element_size
+
+
+def _read_uint(data):
+    return int.from_bytes(data, 'big')
+
+
+def _read_float(data):
+    if len(data) == 4:
+        return struct.unpack('>f', data)[0]
+    if len(data) == 8:
+        return struct.unpack('>d', data)[0]
+    return 0.0
+
+
+# 读取内存中的子元素列表：[(id, 数据), ...]
+def _parse_elements(data):
+    elements = []
+    pos = 0
+    while pos < len(data):
+        f = _BytesReader(data, pos)
+        element_id, element_size = _read_element_header(f)
+        if element_size == MKV_UNKNOWN_SIZE:
+            break
+        if element_size > len(data) - f.pos:
+            raise ProbeError('元素超出父元素范围')
+        elements.append((element_id, data[f.pos:f.pos + element_size]))
+        pos = f.pos + element_size
+    return elements
+
+
+class _BytesReader:
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.pos = pos
+
+    def read(self, length):
+        chunk = self.data[self.pos:self.pos + length]
+        self.pos += len(chunk)
+        return chunk
+
+
+MKV_CODECS = {
+    'V_MPEG4/ISO/AVC': 'h264', 'V_MPEGH/ISO/HEVC': 'hevc', 'V_VP8': 'vp8', 'V_VP9': 'vp9', 'V_AV1': 'av1',
+    'A_AAC': 'aac', 'A_OPUS': 'opus', 'A_VORBIS': 'vorbis', 'A_MPEG/L3': 'mp3', 'A_FLAC': 'flac', 'A_AC3': 'ac3',
+}
+
+
+def _probe_matroska(f, size):
+    element_id, element_size = _read_element_header(f)
+    if element_id != EBML_HEADER:
+        raise ProbeError('缺少 EBML 头')
+    if element_size == MKV_UNKNOWN_SIZE or element_size > min(size - f.tell(), MAX_HEADER_SIZE):
+        raise ProbeError('无效的 EBML 头大小')
+    doc_type = 'matroska'
+    for child_id, value in _parse_elements(_read_exact(f, element_size)):
+        if child_id == 0x4282:
+            doc_type = value.decode('ascii', 'replace').rstrip('\x00')
+
+    element_id, element_size = _read_element_header(f)
+    if element_id != MKV_SEGMENT:
+        raise ProbeError('缺少 Segment')
+    segment_end = size if element_size == MKV_UNKNOWN_SIZE else min(size, f.tell() + element_size)
+
+    info = {'format': 'webm' if doc_type == 'webm' else 'mkv'}
+    found_info = found_tracks = False
+    # Info 和 Tracks 位于第一个 Cluster 之前，遇到 Cluster 即停止
+    while f.tell() < segment_end and not (found_info and found_tracks):
+        element_id, element_size = _read_element_header(f)
+        if element_id == MKV_CLUSTER or element_size == MKV_UNKNOWN_SIZE:
+            break
+        if element_id in (MKV_INFO, MKV_TRACKS):
+            if element_size > min(size - f.tell(), MAX_HEADER_SIZE):
+                raise ProbeError('元数据过大')
+            data = _read_exact(f, element_size)
+            if element_id == MKV_INFO:
+                found_info = True
+                _parse_mkv_info(data, info)
+            else:
+                found_tracks = True
+                _parse_mkv_tracks(data, info)
+        elif element_size > segment_end - f.tell():
+            break
+        else:
+            f.seek(element_size, os.SEEK_CUR)
+    return info
+
+
+def _parse_mkv_info(data, info):
+    timecode_scale = 1000000
+    duration = None
+    for element_id, value in _parse_elements(data):
+        if element_id == 0x2AD7B1:
+            timecode_scale = _read_uint(value)
+        elif element_id == 0x4489:
+            duration = _read_float(value)
+    if duration:
+        info['duration'] = duration * timecode_scale / 1e9
+
+
+def _parse_mkv_tracks(data, info):
+    for element_id, entry in _parse_elements(data):
+        if element_id != MKV_TRACK_ENTRY:
+            continue
+        track_type = codec = None
+        video = audio = None
+        for child_id, value in _parse_elements(entry):
+            if child_id == 0x83:
+                track_type = _read_uint(value)
+            elif child_id == 0x86:
+                codec_id = value.decode('ascii', 'replace').rstrip('\x00')
+                codec = MKV_CODECS.get(codec_id, codec_id)
+            elif child_id == 0xE0:
+                video = _parse_elements(value)
+            elif child_id == 0xE1:
+                audio = _parse_elements(value)
+
+        if track_type == 1 and 'video_codec' not in info:
+            info['video_codec'] = codec
+            for child_id, value in video or []:
+                if child_id == 0xB0:
+                    info['width'] = _read_uint(value)
+                elif child_id == 0xBA:
+                    info['height'] = _read_uint(value)
+        elif track_type == 2 and 'audio_codec' not in info:
+            info['audio_codec'] = codec
+            for child_id, value in audio or []:
+                if child_id == 0xB5:
+                    info['sample_rate'] = int(_read_float(value))
+                elif child_id == 0x9F:
+                    info['channels'] = _read_uint(value)
+
+
+def _extension(path):
+    return os.path.splitext(path)[1].lower().lstrip('.')
+
+
+# (判断函数(文件开头 64 字节, 路径), 解析函数)；按顺序匹配
+PARSERS = [
+    (lambda head, path: head.startswith(b'\x89PNG\r\n\x1a\n'), _probe_png),
+    (lambda head, path: head[:6] in (b'GIF87a', b'GIF89a'), _probe_gif),
+    (lambda head, path: head.startswith(b'\xff\xd8'), _probe_jpeg),
+    (lambda head, path: head[:4] == b'RIFF' and head[8:12] == b'WEBP', _probe_webp),
+    (lambda head, path: head[:4] == b'RIFF' and head[8:12] == b'WAVE', _probe_wav),
+    (lambda head, path: head.startswith(b'BM') and _extension(path) == 'bmp', _probe_bmp),
+    (lambda head, path: head.startswith(b'fLaC'), _probe_flac),
+    (lambda head, path: head[4:8] == b'ftyp' or (head[4:8] in (b'moov', b'mdat', b'wide', b'free')
+                                                  and _extension(path) in ('mov', 'mp4', 'm4v', 'm4a', '3gp')),
+     _probe_mp4),
+    (lambda head, path: head.startswith(b'\x1a\x45\xdf\xa3'), _probe_matroska),
+    (lambda head, path: head.startswith(b'ID3') or (_extension(path) == 'mp3' and head[:1] == b'\xff'), _probe_mp3),
+]
+
+
+# 探测文件并捕获所有异常：探测失败与无法识别一样返回 None（调用方缓存该结果，不会反复探测）
+def probe_file(path, label=None):
+    try:
+        return probe_media(path)
+    except Exception as e:
+        print(f"⚠️ 媒体信息探测失败 {label or path}: {e}")
+        return None
+
+
+# 后台探测尚未缓存媒体信息的文件（启动时扫描、对账发现的外部文件），列表接口只读取缓存，不打开文件。
+# 线程启动时及每隔 interval 秒（0 表示只在启动时）由 list_unprobed() 取得待探测的文件名；
+# 每探测 PROBE_BATCH_SIZE 个文件调用一次 save([(文件名, 媒体信息), ...]) 批量写入
+class MediaProbeWorker:
+    def __init__(self, source_path, list_unprobed, save, interval=300):
+        self.source_path = source_path
+        self.list_unprobed = list_unprobed
+        self.save = save
+        self.interval = interval
+        self._queue = deque()
+        self._queued = set()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._thread_pid = None
+        self._thread_lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return len(self._queued)
+
+    def probe(self, filename):
+        return probe_file(self.source_path(filename), filename)
+
+    # 加入队列（已在队列中的文件跳过）
+    def schedule_many(self, filenames):
+        with self._condition:
+            for filename in filenames:
+                if filename not in self._queued:
+                    self._queued.add(filename)
+                    self._queue.append(filename)
+            self._condition.notify()
+
+    # 线程按进程启动，fork 出的工作进程中需要重新调用
+    def start_background(self):
+        with self._thread_lock:
+            if self._thread is None or self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='media-probe', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def _sync(self):
+        try:
+            self.schedule_many(self.list_unprobed())
+        except Exception as e:
+            print(f"⚠️ 读取待探测文件失败: {e}")
+
+    def _run(self):
+        self._sync()
+        next_sync = time.monotonic() + self.interval
+        while True:
+            with self._condition:
+                while not self._queue:
+                    timeout = next_sync - time.monotonic() if self.interval else None
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                batch = [self._queue.popleft() for _ in range(min(PROBE_BATCH_SIZE, len(self._queue)))]
+            if not batch:
+                self._sync()
+                next_sync = time.monotonic() + self.interval
+                continue
+            try:
+                self.save([(filename, self.probe(filename)) for filename in batch])
+            except Exception as e:
+                print(f"⚠️ 保存媒体信息失败: {e}")
+            finally:
+                with self._condition:
+                    self._queued.difference_update(batch)
@@ -0,0 +1,248 @@
+import argparse
+import bisect
+import math
+import threading
+import time
+
+# 进程内指标注册表，以 Prometheus 文本格式（0.0.4）输出。
+# 每个标签组合对应一个子指标，各自持有一把锁，临界区只有几次加法（分桶位置在锁外计算）；
+# 标签组合的查找是无锁的字典读取，只有首次出现时才加注册表锁。
+# 多进程部署时每个工作进程各自计数，/metrics 返回处理该请求的进程的数据
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# 请求耗时分桶（秒）：覆盖接口调用（毫秒级）到大文件传输（分钟级）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} 需要标签 {self.labelnames}')
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in self._items():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    # callback 可选：输出时调用以取得当前值（只用于无标签的指标）
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def collect(self):
+        if self.callback is not None:
+            self._default.set(self.callback())
+        return super().collect()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in self._items():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if any(existing.name == metric.name for existing in self._metrics):
+                raise ValueError(f'指标已存在: {metric.name}')
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback=callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+# 微基准：python metrics.py [--threads 8] [--count 200000]
+# 测量一次请求的记录开销（计数、耗时分桶、字节数、进行中数量加减），用于确认可在下载路径上常开
+def main():
+    parser = argparse.ArgumentParser(description='指标记录开销微基准')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--count', type=int, default=200000, help='每个线程记录的请求数')
+    args = parser.parse_args()
+
+    registry = Registry()
+    requests_total = registry.counter('bench_requests_total', '请求数', ('route', 'method', 'status'))
+    duration = registry.histogram('bench_request_duration_seconds', '请求耗时', ('route', 'method', 'status'))
+    response_bytes = registry.counter('bench_response_bytes_total', '响应字节数', ('route',))
+    in_flight = registry.gauge('bench_in_flight', '进行中的请求数')
+
+    def record_requests():
+        for i in range(args.count):
+            in_flight.inc()
+            requests_total.labels('/files/<filename>', 'GET', '200').inc()
+            duration.labels('/files/<filename>', 'GET', '200').observe((i % 1000) / 10000)
+            response_bytes.labels('/files/<filename>').inc(1048576)
+            in_flight.dec()
+
+    for threads in sorted({1, args.threads}):
+        workers = [threading.Thread(target=record_requests) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        total = threads * args.count
+        print(f'{threads} 线程: {total} 次请求记录，每次 {elapsed / total * 1e6:.2f} µs（墙钟时间 / 总次数）')
+
+    start = time.perf_counter()
+    text = registry.render()
+    print(f'输出 /metrics: {(time.perf_counter() - start) * 1000:.2f} ms，{len(text)} 字节')
+
+
+if __name__ == '__main__':
+    main()
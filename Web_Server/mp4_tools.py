@@ -0,0 +1,623 @@
+import bisect
+import hashlib
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from upload_stream import create_temp_file
+
+# MP4/MOV 容器工具：盒子（box/atom）解析与序列化、faststart 重排、按采样表剪辑
+
+MP4_EXTENSIONS = {'mp4', 'm4v', 'mov', 'm4a', '3gp'}
+# 需要递归解析子盒子的容器盒子，其余盒子保留原始字节
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts', b'dinf', b'mvex'}
+# moov 需要整体读入内存修改，超过该大小时不处理
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+UINT32_MAX = 0xFFFFFFFF
+
+
+class Mp4Error(Exception):
+    pass
+
+
+def is_mp4(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in MP4_EXTENSIONS
+
+
+class Box:
+    def __init__(self, box_type, payload=b'', children=None):
+        self.type = box_type
+        # 叶子盒子的内容（不含盒子头）；容器盒子为 None
+        self.payload = payload
+        self.children = children
+
+    def find(self, box_type):
+        for child in self.children or []:
+            if child.type == box_type:
+                return child
+        return None
+
+    def find_all(self, box_type):
+        return [child for child in self.children or [] if child.type == box_type]
+
+    # 同 find，缺少该子盒子时抛出 Mp4Error（文件不完整或不是支持的格式）
+    def require(self, box_type):
+        child = self.find(box_type)
+        if child is None:
+            raise Mp4Error(f'缺少 {box_type.decode("latin-1")} 盒子')
+        return child
+
+    # 按路径查找所有后代盒子，如 walk(b'trak', b'mdia', b'minf', b'stbl', b'stco')
+    def walk(self, *path):
+        boxes = [self]
+        for box_type in path:
+            boxes = [child for box in boxes for child in box.find_all(box_type)]
+        return boxes
+
+    def to_bytes(self):
+        if self.children is None:
+            body = self.payload
+        else:
+            body = b''.join(child.to_bytes() for child in self.children)
+        size = 8 + len(body)
+        if size > UINT32_MAX:
+            return struct.pack('>I4sQ', 1, self.type, size + 8) + body
+        return struct.pack('>I4s', size, self.type) + body
+
+
+# 解析 data[start:end] 中的盒子序列
+def parse_boxes(data, start=0, end=None):
+    end = len(data) if end is None else end
+    boxes = []
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack('>I4s', data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise Mp4Error(f'盒子 {box_type!r} 大小无效')
+        if box_type in CONTAINER_BOXES:
+            boxes.append(Box(box_type, None, parse_boxes(data, pos + header, pos + size)))
+        else:
+            boxes.append(Box(box_type, bytes(data[pos + header:pos + size])))
+        pos += size
+    return boxes
+
+
+# 列出文件顶层盒子：[(类型, 起始偏移, 总大小), ...]，只读取盒子头
+def read_top_level_boxes(f, size):
+    boxes = []
+    pos = 0
+    while pos + 8 <= size:
+        f.seek(pos)
+        header = f.read(16)
+        box_size, box_type = struct.unpack('>I4s', header[:8])
+        if box_size == 1:
+            box_size = struct.unpack('>Q', header[8:16])[0]
+        elif box_size == 0:
+            box_size = size - pos
+        if box_size < 8 or pos + box_size > size:
+            raise Mp4Error(f'盒子 {box_type!r} 大小无效')
+        boxes.append((box_type, pos, box_size))
+        pos += box_size
+    return boxes
+
+
+def read_moov(f, top_level_boxes):
+    for box_type, offset, size in top_level_boxes:
+        if box_type == b'moov':
+            if size > MAX_MOOV_SIZE:
+                raise Mp4Error('moov 过大')
+            f.seek(offset)
+            data = f.read(size)
+            if len(data) < size:
+                raise Mp4Error('文件不完整')
+            return parse_boxes(data)[0], offset, size
+    raise Mp4Error('缺少 moov')
+
+
+# ---------- stco / co64 ----------
+
+def read_chunk_offsets(box):
+    count = struct.unpack('>I', box.payload[4:8])[0]
+    fmt = '>%dI' if box.type == b'stco' else '>%dQ'
+    return list(struct.unpack(fmt % count, box.payload[8:8 + count * (4 if box.type == b'stco' else 8)]))
+
+
+# 写回分块偏移；超过 32 位时自动改为 co64
+def write_chunk_offsets(box, offsets):
+    if box.type == b'stco' and offsets and max(offsets) > UINT32_MAX:
+        box.type = b'co64'
+    fmt = '>I%dI' if box.type == b'stco' else '>I%dQ'
+    box.payload = box.payload[:4] + struct.pack(fmt % len(offsets), len(offsets), *offsets)
+
+
+def chunk_offset_boxes(moov):
+    return [box for stbl in moov.walk(b'trak', b'mdia', b'minf', b'stbl')
+            for box in stbl.children if box.type in (b'stco', b'co64')]
+
+
+# ---------- faststart ----------
+
+# moov 位于 mdat 之后（手机录制的文件常见），播放器需要先取到文件末尾才能开始播放
+def needs_faststart(path):
+    with open(path, 'rb') as f:
+        return moov_after_mdat(f, os.path.getsize(path))
+
+
+# 同 needs_faststart，f 为已打开的文件
+def moov_after_mdat(f, size):
+    types = [box_type for box_type, _, _ in read_top_level_boxes(f, size)]
+    return (b'moov' in types and b'mdat' in types and types.index(b'mdat') < types.index(b'moov'))
+
+
+class _HashingWriter:
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+
+
+def copy_range(src, dst, start, end):
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        data = src.read(min(COPY_BUFFER_SIZE, remaining))
+        if not data:
+            raise Mp4Error('文件不完整')
+        dst.write(data)
+        remaining -= len(data)
+
+
+# 把 moov 移到第一个 mdat 之前写入 dst（流式复制，内存占用为 moov 大小加一个缓冲块），
+# 返回输出内容的 SHA-256。被移动的区间 [第一个 mdat, 原 moov) 整体后移 moov 的大小，
+# 指向该区间的 stco/co64 分块偏移相应调整；偏移超过 32 位时 stco 改为 co64，moov 变大后重新计算
+def faststart(src_path, dst_file):
+    size = os.path.getsize(src_path)
+    with open(src_path, 'rb') as src:
+        boxes = read_top_level_boxes(src, size)
+        moov, moov_start, moov_size = read_moov(src, boxes)
+        if moov.find(b'mvex') is not None:
+            raise Mp4Error('分片 MP4 不需要重排')
+        insert_pos = next(offset for box_type, offset, _ in boxes if box_type == b'mdat')
+        if insert_pos > moov_start:
+            raise Mp4Error('moov 已位于 mdat 之前')
+
+        offset_boxes = chunk_offset_boxes(moov)
+        original_offsets = [read_chunk_offsets(box) for box in offset_boxes]
+        moov_bytes = moov.to_bytes()
+        for _ in range(3):
+            shift = len(moov_bytes)
+            for box, offsets in zip(offset_boxes, original_offsets):
+                write_chunk_offsets(box, [offset + shift if insert_pos <= offset < moov_start else offset
+                                          for offset in offsets])
+            moov_bytes = moov.to_bytes()
+            if len(moov_bytes) == shift:
+                break
+        else:
+            raise Mp4Error('无法确定 moov 大小')
+
+        writer = _HashingWriter(dst_file)
+        copy_range(src, writer, 0, insert_pos)
+        writer.write(moov_bytes)
+        copy_range(src, writer, insert_pos, moov_start)
+        copy_range(src, writer, moov_start + moov_size, size)
+    return writer.sha256.hexdigest()
+
+
+# 上传后的 faststart 后台任务：文件先以原始内容发布，检测到 moov 在末尾时重排到 temp_dir 中的临时文件，
+# 完成后调用 on_complete(filename, temp_path, sha256, original_stat) 由调用方替换原文件；
+# source_path(filename) 返回原文件路径
+class FaststartWorker:
+    def __init__(self, source_path, temp_dir, on_complete, max_workers=1):
+        self.source_path = source_path
+        self.temp_dir = temp_dir
+        self.on_complete = on_complete
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    # 线程池按进程创建，fork 出的工作进程不会继承父进程的线程
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='faststart')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def schedule(self, filename):
+        if is_mp4(filename):
+            return self._get_executor().submit(self.run, filename)
+        return None
+
+    def run(self, filename):
+        path = self.source_path(filename)
+        temp_path = None
+        try:
+            original_stat = os.stat(path)
+            if not needs_faststart(path):
+                return False
+            temp_file, temp_path = create_temp_file(self.temp_dir)
+            with temp_file:
+                sha256 = faststart(path, temp_file)
+            self.on_complete(filename, temp_path, sha256, original_stat)
+            return True
+        except (FileNotFoundError, Mp4Error):
+            return False
+        except Exception as e:
+            print(f"⚠️ faststart 重排失败 {filename}: {e}")
+            return False
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+# ---------- 采样表 ----------
+
+def _full_box_header(box):
+    return box.payload[:4]
+
+
+def _entries(box, fmt):
+    count = struct.unpack('>I', box.payload[4:8])[0]
+    entry_size = struct.calcsize(fmt)
+    return [struct.unpack_from(fmt, box.payload, 8 + i * entry_size) for i in range(count)]
+
+
+def _duration_field(box):
+    # mvhd/mdhd 的 duration 偏移：version 0 为 16（32 位），version 1 为 24（64 位）
+    return (24, '>Q') if box.payload[0] == 1 else (16, '>I')
+
+
+def _tkhd_duration_field(box):
+    return (28, '>Q') if box.payload[0] == 1 else (20, '>I')
+
+
+def _timescale(box):
+    offset = 20 if box.payload[0] == 1 else 12
+    return struct.unpack_from('>I', box.payload, offset)[0]
+
+
+def _set_field(box, field, value):
+    offset, fmt = field
+    if fmt == '>I' and value > UINT32_MAX:
+        value = UINT32_MAX
+    box.payload = box.payload[:offset] + struct.pack(fmt, value) + box.payload[offset + struct.calcsize(fmt):]
+
+
+# 解析后的轨道采样表（采样编号从 0 开始）
+class Track:
+    def __init__(self, index, trak):
+        self.index = index
+        tkhd = trak.require(b'tkhd')
+        self.track_id = struct.unpack_from('>I', tkhd.payload, 20 if tkhd.payload[0] == 1 else 12)[0]
+        mdia = trak.require(b'mdia')
+        stbl = mdia.require(b'minf').require(b'stbl')
+        hdlr = mdia.find(b'hdlr')
+        self.handler = hdlr.payload[8:12] if hdlr else None
+        self.timescale = _timescale(mdia.require(b'mdhd'))
+        if not self.timescale:
+            raise Mp4Error('轨道时间刻度无效')
+
+        # 每个采样的解码时长与解码时间
+        self.durations = []
+        for count, delta in _entries(stbl.require(b'stts'), '>II'):
+            self.durations.extend([delta] * count)
+        self.decode_times = []
+        time = 0
+        for delta in self.durations:
+            self.decode_times.append(time)
+            time += delta
+        self.total_duration = time
+
+        ctts = stbl.find(b'ctts')
+        self.composition_offsets = None
+        if ctts is not None:
+            fmt = '>Ii' if ctts.payload[0] == 1 else '>II'
+            self.composition_offsets = []
+            for count, offset in _entries(ctts, fmt):
+                self.composition_offsets.extend([offset] * count)
+
+        stsz = stbl.find(b'stsz')
+        if stsz is None:
+            raise Mp4Error('不支持的采样大小表')
+        sample_size, count = struct.unpack('>II', stsz.payload[4:12])
+        if sample_size:
+            self.sample_sizes = [sample_size] * count
+        else:
+            self.sample_sizes = list(struct.unpack_from(f'>{count}I', stsz.payload, 12))
+
+        stss = stbl.find(b'stss')
+        self.sync_samples = None if stss is None else [number - 1 for (number,) in _entries(stss, '>I')]
+
+        # 展开 stsc：每个采样所在的分块、在文件中的绝对偏移，以及分块使用的采样描述序号
+        offset_box = stbl.find(b'stco') or stbl.find(b'co64')
+        if offset_box is None:
+            raise Mp4Error('缺少分块偏移表')
+        chunk_offsets = read_chunk_offsets(offset_box)
+        stsc = _entries(stbl.require(b'stsc'), '>III')
+        self.sample_chunks = []
+        self.sample_offsets = []
+        self.chunk_description = []
+        sample = 0
+        for i, (first_chunk, samples_per_chunk, description) in enumerate(stsc):
+            last_chunk = stsc[i + 1][0] - 1 if i + 1 < len(stsc) else len(chunk_offsets)
+            for chunk in range(first_chunk - 1, last_chunk):
+                self.chunk_description.append(description)
+                offset = chunk_offsets[chunk]
+                for _ in range(samples_per_chunk):
+                    if sample >= len(self.sample_sizes):
+                        break
+                    self.sample_chunks.append(chunk)
+                    self.sample_offsets.append(offset)
+                    offset += self.sample_sizes[sample]
+                    sample += 1
+
+        count = min(len(self.sample_sizes), len(self.durations), len(self.sample_offsets))
+        if count == 0:
+            raise Mp4Error('轨道没有采样')
+        self.sample_count = count
+
+    @property
+    def is_video(self):
+        return self.handler == b'vide'
+
+    # 不晚于 sample 的最近关键帧
+    def sync_sample_before(self, sample):
+        if self.sync_samples is None:
+            return sample
+        i = bisect.bisect_right(self.sync_samples, sample) - 1
+        return self.sync_samples[i] if i >= 0 else 0
+
+
+class Movie:
+    def __init__(self, ftyp, moov_bytes):
+        self.ftyp = ftyp
+        self.moov_bytes = moov_bytes
+        moov = self.parse_moov()
+        if moov.find(b'mvex') is not None:
+            raise Mp4Error('不支持分片 MP4')
+        try:
+            self.timescale = _timescale(moov.require(b'mvhd'))
+            self.tracks = [Track(i, trak) for i, trak in enumerate(moov.find_all(b'trak'))]
+        except (struct.error, IndexError):
+            # 表项数与盒子长度不符，或采样表之间互相矛盾（如 stsc 引用了不存在的分块）
+            raise Mp4Error('采样表不完整')
+        if not self.tracks:
+            raise Mp4Error('没有媒体轨道')
+
+    # 每次返回新的盒子树，调用方可以自由修改
+    def parse_moov(self):
+        return parse_boxes(self.moov_bytes)[0]
+
+    @property
+    def duration(self):
+        return max(track.total_duration / track.timescale for track in self.tracks)
+
+    # 作为剪辑与分段基准的轨道：优先选择带关键帧表的视频轨
+    def reference_track(self):
+        for track in self.tracks:
+            if track.is_video:
+                return track
+        return self.tracks[0]
+
+
+_movie_cache = {}
+_movie_cache_lock = threading.Lock()
+MOVIE_CACHE_SIZE = 32
+
+
+# 读取并解析 MP4 的 ftyp 与 moov；结果按 (路径, inode, 修改时间) 缓存，文件被替换后自动失效。
+# 传入已打开的 file 时以该文件为准，保证解析结果与随后读取的数据来自同一个文件
+def load_movie(path, file=None):
+    if file is None:
+        with open(path, 'rb') as f:
+            return load_movie(path, f)
+
+    stat = os.fstat(file.fileno())
+    key = (path, stat.st_ino, stat.st_mtime_ns)
+    with _movie_cache_lock:
+        movie = _movie_cache.get(key)
+    if movie is not None:
+        return movie
+
+    boxes = read_top_level_boxes(file, stat.st_size)
+    moov, _, _ = read_moov(file, boxes)
+    ftyp = b''
+    for box_type, offset, size in boxes:
+        if box_type == b'ftyp':
+            file.seek(offset)
+            ftyp = file.read(size)
+            break
+    movie = Movie(ftyp, moov.to_bytes())
+
+    with _movie_cache_lock:
+        if len(_movie_cache) >= MOVIE_CACHE_SIZE:
+            _movie_cache.pop(next(iter(_movie_cache)))
+        _movie_cache[key] = movie
+    return movie
+
+
+# ---------- 剪辑 ----------
+
+def _run_length(values):
+    runs = []
+    for value in values:
+        if runs and runs[-1][1] == value:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, value])
+    return runs
+
+
+def _table_box(box_type, fmt, rows, version=0):
+    payload = struct.pack('>II', version << 24, len(rows))
+    payload += b''.join(struct.pack(fmt, *row) for row in rows)
+    return Box(box_type, payload)
+
+
+# 用选中的采样 [first, last) 重建轨道的采样表；分块为原分块中连续选中的采样，
+# 返回 (新 trak, [(源偏移, 长度, 该分块在轨道中的序号), ...], 媒体时长)
+def _clip_track(trak, track, first, last):
+    runs = []
+    samples_per_chunk = []
+    descriptions = []
+    for sample in range(first, last):
+        chunk = track.sample_chunks[sample]
+        size = track.sample_sizes[sample]
+        if runs and track.sample_chunks[sample - 1] == chunk and sample > first:
+            offset, length = runs[-1]
+            runs[-1] = (offset, length + size)
+            samples_per_chunk[-1] += 1
+        else:
+            runs.append((track.sample_offsets[sample], size))
+            samples_per_chunk.append(1)
+            descriptions.append(track.chunk_description[chunk])
+
+    stsc_rows = []
+    previous = None
+    for chunk, (count, description) in enumerate(zip(samples_per_chunk, descriptions)):
+        if previous != (count, description):
+            stsc_rows.append((chunk + 1, count, description))
+            previous = (count, description)
+
+    stbl = trak.find(b'mdia').find(b'minf').find(b'stbl')
+    sizes = track.sample_sizes[first:last]
+    durations = track.durations[first:last]
+    tables = {
+        b'stts': _table_box(b'stts', '>II', _run_length(durations)),
+        b'stsc': _table_box(b'stsc', '>III', stsc_rows),
+        b'stco': _table_box(b'stco', '>I', [(0,)] * len(runs)),
+    }
+    if len(set(sizes)) == 1:
+        tables[b'stsz'] = Box(b'stsz', struct.pack('>III', 0, sizes[0], len(sizes)))
+    else:
+        tables[b'stsz'] = Box(b'stsz', struct.pack(f'>III{len(sizes)}I', 0, 0, len(sizes), *sizes))
+    if track.composition_offsets is not None:
+        version = stbl.find(b'ctts').payload[0]
+        tables[b'ctts'] = _table_box(b'ctts', '>Ii' if version == 1 else '>II',
+                                     _run_length(track.composition_offsets[first:last]), version)
+    if track.sync_samples is not None:
+        start = bisect.bisect_left(track.sync_samples, first)
+        stop = bisect.bisect_left(track.sync_samples, last)
+        tables[b'stss'] = _table_box(b'stss', '>I', [(s - first + 1,) for s in track.sync_samples[start:stop]])
+
+    # 采样分组、依赖关系等按采样编号索引的表无法直接裁剪，删除
+    children = []
+    for box in stbl.children:
+        if box.type in (b'stco', b'co64'):
+            children.append(tables[b'stco'])
+        elif box.type in tables:
+            children.append(tables.pop(box.type))
+        elif box.type not in (b'sdtp', b'sbgp', b'sgpd', b'stps', b'subs', b'saiz', b'saio'):
+            children.append(box)
+    children.extend(box for box_type, box in tables.items() if box_type != b'stco')
+    stbl.children = children
+
+    return runs, sum(durations)
+
+
+def _set_edit_list(trak, duration):
+    edts = trak.find(b'edts')
+    if edts is None:
+        return
+    elst = edts.find(b'elst')
+    media_time = 0
+    if elst is not None:
+        version = elst.payload[0]
+        fmt = '>Qq' if version == 1 else '>Ii'
+        for _, time in (entry[:2] for entry in _entries(elst, fmt + 'hh')):
+            if time >= 0:
+                media_time = time
+                break
+    # 只保留一个编辑段：从原编辑表的媒体起点开始播放整个剪辑
+    edts.children = [Box(b'elst', struct.pack('>IIQqhh', 1 << 24, 1, duration, media_time, 1, 0))]
+
+
+# 生成 MP4 剪辑：从 start 之前最近的关键帧开始，到 end 为止（秒），不重新编码。
+# 返回 (文件头字节, [(源偏移, 长度), ...], 实际开始时间, 实际结束时间)；
+# 输出内容为文件头（ftyp + 新 moov + mdat 头）后依次接上源文件中的各个片段
+def build_clip(path, start, end, file=None):
+    movie = load_movie(path, file)
+    end = min(end, movie.duration)
+    if start >= end:
+        raise Mp4Error('剪辑区间为空')
+
+    reference = movie.reference_track()
+    ref_first = bisect.bisect_right(reference.decode_times, start * reference.timescale) - 1
+    ref_first = reference.sync_sample_before(max(ref_first, 0))
+    ref_last = bisect.bisect_left(reference.decode_times, end * reference.timescale, ref_first + 1)
+    ref_last = min(ref_last, reference.sample_count)
+    clip_start = reference.decode_times[ref_first] / reference.timescale
+    clip_end = (reference.decode_times[ref_last] if ref_last < reference.sample_count
+                else reference.total_duration) / reference.timescale
+
+    moov = movie.parse_moov()
+    traks = moov.find_all(b'trak')
+    selected = []
+    for trak, track in zip(traks, movie.tracks):
+        if track is reference:
+            first, last = ref_first, ref_last
+        else:
+            first = max(bisect.bisect_right(track.decode_times, clip_start * track.timescale) - 1, 0)
+            last = min(bisect.bisect_left(track.decode_times, clip_end * track.timescale), track.sample_count)
+        if first >= last:
+            moov.children.remove(trak)
+            continue
+        runs, media_duration = _clip_track(trak, track, first, last)
+        movie_duration = media_duration * movie.timescale // track.timescale
+        mdia = trak.find(b'mdia')
+        _set_field(mdia.find(b'mdhd'), _duration_field(mdia.find(b'mdhd')), media_duration)
+        _set_field(trak.find(b'tkhd'), _tkhd_duration_field(trak.find(b'tkhd')), movie_duration)
+        _set_edit_list(trak, movie_duration)
+        selected.append((trak, runs, movie_duration))
+
+    mvhd = moov.find(b'mvhd')
+    _set_field(mvhd, _duration_field(mvhd), max(duration for _, _, duration in selected))
+
+    # 各轨道的分块按源文件偏移排序后依次写入 mdat，保持原有的音视频交错
+    chunks = sorted((offset, length, trak_index, chunk_index)
+                    for trak_index, (_, runs, _) in enumerate(selected)
+                    for chunk_index, (offset, length) in enumerate(runs))
+    data_size = sum(length for _, length, _, _ in chunks)
+    mdat_header = struct.pack('>I4s', 8 + data_size, b'mdat') if data_size + 8 <= UINT32_MAX \
+        else struct.pack('>I4sQ', 1, b'mdat', data_size + 16)
+
+    offset_boxes = [trak.find(b'mdia').find(b'minf').find(b'stbl').find(b'stco') for trak, _, _ in selected]
+    moov_size = len(moov.to_bytes())
+    for _ in range(3):
+        position = len(movie.ftyp) + moov_size + len(mdat_header)
+        new_offsets = [[0] * len(runs) for _, runs, _ in selected]
+        for _, length, trak_index, chunk_index in chunks:
+            new_offsets[trak_index][chunk_index] = position
+            position += length
+        for box, offsets in zip(offset_boxes, new_offsets):
+            write_chunk_offsets(box, offsets)
+        moov_bytes = moov.to_bytes()
+        if len(moov_bytes) == moov_size:
+            break
+        moov_size = len(moov_bytes)
+    else:
+        raise Mp4Error('无法确定 moov 大小')
+
+    # 合并源文件中相邻的片段，减少读取次数
+    pieces = []
+    for offset, length, _, _ in chunks:
+        if pieces and pieces[-1][0] + pieces[-1][1] == offset:
+            pieces[-1] = (pieces[-1][0], pieces[-1][1] + length)
+        else:
+            pieces.append((offset, length))
+
+    return movie.ftyp + moov_bytes + mdat_header, pieces, clip_start, clip_end
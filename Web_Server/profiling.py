@@ -0,0 +1,177 @@
+import cProfile
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# 按需的请求剖析：被剖析的请求记录各阶段耗时（通过 Server-Timing 响应头返回），
+# 配置了输出目录时同时保存 cProfile 数据（.prof，可用 snakeviz、gprof2dot 等查看）
+# 和采样得到的调用栈（.folded，每行“栈;帧 次数”，可直接用 flamegraph.pl、speedscope 生成火焰图）。
+# 触发方式：按比例随机抽样，或请求头 X-Profile 携带配置的令牌；都未配置时不做任何处理
+
+PROFILE_HEADER = 'X-Profile'
+# 调用栈采样间隔（秒）
+STACK_SAMPLE_INTERVAL = 0.005
+# 输出目录中保留的剖析结果数，超出时删除最早的
+MAX_PROFILE_DUMPS = 200
+
+# 同一时间只能有一个 cProfile 处于启用状态（Python 3.12 起为进程级限制），并发的被剖析请求只记录阶段耗时和调用栈
+_cprofile_lock = threading.Lock()
+_dump_sequence = itertools.count(1)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+# 定时读取指定线程的当前调用栈并计数
+class StackSampler:
+    def __init__(self, thread_id, interval=STACK_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    def __init__(self, collect_stacks=False):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.total = None
+        self.cprofile = None
+        self.sampler = None
+        if collect_stacks:
+            if _cprofile_lock.acquire(blocking=False):
+                self.cprofile = cProfile.Profile()
+                try:
+                    self.cprofile.enable()
+                except ValueError:
+                    # 其他剖析工具已启用
+                    self.cprofile = None
+                    _cprofile_lock.release()
+            self.sampler = StackSampler(threading.get_ident())
+            self.sampler.start()
+
+    # 累加阶段耗时（同名阶段多次出现时相加）
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def stop(self):
+        if self.total is not None:
+            return
+        self.total = time.perf_counter() - self.started
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            _cprofile_lock.release()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    # Server-Timing 响应头：各阶段耗时和总耗时（毫秒）
+    def server_timing(self):
+        entries = [f'{name};dur={seconds * 1000:.3f}' for name, seconds in self.phases.items()]
+        entries.append(f'total;dur={(self.total or 0) * 1000:.3f}')
+        return ', '.join(entries)
+
+    # 保存 cProfile 数据和调用栈，返回保存的文件路径（不含扩展名）
+    def dump(self, directory, label):
+        safe_label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in label)
+        name = (f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{next(_dump_sequence):06d}"
+                f"_{safe_label}_{(self.total or 0) * 1000:.0f}ms")
+        path = os.path.join(directory, name)
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(path + '.prof')
+        if self.sampler is not None:
+            with open(path + '.folded', 'w', encoding='utf-8') as f:
+                f.write(self.sampler.folded())
+        return path
+
+
+class Profiler:
+    # sample_rate: 随机剖析的请求比例（0~1）；token: 请求头 X-Profile 等于该值时剖析该请求（为空时不接受请求头触发）；
+    # dump_dir: cProfile 与调用栈的输出目录（为空时只返回 Server-Timing）
+    def __init__(self, sample_rate=0.0, token='', dump_dir='', max_dumps=MAX_PROFILE_DUMPS):
+        self.sample_rate = sample_rate
+        self.token = token
+        self.dump_dir = dump_dir
+        self.max_dumps = max_dumps
+        self._prune_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or bool(self.token)
+
+    def should_profile(self, header_value):
+        if self.token and header_value and hmac.compare_digest(header_value.encode('latin-1', 'replace'),
+                                                               self.token.encode('utf-8')):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self):
+        return RequestProfile(collect_stacks=bool(self.dump_dir))
+
+    # 结束剖析并保存结果（配置了输出目录时）
+    def finish(self, profile, label):
+        profile.stop()
+        if not self.dump_dir:
+            return None
+        try:
+            os.makedirs(self.dump_dir, exist_ok=True)
+            path = profile.dump(self.dump_dir, label)
+            self._prune()
+            return path
+        except OSError as e:
+            print(f"⚠️ 保存剖析结果失败: {e}")
+            return None
+
+    def _prune(self):
+        with self._prune_lock:
+            entries = {}
+            with os.scandir(self.dump_dir) as it:
+                for entry in it:
+                    stem, extension = os.path.splitext(entry.name)
+                    if extension in ('.prof', '.folded'):
+                        entries.setdefault(stem, []).append(entry.path)
+            # 文件名以时间开头，按名称排序即按时间排序
+            stems = sorted(entries)
+            for stem in stems[:max(len(stems) - self.max_dumps, 0)]:
+                for path in entries[stem]:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
@@ -0,0 +1,299 @@
+import html
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 全文搜索：SQLite FTS5 倒排索引（trigram 分词，支持中文等不以空格分词的文本和任意子串搜索），
+# 索引所有文件的原文件名和文本类文件的内容。上传后由后台线程增量建立索引，删除时同步删除，
+# 启动时及定期与文件目录对账（补充缺失、更新过期、删除多余的文档）。按 bm25 排序，文件名的权重高于内容
+
+# 建立内容索引的文件类型；其他文件只索引原文件名
+TEXT_EXTENSIONS = {'txt', 'csv', 'json', 'xml', 'html', 'js', 'py', 'java', 'cpp', 'c'}
+MARKUP_EXTENSIONS = {'xml', 'html'}
+# 每个文件建立索引的最大字节数
+MAX_INDEXED_BYTES = 1024 * 1024
+# bm25 权重：(原文件名, 内容)
+NAME_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+# trigram 分词下少于 3 个字符的词无法使用索引，改为逐条匹配
+MIN_INDEXED_TERM_LENGTH = 3
+# 摘要中高亮的标记（生成摘要后先转义 HTML，再替换为 <mark>）
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+SNIPPET_TOKENS = 16
+# 对账时每个写事务建立索引的文件数
+SYNC_BATCH_SIZE = 500
+# 只有短词时摘要取第一个词所在位置前后的字符数
+SNIPPET_CONTEXT = 30
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    filename TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS content USING fts5(name, body, tokenize='trigram');
+'''
+
+TAG_PATTERN = re.compile(r'<[^>]*>')
+
+
+def is_text_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in TEXT_EXTENSIONS
+
+
+# 读取文本内容：优先 UTF-8，失败时按 GB18030 解码（兼容 GBK 编码的中文文档）
+def read_text(path, filename):
+    with open(path, 'rb') as f:
+        data = f.read(MAX_INDEXED_BYTES)
+    if b'\0' in data[:8192]:
+        return ''
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # 截断位置可能落在多字节字符中间
+        if e.start >= len(data) - 3:
+            text = data[:e.start].decode('utf-8', 'replace')
+        else:
+            text = data.decode('gb18030', 'replace')
+    if filename.rsplit('.', 1)[1].lower() in MARKUP_EXTENSIONS:
+        text = html.unescape(TAG_PATTERN.sub(' ', text))
+    return text
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+# 在摘要中标记 terms 的出现位置（不区分大小写）
+def _mark_terms(text, terms):
+    pattern = '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.sub(pattern, lambda m: HIGHLIGHT_START + m.group(0) + HIGHLIGHT_END, text, flags=re.IGNORECASE)
+
+
+def _highlight(snippet):
+    return (html.escape(snippet)
+            .replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+
+class SearchIndex:
+    # source_path(filename) 返回文件路径；list_records() 返回当前所有文件记录，用于对账
+    def __init__(self, db_path, source_path, list_records, sync_interval=300):
+        self.db_path = db_path
+        self.source_path = source_path
+        self.list_records = list_records
+        self.sync_interval = sync_interval
+        self._local = threading.local()
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._sync_thread = None
+        self._stop_event = threading.Event()
+        # 已安排、尚未完成建立索引的文件数和文件名（对账时跳过仍在队列中的文件）
+        self.pending = 0
+        self._queued = set()
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    # 打开索引数据库（损坏时删除重建，内容由对账重新建立），并在后台对账一次
+    def start(self):
+        try:
+            self._connect().executescript(SCHEMA)
+        except sqlite3.DatabaseError as e:
+            print(f"⚠️ 搜索索引损坏，重新建立: {e}")
+            connection = getattr(self._local, 'connection', None)
+            if connection is not None:
+                connection.close()
+                self._local.connection = None
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(self.db_path + suffix)
+                except FileNotFoundError:
+                    pass
+            self._connect().executescript(SCHEMA)
+        threading.Thread(target=self._sync_once, name='search-index-sync', daemon=True).start()
+        self.start_background()
+
+    # 启动后台对账线程；fork 出的工作进程中需要重新调用
+    def start_background(self):
+        if not self.sync_interval:
+            return
+        if self._sync_thread is None or not self._sync_thread.is_alive():
+            self._sync_thread = threading.Thread(target=self._sync_loop, name='search-index-sync', daemon=True)
+            self._sync_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _sync_once(self):
+        try:
+            scheduled, removed = self.sync(self.list_records())
+            if scheduled or removed:
+                print(f"🔎 搜索索引对账: 待建立 {scheduled} 个，删除 {removed} 个")
+        except Exception as e:
+            print(f"⚠️ 搜索索引对账失败: {e}")
+
+    def _sync_loop(self):
+        while not self._stop_event.wait(self.sync_interval):
+            self._sync_once()
+
+    # 索引写入在单个后台线程中执行（SQLite 同一时间只有一个写事务）；线程池按进程创建
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search-index')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    # record 为文件记录（filename、original_name、type）
+    def schedule(self, record):
+        return self.schedule_many([record])
+
+    # 在后台按批建立多个文件的索引（每批一个写事务）
+    def schedule_many(self, records):
+        with self._lock:
+            self.pending += len(records)
+            self._queued.update(record['filename'] for record in records)
+        return self._get_executor().submit(self._index_logged, records)
+
+    def _index_logged(self, records):
+        for i in range(0, len(records), SYNC_BATCH_SIZE):
+            batch = records[i:i + SYNC_BATCH_SIZE]
+            try:
+                self.index_many(batch)
+            except Exception as e:
+                print(f"⚠️ 建立搜索索引失败 {batch[0]['filename']} 等 {len(batch)} 个文件: {e}")
+            finally:
+                with self._lock:
+                    self.pending -= len(batch)
+                    self._queued.difference_update(record['filename'] for record in batch)
+
+    # 建立或更新单个文件的索引
+    def index(self, record):
+        self.index_many([record])
+
+    # 在一个写事务中建立或更新多个文件的索引；已不存在的文件跳过
+    def index_many(self, records):
+        documents = []
+        for record in records:
+            path = self.source_path(record['filename'])
+            try:
+                stat = os.stat(path)
+                body = read_text(path, record['filename']) if is_text_file(record['filename']) else ''
+            except FileNotFoundError:
+                continue
+            documents.append((record, stat, body))
+        if not documents:
+            return
+
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for record, stat, body in documents:
+                row = connection.execute('SELECT id FROM documents WHERE filename = ?',
+                                         (record['filename'],)).fetchone()
+                if row:
+                    connection.execute('DELETE FROM content WHERE rowid = ?', row)
+                    connection.execute('UPDATE documents SET type = ?, size = ?, mtime = ? WHERE id = ?',
+                                       (record['type'], stat.st_size, stat.st_mtime, row[0]))
+                    document_id = row[0]
+                else:
+                    document_id = connection.execute(
+                        'INSERT INTO documents (filename, type, size, mtime) VALUES (?, ?, ?, ?)',
+                        (record['filename'], record['type'], stat.st_size, stat.st_mtime)).lastrowid
+                connection.execute('INSERT INTO content (rowid, name, body) VALUES (?, ?, ?)',
+                                   (document_id, record['original_name'], body))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def remove(self, filename):
+        self.remove_many([filename])
+
+    def remove_many(self, filenames):
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for filename in filenames:
+                row = connection.execute('SELECT id FROM documents WHERE filename = ?', (filename,)).fetchone()
+                if row:
+                    connection.execute('DELETE FROM content WHERE rowid = ?', row)
+                    connection.execute('DELETE FROM documents WHERE id = ?', row)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    # 与文件目录对账：records 为文件记录（filename、original_name、size、mtime），
+    # 删除已不存在的文件的文档，为新增或内容变化、且不在队列中的文件安排建立索引；返回 (安排索引数, 删除数)
+    def sync(self, records):
+        indexed = {filename: (size, mtime) for filename, size, mtime in
+                   self._connect().execute('SELECT filename, size, mtime FROM documents')}
+        current = {record['filename'] for record in records}
+        stale = [filename for filename in indexed if filename not in current]
+        if stale:
+            self.remove_many(stale)
+        with self._lock:
+            queued = set(self._queued)
+        changed = [record for record in records
+                   if record['filename'] not in queued
+                   and indexed.get(record['filename']) != (record['size'], record['mtime'])]
+        if changed:
+            self.schedule_many(changed)
+        return len(changed), len(stale)
+
+    # 搜索，返回 (总数, [(文件名, 摘要 HTML), ...])，按相关度排序；file_types 可选，限定文件类型。
+    # 查询按空白分为多个词，文档需包含所有词（文件名或内容中的子串，不区分大小写）
+    def search(self, query, file_types=None, limit=20, offset=0):
+        terms = [term for term in query.split() if term]
+        if not terms:
+            return 0, []
+        indexed_terms = [term for term in terms if len(term) >= MIN_INDEXED_TERM_LENGTH]
+        short_terms = [term for term in terms if len(term) < MIN_INDEXED_TERM_LENGTH]
+
+        conditions = []
+        params = []
+        if indexed_terms:
+            conditions.append('content MATCH ?')
+            params.append(' AND '.join(_quote(term) for term in indexed_terms))
+        for term in short_terms:
+            conditions.append('(instr(lower(content.name), ?) > 0 OR instr(lower(content.body), ?) > 0)')
+            params.extend([term.lower(), term.lower()])
+        if file_types:
+            conditions.append(f'documents.type IN ({",".join("?" * len(file_types))})')
+            params.extend(file_types)
+        where = ' AND '.join(conditions)
+        source = 'content JOIN documents ON documents.id = content.rowid'
+        # 只有短词时没有 MATCH 条件，无法计算 bm25，按文件名排序
+        order = f'bm25(content, {NAME_WEIGHT}, {BODY_WEIGHT})' if indexed_terms else 'documents.filename DESC'
+
+        connection = self._connect()
+        total = connection.execute(f'SELECT count(*) FROM {source} WHERE {where}', params).fetchone()[0]
+        if indexed_terms:
+            snippet = f"snippet(content, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', {SNIPPET_TOKENS})"
+            snippet_params = []
+        else:
+            # 第一个词在文件名中时摘要为文件名，否则截取内容中该词前后的部分
+            snippet = ('CASE WHEN instr(lower(content.name), ?) > 0 THEN content.name '
+                       'ELSE substr(content.body, max(instr(lower(content.body), ?) - ?, 1), ?) END')
+            term = short_terms[0].lower()
+            snippet_params = [term, term, SNIPPET_CONTEXT, 2 * SNIPPET_CONTEXT + len(term)]
+        rows = connection.execute(
+            f'SELECT documents.filename, {snippet} FROM {source} WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?',
+            snippet_params + params + [limit, offset]).fetchall()
+        if not indexed_terms:
+            rows = [(filename, _mark_terms(text or '', short_terms)) for filename, text in rows]
+        return total, [(filename, _highlight(text or '')) for filename, text in rows]
@@ -0,0 +1,86 @@
+import argparse
+import os
+
+SERVER_MODES = ['dev', 'gunicorn']
+WORKER_CLASSES = ['gthread', 'gevent']
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+# 命令行参数，默认值可通过环境变量设置（便于 Docker 部署）
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='文件管理系统')
+    parser.add_argument('--server', choices=SERVER_MODES, default=os.environ.get('SERVER_MODE', 'dev'),
+                        help='dev: Flask 开发服务器；gunicorn: 生产模式（环境变量 SERVER_MODE）')
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=env_int('PORT', 8080))
+    parser.add_argument('--workers', type=int, default=env_int('WORKERS', 1),
+                        help='工作进程数（环境变量 WORKERS）。文件目录、去重存储和搜索索引保存在 SQLite 中，'
+                             '分块上传会话保存在 .sessions 目录中，均由各进程共享；带宽限速和 /metrics 计数按进程独立')
+    parser.add_argument('--threads', type=int, default=env_int('THREADS', 16),
+                        help='gthread 模式下每个进程的线程数（环境变量 THREADS）')
+    parser.add_argument('--worker-class', choices=WORKER_CLASSES, default=os.environ.get('WORKER_CLASS', 'gthread'),
+                        help='gthread: 线程池；gevent: 协程（需安装 gevent，环境变量 WORKER_CLASS）')
+    parser.add_argument('--worker-connections', type=int, default=env_int('WORKER_CONNECTIONS', 1000),
+                        help='gevent 模式下每个进程的最大并发连接数')
+    parser.add_argument('--timeout', type=int, default=env_int('REQUEST_TIMEOUT', 600),
+                        help='工作进程无响应超时（秒），需覆盖 500MB 文件在慢速网络上的上传时间')
+    parser.add_argument('--keepalive', type=int, default=env_int('KEEPALIVE', 75),
+                        help='HTTP keep-alive 连接空闲保持时间（秒）')
+    parser.add_argument('--graceful-timeout', type=int, default=env_int('GRACEFUL_TIMEOUT', 60),
+                        help='收到 SIGTERM 后等待进行中请求完成的时间（秒）')
+    return parser.parse_args(argv)
+
+
+def gunicorn_options(args, post_fork=None):
+    options = {
+        'bind': f'{args.host}:{args.port}',
+        'workers': args.workers,
+        'worker_class': args.worker_class,
+        'timeout': args.timeout,
+        'keepalive': args.keepalive,
+        'graceful_timeout': args.graceful_timeout,
+        'accesslog': '-',
+        'errorlog': '-',
+    }
+    if args.worker_class == 'gthread':
+        options['threads'] = args.threads
+    else:
+        options['worker_connections'] = args.worker_connections
+    if post_fork is not None:
+        options['post_fork'] = lambda server, worker: post_fork()
+    return options
+
+
+# 生产模式：以 gunicorn 运行应用（支持 keep-alive、超时、SIGTERM 优雅退出，下载使用 sendfile）
+def run_gunicorn(app, args, post_fork=None):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit('生产模式需要安装 gunicorn: pip install gunicorn')
+    if args.worker_class == 'gevent':
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            raise SystemExit('gevent 模式需要安装 gevent: pip install gevent')
+
+    options = gunicorn_options(args, post_fork)
+
+    class StandaloneApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    StandaloneApplication().run()
+
+
+def run(app, args, post_fork=None):
+    if args.server == 'gunicorn':
+        run_gunicorn(app, args, post_fork)
+    else:
+        app.run(host=args.host, port=args.port, debug=False, threaded=True)
@@ -0,0 +1,264 @@
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 分片目录布局：用户文件保存在 <根目录>/<h[0:2]>/<h[2:4]>/<文件名>，h 为文件名的 SHA-1，
+# 每级 256 个子目录，几十万个文件时每个目录中只有少量条目。URL 中的文件名不变，路径由文件名计算得到。
+# 旧版本的文件直接放在根目录下（平铺布局），查找时先查分片目录再查根目录，
+# 后台迁移任务把根目录下的文件逐个移入分片目录，迁移期间服务照常运行
+
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+SHARD_DIR_PATTERN = re.compile(r'^[0-9a-f]{%d}$' % SHARD_WIDTH)
+# 迁移时每批移动的文件数，以及新旧两个路径同时存在的时间（秒）：
+# 迁移先创建分片路径的硬链接，等待已解析出旧路径的请求打开文件后再删除旧路径
+MIGRATION_BATCH_SIZE = 500
+MIGRATION_GRACE_PERIOD = 2
+MIGRATION_LOCK_NAME = '.migration.lock'
+
+
+def shard_parts(filename):
+    digest = hashlib.sha1(filename.encode('utf-8')).hexdigest()
+    return [digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_LEVELS)]
+
+
+class StorageLayout:
+    # sharded 为 False 时新文件仍写入根目录（平铺布局），已在分片目录中的文件照常可以访问；
+    # on_scan(耗时秒数, 文件数) 可选，每次扫描完成后调用（用于统计扫描耗时）
+    def __init__(self, root, sharded=True, on_scan=None):
+        self.root = root
+        self.sharded = sharded
+        self.on_scan = on_scan
+
+    def sharded_path(self, filename):
+        return os.path.join(self.root, *shard_parts(filename), filename)
+
+    def flat_path(self, filename):
+        return os.path.join(self.root, filename)
+
+    # 已有文件的路径：先查分片目录，再查根目录；都不存在时返回新文件应写入的路径
+    def path(self, filename):
+        sharded_path = self.sharded_path(filename)
+        if os.path.exists(sharded_path):
+            return sharded_path
+        flat_path = self.flat_path(filename)
+        if os.path.exists(flat_path) or not self.sharded:
+            return flat_path
+        return sharded_path
+
+    # 新文件的路径（按需创建分片目录）
+    def new_path(self, filename):
+        if not self.sharded:
+            return self.flat_path(filename)
+        path = self.sharded_path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    # 删除文件的所有路径（迁移期间新旧路径可能同时存在），都不存在时抛出 FileNotFoundError
+    def remove(self, filename):
+        removed = False
+        for path in (self.sharded_path(filename), self.flat_path(filename)):
+            try:
+                os.remove(path)
+                removed = True
+            except FileNotFoundError:
+                pass
+        if not removed:
+            raise FileNotFoundError(2, '文件不存在', self.flat_path(filename))
+
+    # 扫描根目录和分片目录，返回 {文件名: stat 结果}；隐藏文件（临时文件、存储区等）不计入，
+    # 同一文件同时出现在两处时以分片目录中的为准
+    def scan(self):
+        start = time.perf_counter()
+        entries = self._scan_all()
+        if self.on_scan is not None:
+            self.on_scan(time.perf_counter() - start, len(entries))
+        return entries
+
+    def _scan_all(self):
+        entries = {}
+        if not os.path.isdir(self.root):
+            return entries
+        shard_dirs = []
+        for name, stat, is_dir in self._scan_dir(self.root):
+            if is_dir:
+                if SHARD_DIR_PATTERN.match(name):
+                    shard_dirs.append(os.path.join(self.root, name))
+            else:
+                entries[name] = stat
+
+        for level in range(1, SHARD_LEVELS + 1):
+            next_dirs = []
+            for directory in shard_dirs:
+                for name, stat, is_dir in self._scan_dir(directory):
+                    if level < SHARD_LEVELS:
+                        if is_dir and SHARD_DIR_PATTERN.match(name):
+                            next_dirs.append(os.path.join(directory, name))
+                    elif not is_dir:
+                        entries[name] = stat
+            shard_dirs = next_dirs
+        return entries
+
+    # 目录中的非隐藏条目 (名称, stat 结果, 是否为目录)；目录的 stat 结果为 None
+    @staticmethod
+    def _scan_dir(directory):
+        try:
+            it = os.scandir(directory)
+        except FileNotFoundError:
+            return
+        with it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        yield entry.name, None, True
+                    elif entry.is_file():
+                        yield entry.name, entry.stat(), False
+                except FileNotFoundError:
+                    continue
+
+    # 根目录下尚未迁移的文件名
+    def flat_files(self):
+        names = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if not entry.name.startswith('.') and entry.is_file():
+                    names.append(entry.name)
+        return names
+
+
+# 在线迁移：把根目录下的文件移入分片目录。
+# 每个文件先在分片目录中创建硬链接（之后的查找都会得到新路径），等待宽限期后再删除根目录中的旧路径，
+# 已解析出旧路径、正在打开文件的请求不受影响。lock 为调用方替换/删除文件时持有的锁（可选）。
+# 同一目录只允许一个迁移任务运行（用 VIDEO_DIR/.migration.lock 文件锁协调多个工作进程和命令行工具）
+class StorageMigrator:
+    def __init__(self, layout, lock=None, batch_size=MIGRATION_BATCH_SIZE, grace_period=MIGRATION_GRACE_PERIOD):
+        self.layout = layout
+        self.lock = lock or threading.Lock()
+        self.batch_size = batch_size
+        self.grace_period = grace_period
+        self.migrated = 0
+        self.remaining = None
+        self.running = False
+        self._thread = None
+
+    def start_background(self):
+        if not self.layout.sharded or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self.run, daemon=True, name='storage-migration')
+        self._thread.start()
+
+    def _acquire_directory_lock(self):
+        lock_file = open(os.path.join(self.layout.root, MIGRATION_LOCK_NAME), 'a')
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    # 迁移所有文件，返回迁移的文件数；已有迁移任务在运行时返回 None
+    def run(self):
+        lock_file = self._acquire_directory_lock()
+        if lock_file is None:
+            return None
+        try:
+            self.running = True
+            pending = self.layout.flat_files()
+            self.remaining = len(pending)
+            if pending:
+                print(f"📦 开始迁移到分片目录: {len(pending)} 个文件")
+            while pending:
+                batch, pending = pending[:self.batch_size], pending[self.batch_size:]
+                linked = [filename for filename in batch if self._link(filename)]
+                if linked:
+                    time.sleep(self.grace_period)
+                for filename in linked:
+                    self._unlink_flat(filename)
+                self.migrated += len(linked)
+                self.remaining = len(pending)
+            if self.migrated:
+                print(f"📦 分片目录迁移完成: {self.migrated} 个文件")
+            return self.migrated
+        except Exception as e:
+            print(f"⚠️ 分片目录迁移失败: {e}")
+            return self.migrated
+        finally:
+            self.running = False
+            lock_file.close()
+
+    # 返回 True 表示分片路径已就绪（宽限期后删除旧路径）；失败的文件留在原位置，下次迁移时重试
+    def _link(self, filename):
+        flat_path = self.layout.flat_path(filename)
+        target = self.layout.sharded_path(filename)
+        with self.lock:
+            try:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+            except OSError as e:
+                print(f"⚠️ 迁移文件失败 {filename}: {e}")
+                return False
+            try:
+                os.link(flat_path, target)
+            except FileExistsError:
+                # 分片目录中已有同名文件（上次迁移中断），以分片目录中的为准
+                pass
+            except FileNotFoundError:
+                return False
+            except OSError:
+                # 文件系统不支持硬链接时直接重命名（原子操作，但已解析出旧路径的请求可能打开失败）
+                try:
+                    os.replace(flat_path, target)
+                except FileNotFoundError:
+                    return False
+                except OSError as e:
+                    print(f"⚠️ 迁移文件失败 {filename}: {e}")
+                    return False
+        return True
+
+    def _unlink_flat(self, filename):
+        with self.lock:
+            # 宽限期内文件被删除时两个路径都已删除；被替换时分片路径为新内容，旧路径可以直接删除
+            if os.path.exists(self.layout.sharded_path(filename)):
+                try:
+                    os.remove(self.layout.flat_path(filename))
+                except FileNotFoundError:
+                    pass
+
+    def status(self):
+        return {
+            'layout': 'sharded' if self.layout.sharded else 'flat',
+            'migrating': self.running,
+            'migrated': self.migrated,
+            'remaining': self.remaining
+        }
+
+
+# 命令行迁移工具：python storage_layout.py [--dir ./files]
+# 用于服务停止期间迁移；服务运行时会在后台自动迁移（服务中的迁移任务正在运行时本工具直接退出）
+def main():
+    parser = argparse.ArgumentParser(description='把文件目录迁移到分片目录布局')
+    parser.add_argument('--dir', default=os.environ.get('VIDEO_DIR', './files'), help='文件目录（默认 VIDEO_DIR 或 ./files）')
+    parser.add_argument('--grace', type=float, default=MIGRATION_GRACE_PERIOD, help='删除旧路径前的等待时间（秒）')
+    args = parser.parse_args()
+
+    migrator = StorageMigrator(StorageLayout(args.dir), grace_period=args.grace)
+    migrated = migrator.run()
+    if migrated is None:
+        print('⚠️ 已有迁移任务正在运行')
+    else:
+        print(f'✅ 已迁移 {migrated} 个文件')
+
+
+if __name__ == '__main__':
+    main()
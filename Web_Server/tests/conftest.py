@@ -0,0 +1,101 @@
+import io
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mp4_tools import Box  # noqa: E402
+
+
+# video_server 在导入时按环境变量确定存储目录，整个测试会话共用一个临时目录
+@pytest.fixture(scope='session')
+def server(tmp_path_factory):
+    os.environ['VIDEO_DIR'] = str(tmp_path_factory.mktemp('files'))
+    os.environ['INDEX_RECONCILE_INTERVAL'] = '0'
+    import video_server
+    video_server.start_services()
+    return video_server
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+# 上传文件，返回保存后的文件名
+@pytest.fixture
+def upload(client):
+    def upload_file(name, data):
+        response = client.post('/upload', data={'file': (io.BytesIO(data), name)})
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()['filename']
+    return upload_file
+
+
+def full_box(box_type, payload, version=0):
+    return Box(box_type, struct.pack('>I', version << 24) + payload)
+
+
+# moov 在前的 MP4：视频轨（时间刻度 10，每个采样 0.1 秒，keyframes 为关键帧采样编号，每个分块 2 个采样），
+# audio=True 时增加一条音轨（每个采样 0.2 秒、每个分块 1 个采样），两条轨道的分块在 mdat 中交错。
+# 每个采样的内容各不相同；返回 (文件内容, 各轨道的采样内容列表)
+def build_keyframe_mp4(video_samples=20, keyframes=(0, 5, 10, 15), audio=False):
+    tracks = [(b'vide', 1, video_samples, 2)]
+    if audio:
+        tracks.append((b'soun', 2, video_samples // 2, 1))
+    samples = [[bytes([track_index * 100 + i + 1]) * (50 + i) for i in range(count)]
+               for track_index, (_, _, count, _) in enumerate(tracks)]
+    chunks = [[track_samples[i:i + per_chunk] for i in range(0, len(track_samples), per_chunk)]
+              for track_samples, (_, _, _, per_chunk) in zip(samples, tracks)]
+
+    def build_moov(offsets):
+        traks = []
+        for track_index, (handler, delta, count, per_chunk) in enumerate(tracks):
+            track_samples = samples[track_index]
+            tables = [
+                full_box(b'stsd', struct.pack('>I', 1) + Box(b'avc1' if handler == b'vide' else b'mp4a',
+                                                             bytes(78)).to_bytes()),
+                full_box(b'stts', struct.pack('>III', 1, count, delta)),
+                full_box(b'stsc', struct.pack('>IIII', 1, 1, per_chunk, 1)),
+                full_box(b'stsz', struct.pack(f'>II{count}I', 0, count, *map(len, track_samples))),
+                full_box(b'stco', struct.pack(f'>I{len(offsets[track_index])}I', len(offsets[track_index]),
+                                              *offsets[track_index])),
+            ]
+            if handler == b'vide':
+                tables.append(full_box(b'stss', struct.pack(f'>I{len(keyframes)}I', len(keyframes),
+                                                            *(k + 1 for k in keyframes))))
+            traks.append(Box(b'trak', None, [
+                full_box(b'tkhd', struct.pack('>III', 0, 0, track_index + 1) + bytes(64)
+                         + struct.pack('>II', 320 << 16, 240 << 16)),
+                Box(b'mdia', None, [
+                    full_box(b'mdhd', struct.pack('>IIIII', 0, 0, 10, count * delta, 0)),
+                    full_box(b'hdlr', struct.pack('>I4s', 0, handler) + bytes(13)),
+                    Box(b'minf', None, [Box(b'stbl', None, tables)]),
+                ]),
+            ]))
+        return Box(b'moov', None, [full_box(b'mvhd', struct.pack('>IIII', 0, 0, 10, video_samples) + bytes(80))]
+                   + traks).to_bytes()
+
+    # 分块按轨道轮流写入 mdat
+    order = [(track_index, chunk_index) for chunk_index in range(max(map(len, chunks)))
+             for track_index in range(len(tracks)) if chunk_index < len(chunks[track_index])]
+    ftyp = Box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2avc1mp41').to_bytes()
+    moov_size = len(build_moov([[0] * len(track_chunks) for track_chunks in chunks]))
+    offsets = [[0] * len(track_chunks) for track_chunks in chunks]
+    position = len(ftyp) + moov_size + 8
+    data = []
+    for track_index, chunk_index in order:
+        offsets[track_index][chunk_index] = position
+        chunk = b''.join(chunks[track_index][chunk_index])
+        data.append(chunk)
+        position += len(chunk)
+    mdat = b''.join(data)
+    return ftyp + build_moov(offsets) + struct.pack('>I4s', 8 + len(mdat), b'mdat') + mdat, samples
+
+
+@pytest.fixture
+def keyframe_mp4():
+    return build_keyframe_mp4
@@ -0,0 +1,133 @@
+import io
+import os
+import time
+
+import pytest
+from werkzeug.wsgi import FileWrapper
+
+from bandwidth import BandwidthScheduler, ShapedBody, QUANTUM, normalize_config, parse_size
+
+DATA = os.urandom(3 * 1024 * 1024 + 123)
+
+
+def test_parse_size():
+    assert parse_size(1024) == 1024
+    assert parse_size('10M') == 10 * 1024 * 1024
+    assert parse_size('512KiB') == 512 * 1024
+    assert parse_size('1.5k') == 1536
+    for value in ('x', '-1', True, -5):
+        with pytest.raises(ValueError):
+            parse_size(value)
+
+
+def test_normalize_config_rejects_unknown_and_invalid():
+    assert normalize_config({'bulk_weight': '2'}) == {'bulk_weight': 2.0}
+    with pytest.raises(ValueError):
+        normalize_config({'unknown': 1})
+    with pytest.raises(ValueError):
+        normalize_config({'preview_weight': 0})
+
+
+# file_wrapper 从 Range 起点一直读到文件末尾（gunicorn 的 sendfile 按 Content-Length 截断），
+# 包装后必须在 Content-Length 处停止
+def test_shaped_body_stops_at_content_length_of_file_wrapper():
+    scheduler = BandwidthScheduler({'client_limit': '1G'})
+    transfer = scheduler.open('127.0.0.1', 'bulk')
+    file = io.BytesIO(DATA)
+    file.seek(1000)
+    body = ShapedBody(scheduler, transfer, FileWrapper(file, 1024 * 1024), 2 * 1024 * 1024)
+
+    sent = b''.join(body)
+    body.close()
+
+    assert sent == DATA[1000:1000 + 2 * 1024 * 1024]
+    assert transfer.sent == len(sent)
+    assert all(len(piece) <= QUANTUM for piece in ShapedBody(scheduler, scheduler.open('a', 'bulk'), [DATA]))
+
+
+def test_shaped_body_without_length_sends_everything():
+    scheduler = BandwidthScheduler({'global_limit': '1G'})
+    body = ShapedBody(scheduler, scheduler.open('127.0.0.1', 'bulk'), [DATA[:100], DATA[100:]])
+    assert b''.join(body) == DATA
+
+
+def test_close_ends_transfer_and_closes_body():
+    closed = []
+    finished = []
+
+    class Body(list):
+        def close(self):
+            closed.append(True)
+
+    scheduler = BandwidthScheduler({'global_limit': '1G'})
+    body = ShapedBody(scheduler, scheduler.open('127.0.0.1', 'preview'), Body([b'abc']),
+                      on_close=finished.append)
+    assert scheduler.active_transfers == 1
+    list(body)
+    body.close()
+    body.close()
+
+    assert closed == [True]
+    assert len(finished) == 1 and finished[0].kind == 'preview'
+    assert scheduler.active_transfers == 0
+
+
+def test_global_limit_paces_transfer():
+    scheduler = BandwidthScheduler({'global_limit': '1M'})
+    transfer = scheduler.open('127.0.0.1', 'bulk')
+    started = time.monotonic()
+    for _ in range(12):
+        scheduler.acquire(transfer, QUANTUM)
+    # 768 KiB，其中 256 KiB 为初始突发量，其余按 1 MiB/s 发送
+    assert time.monotonic() - started >= 0.4
+
+
+def test_interactive_charge_does_not_block_but_delays_bulk():
+    scheduler = BandwidthScheduler({'client_limit': '1M'})
+    started = time.monotonic()
+    scheduler.charge('127.0.0.1', 512 * 1024)
+    assert time.monotonic() - started < 0.05
+
+    transfer = scheduler.open('127.0.0.1', 'bulk')
+    scheduler.acquire(transfer, QUANTUM)
+    # 透支的 256 KiB 需要约 0.25 秒补回
+    assert time.monotonic() - started >= 0.2
+
+
+def test_disabled_scheduler_does_not_wait():
+    scheduler = BandwidthScheduler()
+    assert not scheduler.enabled
+    transfer = scheduler.open('127.0.0.1', 'bulk')
+    for _ in range(100):
+        scheduler.acquire(transfer, 1024 * 1024)
+    assert transfer.sent == 100 * 1024 * 1024
+
+
+def test_update_is_persisted_and_reloaded(tmp_path):
+    path = str(tmp_path / 'bandwidth.json')
+    first = BandwidthScheduler(config_path=path)
+    second = BandwidthScheduler(config_path=path)
+
+    first.update({'global_limit': '2M'})
+    second.refresh(force=True)
+    assert second.config['global_limit'] == 2 * 1024 * 1024
+    assert second.enabled
+
+    os.remove(path)
+    second.refresh(force=True)
+    assert not second.enabled
+
+
+def test_range_download_is_shaped_to_content_length(server, client, upload):
+    filename = upload('range.zip', DATA)
+    client.put('/api/bandwidth', json={'client_limit': '8M'})
+    try:
+        with client.get(f'/files/{filename}', headers={'Range': 'bytes=0-2097151'},
+                        environ_overrides={'wsgi.file_wrapper': FileWrapper}) as response:
+            assert server.bandwidth_scheduler.active_transfers == 1
+            body = b''.join(response.response)
+        assert response.status_code == 206
+        assert body == DATA[:2097152]
+        assert server.bandwidth_scheduler.active_transfers == 0
+    finally:
+        client.put('/api/bandwidth', json={'client_limit': 0})
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+
+def state_file(server):
+    return next(name for name in sorted(os.listdir(server.VIDEO_DIR))
+                if name.startswith('.') and os.path.isfile(os.path.join(server.VIDEO_DIR, name)))
+
+
+# 批量删除返回与请求顺序一致的逐项结果；不存在的文件、服务自身的状态文件和路径逐项报错，不影响其他文件
+def test_batch_delete(server, client, upload):
+    first = upload('batch1.txt', b'first batch file')
+    second = upload('batch2.txt', b'second batch file')
+    shared = upload('batch_shared.txt', b'first batch file')
+    hidden = state_file(server)
+
+    filenames = [second, 'missing.txt', first, hidden, '../' + first, first]
+    response = client.post('/api/files/batch/delete', json={'filenames': filenames})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [result['filename'] for result in body['results']] == [second, 'missing.txt', first, hidden, '../' + first]
+    assert [result['status'] for result in body['results']] == ['success', 'error', 'success', 'error', 'error']
+    assert body['results'][1]['error'] == '文件不存在'
+    assert body['results'][3]['error'] == '无效的文件名'
+    assert (body['deleted'], body['failed']) == (2, 3)
+
+    for filename in (first, second):
+        assert not os.path.exists(server.storage.path(filename))
+        assert server.file_index.get(filename) is None
+    assert os.path.exists(os.path.join(server.VIDEO_DIR, hidden))
+    # 相同内容的其他文件不受影响
+    with client.get(f'/files/{shared}', headers={'Accept-Encoding': 'identity'}) as response:
+        assert response.get_data() == b'first batch file'
+
+
+# 批量查询返回与 /api/files 相同的文件信息
+def test_batch_info(server, client, upload):
+    filename = upload('batch_info.txt', b'batch info')
+    hidden = state_file(server)
+    response = client.post('/api/files/batch/info', json={'filenames': [filename, 'missing.txt', hidden]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['found'], body['missing']) == (1, 2)
+    assert [result['status'] for result in body['results']] == ['success', 'error', 'error']
+
+    listed = client.get('/api/files', query_string={'search': 'batch_info'}).get_json()['files']
+    assert body['results'][0]['file'] == next(f for f in listed if f['filename'] == filename)
+
+
+@pytest.mark.parametrize('endpoint', ['/api/files/batch/delete', '/api/files/batch/info'])
+@pytest.mark.parametrize('payload', [
+    {},
+    {'filenames': []},
+    {'filenames': 'a.txt'},
+    {'filenames': ['a.txt', 1]},
+])
+def test_batch_rejects_bad_parameters(client, endpoint, payload):
+    response = client.post(endpoint, json=payload)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_batch_limit(server, client, monkeypatch):
+    monkeypatch.setattr(server, 'BATCH_MAX_FILES', 2)
+    response = client.post('/api/files/batch/info', json={'filenames': ['a.txt', 'b.txt', 'c.txt']})
+    assert response.status_code == 400
@@ -0,0 +1,149 @@
+import hashlib
+import os
+
+import pytest
+
+from blob_store import BlobStore
+
+DATA = b'blob content' * 1000
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / 'files').mkdir()
+    return tmp_path
+
+
+def make_store(root):
+    store = BlobStore(str(root / 'blobs'), str(root / 'blobs.db'))
+    store.start()
+    return store
+
+
+def write_temp(root, name):
+    path = root / name
+    path.write_bytes(DATA)
+    return str(path)
+
+
+# 两个实例模拟两个工作进程：一个存入的内容另一个可以去重、反查和链接
+def test_state_is_shared_between_instances(root):
+    first = make_store(root)
+    second = make_store(root)
+    first_file = str(root / 'files' / 'a')
+    assert first.store(write_temp(root, 'tmp1'), SHA256, first_file) is False
+
+    assert second.total_size == len(DATA)
+    assert second.content_id(os.stat(first_file)) == SHA256
+    second_file = str(root / 'files' / 'b')
+    assert second.store(write_temp(root, 'tmp2'), SHA256, second_file) is True
+    assert os.stat(first_file).st_ino == os.stat(second_file).st_ino
+    assert second.link(SHA256, len(DATA), str(root / 'files' / 'c'))
+    assert not second.link(SHA256, len(DATA) + 1, str(root / 'files' / 'd'))
+
+
+def test_existing_blob_path_is_not_replaced(root):
+    store = make_store(root)
+    first_file = str(root / 'files' / 'a')
+    store.store(write_temp(root, 'tmp1'), SHA256, first_file)
+    # 数据库中没有记录（例如另一个进程刚写入文件），已有路径的 inode 不能被替换
+    store._write(lambda connection: connection.execute('DELETE FROM blobs'))
+    second_file = str(root / 'files' / 'b')
+    assert store.store(write_temp(root, 'tmp2'), SHA256, second_file) is True
+    assert os.stat(first_file).st_ino == os.stat(second_file).st_ino
+
+
+def test_release_frees_space_after_last_link(root):
+    store = make_store(root)
+    files = [str(root / 'files' / name) for name in 'ab']
+    for i, path in enumerate(files):
+        store.store(write_temp(root, f'tmp{i}'), SHA256, path)
+
+    os.remove(files[0])
+    assert store.release(SHA256) is False
+    os.remove(files[1])
+    assert store.release(SHA256) is True
+    assert store.total_size == 0
+    assert not os.path.exists(store.blob_path(SHA256))
+
+
+def test_start_resyncs_with_disk(root):
+    store = make_store(root)
+    path = str(root / 'files' / 'a')
+    store.store(write_temp(root, 'tmp'), SHA256, path)
+    store._write(lambda connection: connection.execute("INSERT INTO blobs VALUES ('stale', 5, 0, 0)"))
+    assert store.total_size == len(DATA) + 5
+
+    restarted = make_store(root)
+    assert restarted.total_size == len(DATA)
+
+
+def test_missing_database_is_rebuilt(root):
+    store = make_store(root)
+    path = str(root / 'files' / 'a')
+    store.store(write_temp(root, 'tmp'), SHA256, path)
+    store._local.connection.close()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(store.db_path + suffix):
+            os.remove(store.db_path + suffix)
+
+    restarted = make_store(root)
+    assert restarted.total_size == len(DATA)
+    assert restarted.content_id(os.stat(path)) == SHA256
+
+
+# 别名把原始内容的 (sha256, size) 指向改写后的内容，目标内容释放后别名一起删除
+def test_alias_links_to_rewritten_content(root):
+    store = make_store(root)
+    first_file = str(root / 'files' / 'a')
+    store.store(write_temp(root, 'tmp'), SHA256, first_file, alias=('original', 7))
+
+    second_file = str(root / 'files' / 'b')
+    assert store.link('original', 7, second_file) == SHA256
+    assert os.stat(first_file).st_ino == os.stat(second_file).st_ino
+    assert store.link('original', 8, str(root / 'files' / 'c')) is None
+
+    for path in (first_file, second_file):
+        os.remove(path)
+    assert store.release(SHA256) is True
+    assert store.link('original', 7, str(root / 'files' / 'd')) is None
+
+
+def probe(client, data, filename='probed.txt', **overrides):
+    payload = dict(sha256=hashlib.sha256(data).hexdigest(), size=len(data), filename=filename)
+    payload.update(overrides)
+    return client.post('/api/files/probe', json=payload)
+
+
+# 秒传：服务器已有相同内容时创建新文件记录并硬链接到同一份内容，否则返回 404 由客户端正常上传
+def test_probe_links_existing_content(server, client, upload):
+    data = b'probe content\n' * 500
+    response = probe(client, data)
+    assert response.status_code == 404
+    assert response.get_json()['status'] == 'missing'
+
+    first = upload('original.txt', data)
+    response = probe(client, data)
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['filename'] != first and result['filename'].endswith('_probed.txt')
+    assert result['sha256'] == hashlib.sha256(data).hexdigest()
+    assert os.stat(server.storage.path(first)).st_ino == os.stat(server.storage.path(result['filename'])).st_ino
+    assert server.file_index.get(result['filename'])['size'] == len(data)
+
+    # 大小不符时不匹配
+    assert probe(client, data, size=len(data) + 1).status_code == 404
+
+
+@pytest.mark.parametrize('overrides', [
+    {'sha256': 'not-a-hash'},
+    {'size': 'large'},
+    {'size': None},
+    {'filename': ''},
+    {'filename': 'program.exe'},
+])
+def test_probe_rejects_bad_parameters(client, overrides):
+    response = probe(client, DATA, **overrides)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
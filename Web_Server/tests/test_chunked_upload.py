@@ -0,0 +1,142 @@
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from chunked_upload import MIN_CHUNK_SIZE, UploadSessionManager, chunks_to_ranges
+from upload_stream import UploadError
+
+CHUNK = MIN_CHUNK_SIZE
+DATA = os.urandom(CHUNK * 2 + 100)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = UploadSessionManager(str(tmp_path / 'sessions'), max_size=10 * CHUNK, gc_interval=0)
+    manager.start()
+    return manager
+
+
+def chunk(index):
+    return DATA[index * CHUNK:(index + 1) * CHUNK]
+
+
+def write(manager, upload_id, index, data=None):
+    data = chunk(index) if data is None else data
+    return manager.write_chunk(upload_id, index, io.BytesIO(data), len(data))
+
+
+def test_chunks_to_ranges():
+    assert chunks_to_ranges({0, 1, 3}, 10, 35) == [[0, 20], [30, 35]]
+    assert chunks_to_ranges(set(), 10, 35) == []
+
+
+# 乱序写入、重复写入，全部到齐后才能完成，完成后会话不再存在
+def test_session_lifecycle(manager):
+    upload_id = manager.create('a.bin', len(DATA), CHUNK)['upload_id']
+    assert manager.status(upload_id)['missing_chunks'] == [0, 1, 2]
+
+    write(manager, upload_id, 2)
+    write(manager, upload_id, 0)
+    assert write(manager, upload_id, 0) == 2
+    status = manager.status(upload_id)
+    assert status['missing_chunks'] == [1]
+    assert status['received_ranges'] == [[0, CHUNK], [2 * CHUNK, len(DATA)]]
+
+    with pytest.raises(UploadError) as error:
+        manager.finalize(upload_id)
+    assert error.value.status_code == 409
+
+    write(manager, upload_id, 1)
+    result = manager.finalize(upload_id)
+    assert result['sha256'] == hashlib.sha256(DATA).hexdigest()
+    with open(result['temp_path'], 'rb') as f:
+        assert f.read() == DATA
+    with pytest.raises(UploadError) as error:
+        manager.status(upload_id)
+    assert error.value.status_code == 404
+
+
+def test_rejects_invalid_chunks(manager):
+    upload_id = manager.create('a.bin', len(DATA), CHUNK)['upload_id']
+    with pytest.raises(UploadError):
+        write(manager, upload_id, 3, b'x')
+    with pytest.raises(UploadError):
+        write(manager, upload_id, 0, b'short')
+    with pytest.raises(UploadError):
+        manager.write_chunk(upload_id, 2, io.BytesIO(DATA[2 * CHUNK:] + b'extra'), None)
+    assert manager.status(upload_id)['received_chunks'] == 0
+
+    with pytest.raises(UploadError) as error:
+        manager.create('big.bin', 11 * CHUNK)
+    assert error.value.status_code == 413
+    with pytest.raises(UploadError):
+        manager.create('a.bin', 100, chunk_size=1)
+
+
+# 服务重启后会话从状态文件恢复，可以继续上传
+def test_sessions_survive_restart(manager):
+    upload_id = manager.create('a.bin', len(DATA), CHUNK)['upload_id']
+    write(manager, upload_id, 0)
+
+    restarted = UploadSessionManager(manager.sessions_dir, max_size=10 * CHUNK, gc_interval=0)
+    restarted.start()
+    assert restarted.status(upload_id)['missing_chunks'] == [1, 2]
+    write(restarted, upload_id, 1)
+    write(restarted, upload_id, 2)
+    assert restarted.finalize(upload_id)['sha256'] == hashlib.sha256(DATA).hexdigest()
+
+
+def test_abort_and_expiry(manager):
+    aborted = manager.create('a.bin', len(DATA), CHUNK)['upload_id']
+    manager.abort(aborted)
+    with pytest.raises(UploadError):
+        write(manager, aborted, 0)
+    assert not os.listdir(manager.sessions_dir)
+
+    expired = manager.create('b.bin', len(DATA), CHUNK)['upload_id']
+    manager.session_ttl = -1
+    assert manager.collect_garbage() == 1
+    with pytest.raises(UploadError):
+        manager.status(expired)
+    assert not os.listdir(manager.sessions_dir)
+
+
+# 两个实例模拟两个工作进程：会话状态只在磁盘上，任一进程都能继续写入、查询和完成
+def test_sessions_are_shared_between_instances(manager):
+    other = UploadSessionManager(manager.sessions_dir, max_size=10 * CHUNK, gc_interval=0)
+    upload_id = manager.create('a.bin', len(DATA), CHUNK)['upload_id']
+    write(other, upload_id, 0)
+    write(manager, upload_id, 1)
+    assert other.status(upload_id)['missing_chunks'] == [2]
+    write(other, upload_id, 2)
+
+    assert manager.finalize(upload_id)['sha256'] == hashlib.sha256(DATA).hexdigest()
+    with pytest.raises(UploadError) as error:
+        other.finalize(upload_id)
+    assert error.value.status_code == 404
+
+
+# 并发写入不同分块时不会丢失已接收的记录
+def test_concurrent_chunks_are_all_recorded(tmp_path):
+    chunk_count = 16
+    data = os.urandom(CHUNK * chunk_count)
+    managers = [UploadSessionManager(str(tmp_path), max_size=len(data), gc_interval=0) for _ in range(2)]
+    upload_id = managers[0].create('a.bin', len(data), CHUNK)['upload_id']
+
+    def send(index):
+        part = data[index * CHUNK:(index + 1) * CHUNK]
+        managers[index % 2].write_chunk(upload_id, index, io.BytesIO(part), len(part))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(send, range(chunk_count)))
+
+    assert managers[1].status(upload_id)['missing_chunks'] == []
+    assert managers[0].finalize(upload_id)['sha256'] == hashlib.sha256(data).hexdigest()
+
+
+def test_rejects_malformed_upload_id(manager):
+    with pytest.raises(UploadError) as error:
+        manager.status('../../etc/passwd')
+    assert error.value.status_code == 404
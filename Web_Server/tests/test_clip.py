@@ -0,0 +1,74 @@
+import pytest
+
+from mp4_tools import load_movie, read_top_level_boxes
+
+
+def fetch_clip(client, filename, start, end):
+    with client.get(f'/files/{filename}/clip', query_string={'start': start, 'end': end}) as response:
+        return response, response.get_data()
+
+
+def sample_data(data, track, sample):
+    offset = track.sample_offsets[sample]
+    return data[offset:offset + track.sample_sizes[sample]]
+
+
+# 从 start 之前最近的关键帧（0.5 秒处的第 5 个采样）开始，到 end 所在采样为止；
+# 剪辑中每个采样按新的 stco/stsz 读到的内容与原文件中对应的采样一致
+def test_clip_starts_at_keyframe(client, upload, keyframe_mp4, tmp_path):
+    data, samples = keyframe_mp4()
+    filename = upload('clip.mp4', data)
+
+    response, body = fetch_clip(client, filename, 0.75, 1.25)
+    assert response.status_code == 200
+    assert (response.headers['X-Clip-Start'], response.headers['X-Clip-End']) == ('0.5', '1.3')
+    assert int(response.headers['Content-Length']) == len(body)
+
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(body)
+    with open(path, 'rb') as f:
+        assert [box_type for box_type, _, _ in read_top_level_boxes(f, len(body))] == [b'ftyp', b'moov', b'mdat']
+    movie = load_movie(str(path))
+    track = movie.reference_track()
+    assert track.sync_samples[0] == 0
+    assert track.sync_samples == [0, 5]
+    assert track.total_duration / track.timescale == pytest.approx(0.8)
+    assert movie.duration == pytest.approx(0.8)
+    assert [sample_data(body, track, i) for i in range(track.sample_count)] == samples[0][5:13]
+
+
+# 多轨道剪辑：音轨取覆盖剪辑区间的采样，各轨道的分块偏移都指向正确的数据
+def test_clip_keeps_tracks_consistent(client, upload, keyframe_mp4, tmp_path):
+    data, samples = keyframe_mp4(audio=True)
+    filename = upload('clip_av.mp4', data)
+
+    response, body = fetch_clip(client, filename, 1.0, 1.6)
+    assert response.status_code == 200
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(body)
+    video, audio = load_movie(str(path)).tracks
+    assert [sample_data(body, video, i) for i in range(video.sample_count)] == samples[0][10:16]
+    assert [sample_data(body, audio, i) for i in range(audio.sample_count)] == samples[1][5:8]
+    media_size = sum(video.sample_sizes) + sum(audio.sample_sizes)
+    assert len(body) == min(video.sample_offsets + audio.sample_offsets) + media_size
+
+
+# Range 请求返回剪辑内容中对应的字节
+def test_clip_range(client, upload, keyframe_mp4):
+    data, _ = keyframe_mp4()
+    filename = upload('clip_range.mp4', data)
+    _, full = fetch_clip(client, filename, 0, 1)
+    with client.get(f'/files/{filename}/clip?start=0&end=1', headers={'Range': 'bytes=100-199'}) as response:
+        assert response.status_code == 206
+        assert response.get_data() == full[100:200]
+
+
+@pytest.mark.parametrize('query, status', [
+    ({'start': 'abc'}, 400),
+    ({'start': 2, 'end': 1}, 400),
+    ({'start': 5}, 415),
+])
+def test_clip_rejects_invalid_ranges(client, upload, keyframe_mp4, query, status):
+    data, _ = keyframe_mp4()
+    filename = upload('clip_invalid.mp4', data)
+    assert client.get(f'/files/{filename}/clip', query_string=query).status_code == status
@@ -0,0 +1,114 @@
+import gzip
+import os
+import time
+
+import pytest
+from werkzeug.http import parse_accept_header
+
+import compression
+from compression import CompressionCache
+
+TEXT = b'line of compressible text\n' * 200
+
+
+def accept(header):
+    return parse_accept_header(header)
+
+
+# 压缩线程池有多个线程，等待该文件自己的压缩任务结束（任务结束时从 _pending 中移除）
+def wait_compressed(server, filename):
+    deadline = time.monotonic() + 10
+    while filename in server.compression_cache._pending:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+# 三种编码的预压缩版本都已生成时，按客户端的 q 值选择，相同时按服务端偏好 br > zstd > gzip
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate, br, zstd', 'br'),
+    ('gzip, zstd', 'zstd'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('identity', None),
+    ('', None),
+])
+def test_negotiate_prefers_client_then_server_order(tmp_path, monkeypatch, header, expected):
+    monkeypatch.setattr(compression, 'ENCODERS', [
+        ('br', 'br', None), ('zstd', 'zst', None), ('gzip', 'gz', None)])
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(TEXT)
+    cache = CompressionCache(str(tmp_path / 'cache'), lambda filename: str(source))
+    cache.start()
+    for suffix in ('br', 'zst', 'gz'):
+        with open(cache.variant_path('notes.txt', suffix), 'wb') as f:
+            f.write(b'x')
+
+    encoding, path = cache.negotiate('notes.txt', os.stat(source), accept(header))
+    assert encoding == expected
+    assert path == (cache.variant_path('notes.txt', dict(br='br', zstd='zst', gzip='gz')[expected])
+                    if expected else None)
+
+
+# 原文件比压缩版本新时压缩版本视为过期，退回实时 gzip
+def test_negotiate_ignores_stale_variant(tmp_path):
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(TEXT)
+    cache = CompressionCache(str(tmp_path / 'cache'), lambda filename: str(source))
+    cache.start()
+    variant = cache.variant_path('notes.txt', 'gz')
+    with open(variant, 'wb') as f:
+        f.write(b'x')
+    os.utime(variant, (0, 0))
+    assert cache.negotiate('notes.txt', os.stat(source), accept('gzip')) == ('gzip', None)
+
+
+def test_precompressed_gzip_response(server, client, upload):
+    filename = upload('notes.txt', TEXT)
+    wait_compressed(server, filename)
+
+    with client.get(f'/files/{filename}', headers={'Accept-Encoding': 'gzip'}) as response:
+        body = response.get_data()
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.headers['ETag'].endswith('-gzip"')
+    assert gzip.decompress(body) == TEXT
+
+    with client.get(f'/files/{filename}', headers={'Accept-Encoding': 'identity'}) as response:
+        assert response.get_data() == TEXT
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+# 预压缩版本尚未生成时实时 gzip 压缩（弱 ETag）；带 Range 的请求不压缩，按原始内容返回
+def test_on_the_fly_gzip_and_range_bypass(server, client, upload):
+    filename = upload('stream.txt', TEXT)
+    wait_compressed(server, filename)
+    server.compression_cache.remove(filename)
+    for _, suffix, _ in compression.ENCODERS:
+        assert not os.path.exists(server.compression_cache.variant_path(filename, suffix))
+    # 阻止下载时重新调度压缩任务生成预压缩版本
+    server.compression_cache._pending.add(filename)
+    try:
+        with client.get(f'/files/{filename}', headers={'Accept-Encoding': 'gzip'}) as response:
+            body = response.get_data()
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['ETag'].startswith('W/')
+        assert gzip.decompress(body) == TEXT
+
+        with client.get(f'/files/{filename}', headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=0-9'}) as response:
+            assert response.status_code == 206
+            assert response.get_data() == TEXT[:10]
+        assert 'Content-Encoding' not in response.headers
+        assert 'Accept-Encoding' in response.headers['Vary']
+    finally:
+        server.compression_cache._pending.discard(filename)
+
+
+# 删除文件时同时删除其预压缩版本
+def test_delete_removes_variants(server, client, upload):
+    filename = upload('deleted.txt', TEXT)
+    wait_compressed(server, filename)
+    variant = server.compression_cache.variant_path(filename, 'gz')
+    assert os.path.exists(variant)
+
+    assert client.delete(f'/api/files/{filename}').status_code == 200
+    assert not os.path.exists(variant)
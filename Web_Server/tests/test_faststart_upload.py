@@ -0,0 +1,108 @@
+import hashlib
+import os
+import struct
+import threading
+
+from mp4_tools import Box, needs_faststart, read_top_level_boxes
+
+SAMPLE_SIZE = 4096
+SAMPLES = 4
+
+
+def full_box(box_type, payload, version=0):
+    return Box(box_type, struct.pack('>I', version << 24) + payload)
+
+
+# moov 位于 mdat 之后的 MP4，每个分块一个样本
+def moov_last_mp4():
+    ftyp = Box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2avc1mp41').to_bytes()
+    mdat_start = len(ftyp)
+    offsets = [mdat_start + 8 + i * SAMPLE_SIZE for i in range(SAMPLES)]
+    stbl = Box(b'stbl', None, [
+        full_box(b'stsd', struct.pack('>I', 1) + Box(b'avc1', bytes(78)).to_bytes()),
+        full_box(b'stts', struct.pack('>III', 1, SAMPLES, 1)),
+        full_box(b'stsc', struct.pack('>IIII', 1, 1, 1, 1)),
+        full_box(b'stsz', struct.pack('>II', SAMPLE_SIZE, SAMPLES)),
+        full_box(b'stco', struct.pack(f'>I{SAMPLES}I', SAMPLES, *offsets)),
+    ])
+    trak = Box(b'trak', None, [
+        full_box(b'tkhd', bytes(76) + struct.pack('>II', 320 << 16, 240 << 16)),
+        Box(b'mdia', None, [
+            full_box(b'mdhd', struct.pack('>IIIII', 0, 0, 25, SAMPLES, 0)),
+            full_box(b'hdlr', struct.pack('>I4s', 0, b'vide') + bytes(13)),
+            Box(b'minf', None, [stbl]),
+        ]),
+    ])
+    moov = Box(b'moov', None, [full_box(b'mvhd', struct.pack('>IIII', 0, 0, 25, SAMPLES) + bytes(80)), trak])
+    mdat = b''.join(bytes([i + 1]) * SAMPLE_SIZE for i in range(SAMPLES))
+    return ftyp + struct.pack('>I4s', 8 + len(mdat), b'mdat') + mdat + moov.to_bytes()
+
+
+# 暂停后台重排，返回恢复并等待重排完成的函数
+def pause_faststart(server):
+    release = threading.Event()
+    executor = server.faststart_worker._get_executor()
+    executor.submit(release.wait)
+
+    def resume():
+        release.set()
+        executor.submit(lambda: None).result()
+    return resume
+
+
+# 上传后立即以原始内容发布（ETag 按 stat 生成、不标记 immutable），后台重排完成后替换为新的强 ETag
+def test_upload_is_published_then_remuxed(server, client, upload):
+    data = moov_last_mp4()
+    resume = pause_faststart(server)
+    try:
+        filename = upload('moov_last.mp4', data)
+        with client.get(f'/files/{filename}') as response:
+            assert response.get_data() == data
+        assert response.headers['ETag'] != f'"{hashlib.sha256(data).hexdigest()}"'
+        assert 'immutable' not in response.headers['Cache-Control']
+        original_etag = response.headers['ETag']
+    finally:
+        resume()
+
+    path = server.storage.path(filename)
+    assert not needs_faststart(path)
+    with open(path, 'rb') as f:
+        assert [box_type for box_type, _, _ in read_top_level_boxes(f, len(data))] == [b'ftyp', b'moov', b'mdat']
+    with client.get(f'/files/{filename}', headers={'If-None-Match': original_etag}) as response:
+        body = response.get_data()
+    assert response.status_code == 200
+    sha256 = hashlib.sha256(body).hexdigest()
+    assert response.headers['ETag'] == f'"{sha256}"'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert server.file_index.get(filename)['sha256'] == sha256
+
+
+# 重排期间文件被删除时放弃替换，不会把文件放回
+def test_deleted_file_is_not_restored(server, client, upload):
+    resume = pause_faststart(server)
+    try:
+        filename = upload('deleted.mp4', moov_last_mp4())
+        path = server.storage.path(filename)
+        assert client.delete(f'/api/files/{filename}').status_code == 200
+    finally:
+        resume()
+    assert not os.path.exists(path)
+    assert server.file_index.get(filename) is None
+
+
+# 秒传与重复上传按原始内容的别名匹配重排后的内容
+def test_original_hash_links_to_remuxed_content(server, client, upload):
+    data = moov_last_mp4()
+    first = upload('first.mp4', data)
+    server.faststart_worker._get_executor().submit(lambda: None).result()
+    stored_sha256 = server.file_index.get(first)['sha256']
+    assert stored_sha256 != hashlib.sha256(data).hexdigest()
+
+    response = client.post('/api/files/probe', json={
+        'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data), 'filename': 'again.mp4'})
+    assert response.status_code == 200
+    assert response.get_json()['sha256'] == stored_sha256
+
+    second = upload('second.mp4', data)
+    assert server.file_index.get(second)['sha256'] == stored_sha256
+    assert os.stat(server.storage.path(first)).st_ino == os.stat(server.storage.path(second)).st_ino
@@ -0,0 +1,195 @@
+import os
+from datetime import datetime
+
+import pytest
+
+import file_catalog
+import file_index
+from file_catalog import FileCatalog
+from file_index import FileIndex
+from storage_layout import StorageLayout
+
+
+def file_type(filename):
+    return 'video' if filename.endswith('.mp4') else 'document'
+
+
+# 两种索引实现的查询结果应当一致
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_index(request, tmp_path):
+    def build(names):
+        storage = StorageLayout(str(tmp_path / 'files'))
+        for i, name in enumerate(names):
+            with open(storage.new_path(f'20250101_0000{i:02d}_{i:08x}_{name}'), 'wb') as f:
+                f.write(bytes(i + 1))
+        if request.param == 'memory':
+            index = FileIndex(storage, file_type, reconcile_interval=0)
+        else:
+            index = FileCatalog(str(tmp_path / 'catalog.db'), storage, file_type, reconcile_interval=0)
+        index.start()
+        return index
+    return build
+
+
+def pages(index, **kwargs):
+    cursor = None
+    while True:
+        result = index.query(per_page=3, cursor=cursor, **kwargs)
+        yield result
+        cursor = result['next_cursor']
+        if cursor is None:
+            return
+
+
+# 带游标翻页时 total 始终为满足条件的总数，has_more 表示当前页之后是否还有项
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'sort': 'size', 'order': 'asc'},
+    {'file_types': ['video']},
+    {'name': 'clip'},
+    {'sort': 'name', 'min_size': 2},
+])
+def test_cursor_pages_keep_total(make_index, kwargs):
+    names = [f'clip{i}.mp4' if i % 2 else f'note{i}.txt' for i in range(10)]
+    index = make_index(names)
+    expected = index.query(**kwargs)['records']
+
+    seen = []
+    for result in pages(index, **kwargs):
+        assert result['total'] == len(expected)
+        seen.extend(result['records'])
+        assert result['has_more'] == (len(seen) < len(expected))
+        assert result['records']
+    assert [r['filename'] for r in seen] == [r['filename'] for r in expected]
+
+
+def test_page_number_has_more(make_index):
+    index = make_index([f'f{i}.txt' for i in range(6)])
+    result = index.query(page=2, per_page=3)
+    assert (result['total'], result['has_more'], len(result['records'])) == (6, False, 3)
+    assert result['next_cursor'] is None
+    assert index.query(page=1, per_page=3)['has_more'] is True
+
+
+# 按过滤条件缓存的总数在目录变化后重新计算
+def test_filtered_total_follows_changes(make_index):
+    index = make_index([f'clip{i}.mp4' for i in range(4)])
+    assert index.query(name='clip', per_page=2)['total'] == 4
+    index.remove(index.query(name='clip', per_page=1)['records'][0]['filename'])
+    assert index.query(name='clip', per_page=2)['total'] == 3
+
+
+# 上传/删除时原地更新；绕过接口放入或删除的文件在对账时同步，版本号随之变化
+def test_updates_and_reconcile(make_index):
+    index = make_index(['a.txt', 'b.mp4'])
+    storage = index.storage
+    names = [record['filename'] for record in index.list_records()]
+    assert len(index) == 2
+
+    added = '20250102_000000_000000aa_c.txt'
+    with open(storage.new_path(added), 'wb') as f:
+        f.write(bytes(3))
+    record = index.add(added)
+    assert (record['size'], record['type'], record['original_name']) == (3, 'document', 'c.txt')
+    assert index.get(added) == record
+    os.remove(storage.path(added))
+    index.remove(added)
+    assert added not in index
+
+    generation = index.generation
+    external = '20250103_000000_000000bb_d.mp4'
+    with open(storage.new_path(external), 'wb') as f:
+        f.write(bytes(5))
+    os.remove(storage.path(names[0]))
+    index.reconcile()
+    assert external in index and names[0] not in index
+    assert sorted(r['filename'] for r in index.list_records()) == sorted([names[1], external])
+    assert index.stats()['total_files'] == 2
+    assert index.generation != generation
+
+
+def catalog_counters(catalog):
+    rows = catalog._connect().execute('SELECT kind, key, count, size FROM counters')
+    return {(kind, key): (count, size) for kind, key, count, size in rows}
+
+
+def expected_counters(records):
+    expected = {}
+    for record in records:
+        keys = [('type', record['type']), ('day', record['upload_date'][:10])]
+        if record['sha256'] is None:
+            keys.append(('unshared', ''))
+        for key in keys:
+            count, size = expected.get(key, (0, 0))
+            expected[key] = (count + 1, size + record['size'])
+    return expected
+
+
+# 触发器在写入记录的同一事务中维护计数器与版本号，结果与按全部记录重新统计一致
+def test_triggers_maintain_counters(tmp_path):
+    storage = StorageLayout(str(tmp_path / 'files'))
+    names = [f'20250101_00000{i}_{i:08x}_{name}' for i, name in enumerate(['a.mp4', 'b.txt', 'c.txt'])]
+    for i, name in enumerate(names):
+        with open(storage.new_path(name), 'wb') as f:
+            f.write(bytes(10 * (i + 1)))
+    catalog = FileCatalog(str(tmp_path / 'catalog.db'), storage, file_type, reconcile_interval=0)
+    catalog.start()
+    assert catalog_counters(catalog) == expected_counters(catalog.list_records())
+
+    generation = catalog.generation
+    # 更新已有记录（大小与内容哈希变化）、删除、新增
+    with open(storage.path(names[0]), 'ab') as f:
+        f.write(bytes(5))
+    catalog.add(names[0], sha256='0' * 64)
+    catalog.remove(names[1])
+    new_name = '20250102_000000_000000ff_d.mp4'
+    with open(storage.new_path(new_name), 'wb') as f:
+        f.write(bytes(7))
+    catalog.add(new_name)
+    assert catalog.generation > generation
+    assert catalog_counters(catalog) == expected_counters(catalog.list_records())
+
+    stats = catalog.stats()
+    assert stats['total_files'] == 3
+    assert stats['total_size'] == 15 + 30 + 7
+    assert stats['unshared_size'] == 30 + 7
+
+    # 重新打开已有数据库时沿用触发器维护的计数器
+    reopened = FileCatalog(str(tmp_path / 'catalog.db'), storage, file_type, reconcile_interval=0)
+    reopened.start()
+    assert catalog_counters(reopened) == expected_counters(reopened.list_records())
+
+    catalog.remove_many([names[0], names[2], new_name])
+    assert catalog_counters(catalog) == {}
+
+
+def fixed_now(monkeypatch, value):
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return value
+    monkeypatch.setattr(file_index, 'datetime', FixedDatetime)
+    monkeypatch.setattr(file_catalog, 'datetime', FixedDatetime)
+
+
+# 统计信息由计数器维护：按类型分组、按上传日期分桶，跨天后"今日上传"自然切换到新的日期
+def test_stats_counters_and_day_rollover(make_index, monkeypatch):
+    index = make_index(['a.mp4', 'b.txt', 'c.txt'])
+    fixed_now(monkeypatch, datetime(2025, 1, 1, 12))
+    stats = index.stats(days=3)
+    assert (stats['total_files'], stats['uploaded_today'], stats['total_size']) == (3, 3, 1 + 2 + 3)
+    assert stats['types'] == {'video': {'count': 1, 'size': 1}, 'document': {'count': 2, 'size': 5}}
+    assert stats['history'] == [{'date': '2024-12-30', 'count': 0, 'size': 0},
+                                {'date': '2024-12-31', 'count': 0, 'size': 0},
+                                {'date': '2025-01-01', 'count': 3, 'size': 6}]
+
+    fixed_now(monkeypatch, datetime(2025, 1, 2, 0, 0, 1))
+    stats = index.stats(days=2)
+    assert stats['uploaded_today'] == 0
+    assert [day['count'] for day in stats['history']] == [3, 0]
+
+    index.remove(next(r['filename'] for r in index.list_records() if r['type'] == 'video'))
+    stats = index.stats(days=2)
+    assert stats['total_files'] == 2
+    assert 'video' not in stats['types']
+    assert stats['history'][0] == {'date': '2025-01-01', 'count': 2, 'size': 5}
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import re
+
+import pytest
+
+DATA = os.urandom(10000)
+
+
+@pytest.fixture
+def filename(upload):
+    return upload('range.zip', DATA)
+
+
+def get(client, filename, **headers):
+    with client.get(f'/files/{filename}', headers=headers) as response:
+        response.body = response.get_data()
+        return response
+
+
+def test_single_range(client, filename):
+    response = get(client, filename, Range='bytes=100-199')
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(DATA)}'
+    assert response.body == DATA[100:200]
+
+    response = get(client, filename, Range='bytes=-10')
+    assert response.headers['Content-Range'] == f'bytes {len(DATA) - 10}-{len(DATA) - 1}/{len(DATA)}'
+    assert response.body == DATA[-10:]
+
+    response = get(client, filename, Range='bytes=9990-')
+    assert response.body == DATA[9990:]
+
+
+def test_unsatisfiable_range(client, filename):
+    response = get(client, filename, Range=f'bytes={len(DATA)}-')
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(DATA)}'
+
+
+# 多个区间返回 multipart/byteranges，每部分带各自的 Content-Range
+def test_multiple_ranges(client, filename):
+    response = get(client, filename, Range='bytes=0-9,5000-5009')
+    assert response.status_code == 206
+    boundary = re.search(r'boundary=(\S+)', response.headers['Content-Type']).group(1)
+    parts = response.body.split(f'--{boundary}'.encode())
+    assert parts[-1].strip() == b'--'
+    bodies = []
+    for part in parts[1:-1]:
+        head, body = part.split(b'\r\n\r\n', 1)
+        assert b'Content-Range: bytes ' in head
+        bodies.append(body[:-2])
+    assert bodies == [DATA[:10], DATA[5000:5010]]
+    assert len(response.body) == int(response.headers['Content-Length'])
+
+
+# If-Range 与当前 ETag 一致时返回区间，否则返回完整内容
+def test_if_range(client, filename):
+    etag = get(client, filename).headers['ETag']
+    response = get(client, filename, Range='bytes=0-9', **{'If-Range': etag})
+    assert response.status_code == 206
+    assert response.body == DATA[:10]
+
+    response = get(client, filename, Range='bytes=0-9', **{'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.body == DATA
+
+    # If-Range 使用强比较，即使标签相同，弱 ETag 也不匹配
+    response = get(client, filename, Range='bytes=0-9', **{'If-Range': 'W/' + etag})
+    assert response.status_code == 200
+    assert response.body == DATA
+
+
+# 唯一文件名的下载地址内容不变：以 SHA-256 为强 ETag 并标记为 immutable
+def test_download_validators(client, filename):
+    response = get(client, filename)
+    assert response.headers['ETag'] == f'"{hashlib.sha256(DATA).hexdigest()}"'
+    assert 'immutable' in response.headers['Cache-Control']
+
+    response = get(client, filename, **{'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert response.body == b''
+
+
+# 列表接口以索引版本号为弱 ETag，数据变化后 ETag 随之变化
+def test_listing_validators(client, upload):
+    etag = client.get('/api/files').headers['ETag']
+    assert etag.startswith('W/')
+    assert client.get('/api/files', headers={'If-None-Match': etag}).status_code == 304
+
+    upload('listing.zip', os.urandom(100))
+    response = client.get('/api/files', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
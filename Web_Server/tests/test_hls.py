@@ -0,0 +1,73 @@
+import re
+import struct
+
+import pytest
+
+from mp4_tools import parse_boxes
+
+
+def playlist(client, filename):
+    with client.get(f'/hls/{filename}/index.m3u8') as response:
+        return response, response.get_data(as_text=True)
+
+
+def byte_range(client, filename, length, offset):
+    headers = {'Range': f'bytes={offset}-{offset + length - 1}'}
+    with client.get(f'/hls/{filename}/media.mp4', headers=headers) as response:
+        assert response.status_code == 206
+        return response.get_data()
+
+
+# 20 秒、每 2.5 秒一个关键帧：片段在达到 6 秒后的第一个关键帧处切分（7.5 + 7.5 + 5 秒）
+def test_playlist_segments(client, upload, keyframe_mp4):
+    data, _ = keyframe_mp4(video_samples=200, keyframes=range(0, 200, 25))
+    filename = upload('hls.mp4', data)
+
+    response, text = playlist(client, filename)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.apple.mpegurl'
+    lines = text.splitlines()
+    assert lines[0] == '#EXTM3U' and lines[-1] == '#EXT-X-ENDLIST'
+    assert '#EXT-X-TARGETDURATION:8' in lines
+    assert [line for line in lines if line.startswith('#EXTINF')] == [
+        '#EXTINF:7.500,', '#EXTINF:7.500,', '#EXTINF:5.000,']
+
+
+# 播放列表中的字节区间首尾相接，初始化段为 ftyp + moov（含 mvex），
+# 每个片段为 moof + mdat，mdat 中依次为该片段的原始采样数据
+def test_segment_byte_ranges(client, upload, keyframe_mp4):
+    data, samples = keyframe_mp4(video_samples=200, keyframes=range(0, 200, 25))
+    filename = upload('hls_ranges.mp4', data)
+    _, text = playlist(client, filename)
+
+    init_size = int(re.search(r'BYTERANGE="(\d+)@0"', text).group(1))
+    ranges = [tuple(map(int, match)) for match in re.findall(r'#EXT-X-BYTERANGE:(\d+)@(\d+)', text)]
+    assert ranges[0][1] == init_size
+    assert all(offset + length == next_offset for (length, offset), (_, next_offset) in zip(ranges, ranges[1:]))
+
+    init = parse_boxes(byte_range(client, filename, init_size, 0))
+    assert [box.type for box in init] == [b'ftyp', b'moov']
+    assert init[1].find(b'mvex') is not None
+
+    for (length, offset), (first, last) in zip(ranges, [(0, 75), (75, 150), (150, 200)]):
+        segment = byte_range(client, filename, length, offset)
+        assert len(segment) == length
+        moof, mdat = parse_boxes(segment)
+        assert (moof.type, mdat.type) == (b'moof', b'mdat')
+        assert mdat.payload == b''.join(samples[0][first:last])
+        _, traf = parse_boxes(moof.payload)
+        trun = parse_boxes(traf.payload)[-1]
+        assert trun.type == b'trun'
+        assert struct.unpack_from('>I', trun.payload, 4)[0] == last - first
+
+
+# 缺少采样表中的盒子时返回 415，而不是 500
+@pytest.mark.parametrize('box_type', [b'stts', b'stsc', b'mdhd', b'mvhd'])
+def test_missing_box_is_rejected(client, upload, keyframe_mp4, box_type):
+    data, _ = keyframe_mp4()
+    assert data.count(box_type) == 1
+    filename = upload(f'broken_{box_type.decode()}.mp4', data.replace(box_type, b'junk'))
+    response, _ = playlist(client, filename)
+    assert response.status_code == 415
+    with client.get(f'/hls/{filename}/media.mp4') as response:
+        assert response.status_code == 415
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+
+# 列表接口由索引提供，不扫描目录
+@pytest.fixture
+def no_directory_scan(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('列表接口不应扫描目录')
+    monkeypatch.setattr(os, 'listdir', fail)
+    monkeypatch.setattr(os, 'scandir', fail)
+    monkeypatch.setattr(os, 'walk', fail)
+
+
+def test_listing_endpoints_served_from_index(client, upload, no_directory_scan):
+    filename = upload('listed.zip', b'data')
+
+    files = client.get('/api/files').get_json()['files']
+    entry = next(f for f in files if f['filename'] == filename)
+    assert (entry['size'], entry['original_name']) == (4, 'listed.zip')
+    assert any(f['filename'] == filename for f in client.get('/videos').get_json()['files'])
+    assert client.get('/api/stats').status_code == 200
+
+
+# 列表接口以索引版本号作为弱 ETag：内容未变化时返回 304，上传或删除后返回新的内容
+def test_listing_etag_follows_changes(client, upload):
+    response = client.get('/videos')
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    assert client.get('/videos', headers={'If-None-Match': etag}).status_code == 304
+
+    filename = upload('etag.zip', b'data')
+    response = client.get('/videos', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+    etag = response.headers['ETag']
+    assert client.delete(f'/api/files/{filename}').status_code == 200
+    assert client.get('/videos', headers={'If-None-Match': etag}).status_code == 200
+
+
+# 统计接口：days 指定每日上传直方图的天数，逻辑大小与去重后的物理大小分别返回
+def test_stats_endpoint(client, upload):
+    before = client.get('/api/stats?days=3').get_json()
+    upload('stats.zip', b'12345')
+    upload('stats_copy.zip', b'12345')
+    stats = client.get('/api/stats?days=3').get_json()
+
+    assert len(stats['history']) == 3
+    assert stats['total_files'] == before['total_files'] + 2
+    assert stats['uploaded_today'] == before['uploaded_today'] + 2
+    assert stats['history'][-1]['count'] == before['history'][-1]['count'] + 2
+    assert stats['logical_size'] == before['logical_size'] + 10
+    assert stats['physical_size'] == before['physical_size'] + 5
+    assert stats['types']['其他文件']['count'] == before['types'].get('其他文件', {}).get('count', 0) + 2
+    assert client.get('/api/stats?days=0').status_code == 400
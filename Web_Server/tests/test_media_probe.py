@@ -0,0 +1,168 @@
+import io
+import random
+import struct
+import zlib
+
+import pytest
+
+import media_probe
+from media_probe import probe_media
+from mp4_tools import Box
+
+
+def full_box(box_type, payload, version=0):
+    return Box(box_type, struct.pack('>I', version << 24) + payload)
+
+
+def png():
+    ihdr = struct.pack('>IIBBBBB', 640, 480, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + ihdr
+            + struct.pack('>I', zlib.crc32(b'IHDR' + ihdr)))
+
+
+def gif():
+    return b'GIF89a' + struct.pack('<HH', 320, 200) + bytes(20)
+
+
+def jpeg():
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00' + bytes(9)
+    sof = b'\xff\xc0' + struct.pack('>HBHHB', 17, 8, 240, 320, 3) + bytes(9)
+    return b'\xff\xd8' + app0 + sof + b'\xff\xda' + bytes(20)
+
+
+def wav():
+    fmt = struct.pack('<HHIIHH', 1, 2, 44100, 176400, 4, 16)
+    data = bytes(176400)
+    return (b'RIFF' + struct.pack('<I', 36 + len(data)) + b'WAVE' + b'fmt ' + struct.pack('<I', 16) + fmt
+            + b'data' + struct.pack('<I', len(data)) + data)
+
+
+def flac():
+    bits = (48000 << 44) | (1 << 41) | (15 << 36) | 96000
+    streaminfo = bytes(10) + bits.to_bytes(8, 'big') + bytes(16)
+    return b'fLaC' + bytes([0x80]) + len(streaminfo).to_bytes(3, 'big') + streaminfo
+
+
+def mp3():
+    frame = b'\xff\xfb\x90\x64' + bytes(413)
+    return b'ID3\x03\x00\x00\x00\x00\x00\x00' + frame * 20
+
+
+def mp4():
+    stbl = Box(b'stbl', None, [
+        full_box(b'stsd', struct.pack('>I', 1) + Box(b'avc1', bytes(78)).to_bytes()),
+    ])
+    trak = Box(b'trak', None, [
+        full_box(b'tkhd', bytes(76) + struct.pack('>II', 1920 << 16, 1080 << 16)),
+        Box(b'mdia', None, [
+            full_box(b'hdlr', struct.pack('>I4s', 0, b'vide') + bytes(13)),
+            Box(b'minf', None, [stbl]),
+        ]),
+    ])
+    moov = Box(b'moov', None, [full_box(b'mvhd', struct.pack('>IIII', 0, 0, 25, 250) + bytes(80)), trak])
+    return (Box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2avc1mp41').to_bytes()
+            + struct.pack('>I4s', 8 + 64, b'mdat') + bytes(64) + moov.to_bytes())
+
+
+def ebml(element_id, data):
+    size = len(data)
+    return element_id + bytes([0x40 | (size >> 8), size & 0xFF]) + data
+
+
+def mkv():
+    header = ebml(b'\x1a\x45\xdf\xa3', ebml(b'\x42\x82', b'webm'))
+    info = ebml(b'\x15\x49\xa9\x66', ebml(b'\x2a\xd7\xb1', (1000000).to_bytes(3, 'big'))
+                + ebml(b'\x44\x89', struct.pack('>d', 5000.0)))
+    video = ebml(b'\xe0', ebml(b'\xb0', (640).to_bytes(2, 'big')) + ebml(b'\xba', (360).to_bytes(2, 'big')))
+    track = ebml(b'\xae', ebml(b'\x83', b'\x01') + ebml(b'\x86', b'V_VP9') + video)
+    tracks = ebml(b'\x16\x54\xae\x6b', track)
+    return header + ebml(b'\x18\x53\x80\x67', info + tracks)
+
+
+SAMPLES = {
+    'png': (png, {'format': 'png', 'width': 640, 'height': 480}),
+    'gif': (gif, {'format': 'gif', 'width': 320, 'height': 200}),
+    'jpg': (jpeg, {'format': 'jpeg', 'width': 320, 'height': 240}),
+    'wav': (wav, {'format': 'wav', 'channels': 2, 'sample_rate': 44100, 'duration': 1.0}),
+    'flac': (flac, {'format': 'flac', 'sample_rate': 48000, 'channels': 2, 'duration': 2.0}),
+    'mp3': (mp3, {'format': 'mp3', 'sample_rate': 44100}),
+    'mp4': (mp4, {'format': 'mp4', 'duration': 10.0, 'video_codec': 'h264', 'width': 1920, 'height': 1080}),
+    'webm': (mkv, {'format': 'webm', 'duration': 5.0, 'video_codec': 'vp9', 'width': 640, 'height': 360}),
+}
+
+
+def probe_bytes(tmp_path, extension, data):
+    path = tmp_path / f'sample.{extension}'
+    path.write_bytes(data)
+    return probe_media(str(path))
+
+
+@pytest.mark.parametrize('extension', sorted(SAMPLES))
+def test_valid_samples(tmp_path, extension):
+    build, expected = SAMPLES[extension]
+    info = probe_bytes(tmp_path, extension, build())
+    assert info is not None
+    for key, value in expected.items():
+        assert info[key] == value
+
+
+# 截断到任意长度的文件只能返回结果或 None，不能抛出异常
+@pytest.mark.parametrize('extension', sorted(SAMPLES))
+def test_truncated_samples(tmp_path, extension):
+    data = SAMPLES[extension][0]()
+    for length in range(min(len(data), 600)):
+        info = probe_bytes(tmp_path, extension, data[:length])
+        assert info is None or isinstance(info, dict)
+
+
+@pytest.mark.parametrize('extension', sorted(SAMPLES))
+def test_mutated_samples(tmp_path, extension):
+    data = SAMPLES[extension][0]()[:4096]
+    rng = random.Random(extension)
+    for _ in range(300):
+        mutated = bytearray(data)
+        for _ in range(rng.randint(1, 8)):
+            position = rng.randrange(min(len(mutated), 200))
+            mutated[position] = rng.choice((0x00, 0x01, 0x7F, 0x80, 0xFF, rng.randrange(256)))
+        info = probe_bytes(tmp_path, extension, bytes(mutated))
+        assert info is None or isinstance(info, dict)
+
+
+# EBML 头的大小字段最大约为 2^56，不能按该大小读取
+def test_matroska_huge_element_size_is_rejected(tmp_path):
+    data = b'\x1a\x45\xdf\xa3\x01\x00\xff\xff\xff\xff\xff\xff' + bytes(136)
+    assert probe_bytes(tmp_path, 'mkv', data) is None
+
+
+def test_matroska_child_larger_than_parent_is_rejected(tmp_path):
+    data = mkv().replace(ebml(b'\x42\x82', b'webm'), b'\x42\x82\x08\x00\x00\x00\x00\x00\x00\x00', 1)
+    assert probe_bytes(tmp_path, 'mkv', data) is None
+
+
+def test_mp4_huge_moov_is_rejected(tmp_path):
+    data = Box(b'ftyp', b'isom\x00\x00\x02\x00').to_bytes() + struct.pack('>I4sQ', 1, b'moov', 2 ** 40)
+    assert probe_bytes(tmp_path, 'mp4', data + bytes(64)) is None
+
+
+class CountingReader(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+# SOF 之前的元数据段在缓冲区内按段长度跳过，不逐字节读取文件；SOF 超出扫描范围时放弃
+def test_jpeg_skips_segments_in_buffer(tmp_path):
+    exif = b'\xff\xe1' + struct.pack('>H', 65535) + bytes(65533)
+    data = jpeg()
+    data = data[:2] + exif * 3 + data[2:]
+    reader = CountingReader(data)
+    assert media_probe._probe_jpeg(reader, len(data)) == {'format': 'jpeg', 'width': 320, 'height': 240}
+    assert reader.reads == 1
+
+    data = jpeg()
+    data = data[:2] + exif * (media_probe.JPEG_SCAN_SIZE // len(exif) + 1) + data[2:]
+    assert probe_bytes(tmp_path, 'jpg', data) is None
@@ -0,0 +1,67 @@
+import re
+
+import pytest
+
+from metrics import CONTENT_TYPE, Registry
+
+
+def sample_lines(text, name):
+    return [line for line in text.splitlines() if line.startswith(name)]
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    counter = registry.counter('requests_total', '请求数', ('path',))
+    counter.labels('a"b\\c\nd').inc(2)
+    text = registry.render()
+    assert '# HELP requests_total 请求数' in text
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{path="a\\"b\\\\c\\nd"} 2' in text.splitlines()
+
+
+# 分桶计数是累计的，上界包含边界值，最后一个分桶为 +Inf 且等于 _count
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram('latency_seconds', '耗时', ('route',), buckets=(1, 0.01, 10))
+    child = histogram.labels('/files')
+    for value in (0.003, 1, 0.5, 100):
+        child.observe(value)
+
+    assert sample_lines(registry.render(), 'latency_seconds') == [
+        'latency_seconds_bucket{route="/files",le="0.01"} 1',
+        'latency_seconds_bucket{route="/files",le="1"} 3',
+        'latency_seconds_bucket{route="/files",le="10"} 3',
+        'latency_seconds_bucket{route="/files",le="+Inf"} 4',
+        'latency_seconds_sum{route="/files"} 101.503',
+        'latency_seconds_count{route="/files"} 4',
+    ]
+
+
+def test_gauge_callback_and_duplicate_names():
+    registry = Registry()
+    registry.gauge('files_total', '文件数', callback=lambda: 7)
+    assert 'files_total 7' in registry.render().splitlines()
+    with pytest.raises(ValueError):
+        registry.counter('files_total', '重复')
+    with pytest.raises(ValueError):
+        registry.counter('labelled_total', '', ('route',)).labels()
+
+
+# 请求按路由模板（而不是实际路径）计数，响应字节数按 Content-Length 累加
+def test_metrics_endpoint_counts_route_templates(client, upload):
+    filename = upload('metrics.zip', b'x' * 1000)
+    for _ in range(2):
+        with client.get(f'/files/{filename}') as response:
+            response.get_data()
+
+    response = client.get('/metrics')
+    assert response.headers['Content-Type'] == CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert filename not in text
+    count = re.search(r'^http_requests_total\{route="/files/<filename>",method="GET",status="200"\} (\d+)$',
+                      text, re.M)
+    assert count and int(count.group(1)) >= 2
+    assert re.search(r'^http_request_duration_seconds_bucket\{route="/files/<filename>",method="GET",'
+                     r'status="200",le="\+Inf"\} \d+$', text, re.M)
+    assert re.search(r'^http_response_bytes_total\{route="/files/<filename>"\} \d+$', text, re.M)
+    assert re.search(r'^downloads_in_flight \d+$', text, re.M)
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from profiling import PROFILE_HEADER, Profiler
+
+
+@pytest.fixture
+def profiler(server, monkeypatch):
+    monkeypatch.setattr(server.profiler, 'sample_rate', 0.0)
+    monkeypatch.setattr(server.profiler, 'token', '')
+    monkeypatch.setattr(server.profiler, 'dump_dir', '')
+    return server.profiler
+
+
+def server_timing(client, **headers):
+    return client.get('/api/files', headers=headers).headers.get('Server-Timing')
+
+
+def test_no_server_timing_by_default(client, profiler):
+    assert server_timing(client) is None
+    assert server_timing(client, **{PROFILE_HEADER: 'anything'}) is None
+
+
+# 配置了令牌时只有请求头与之相同的请求被剖析
+def test_server_timing_with_token(client, profiler, monkeypatch):
+    monkeypatch.setattr(profiler, 'token', 'secret')
+    assert server_timing(client) is None
+    assert server_timing(client, **{PROFILE_HEADER: 'wrong'}) is None
+
+    timing = server_timing(client, **{PROFILE_HEADER: 'secret'})
+    phases = [entry.split(';')[0] for entry in timing.split(', ')]
+    assert 'query' in phases
+    assert phases[-1] == 'total'
+
+
+def test_server_timing_with_sample_rate(client, profiler, monkeypatch):
+    monkeypatch.setattr(profiler, 'sample_rate', 1.0)
+    for _ in range(3):
+        assert 'total;dur=' in server_timing(client)
+
+
+# 输出目录中只保留最近 max_dumps 次剖析的 .prof 与 .folded，其他文件不受影响
+def test_dumps_are_pruned(tmp_path):
+    profiler = Profiler(token='t', dump_dir=str(tmp_path), max_dumps=3)
+    (tmp_path / 'notes.txt').write_text('keep')
+    paths = []
+    for i in range(5):
+        profile = profiler.begin()
+        paths.append(profiler.finish(profile, f'/route/{i}'))
+
+    remaining = sorted(os.listdir(tmp_path))
+    stems = sorted({os.path.splitext(name)[0] for name in remaining if name != 'notes.txt'})
+    assert stems == sorted(os.path.basename(path) for path in paths[-3:])
+    assert 'notes.txt' in remaining
+    for stem in stems:
+        assert f'{stem}.folded' in remaining
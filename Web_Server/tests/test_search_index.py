@@ -0,0 +1,37 @@
+import os
+import threading
+
+from search_index import SCHEMA, SearchIndex
+
+
+def make_index(tmp_path, names):
+    files = tmp_path / 'files'
+    files.mkdir()
+    records = []
+    for name in names:
+        path = files / name
+        path.write_text(f'content of {name}')
+        stat = os.stat(path)
+        records.append({'filename': name, 'original_name': name, 'type': 'document',
+                        'size': stat.st_size, 'mtime': stat.st_mtime})
+    index = SearchIndex(str(tmp_path / 'search.db'), lambda name: str(files / name), lambda: records,
+                        sync_interval=0)
+    index._connect().executescript(SCHEMA)
+    return index, records
+
+
+# 对账时跳过仍在队列中的文件，pending 不随对账次数增长
+def test_sync_skips_queued_records(tmp_path):
+    index, records = make_index(tmp_path, ['a.txt', 'b.txt'])
+    release = threading.Event()
+    index._get_executor().submit(release.wait)
+    try:
+        assert index.sync(records) == (2, 0)
+        assert index.sync(records) == (0, 0)
+        assert index.pending == 2
+    finally:
+        release.set()
+    index._get_executor().submit(lambda: None).result()
+    assert index.pending == 0
+    assert index.sync(records) == (0, 0)
+    assert index.search('content')[0] == 2
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import server_runner
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = '''
+import os, threading
+import video_server
+print(threading.active_count(), sorted(os.listdir(os.environ['VIDEO_DIR'])))
+'''
+
+
+# gunicorn 主进程导入应用时不启动后台线程，也不打开或创建数据库（fork 出的工作进程不会继承它们）
+def test_import_starts_no_services(tmp_path):
+    env = dict(os.environ, VIDEO_DIR=str(tmp_path))
+    result = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=SERVER_DIR, env=env,
+                            capture_output=True, text=True, timeout=60, check=True)
+    assert result.stdout.split('\n')[-2] == '1 []'
+
+
+def test_gunicorn_options_call_post_fork():
+    args = server_runner.parse_args(['--server', 'gunicorn', '--workers', '4'])
+    calls = []
+    options = server_runner.gunicorn_options(args, post_fork=lambda: calls.append(os.getpid()))
+    assert options['workers'] == 4
+    assert options['threads'] == args.threads
+    options['post_fork'](object(), object())
+    assert calls == [os.getpid()]
+    assert 'post_fork' not in server_runner.gunicorn_options(args)
+
+
+# 每个进程只启动一次；在其他进程中（例如 fork 出的工作进程）再次调用时重新启动
+def test_start_services_once_per_process(server, client, monkeypatch):
+    assert server.services_pid == os.getpid()
+    started = []
+    monkeypatch.setattr(server.thumbnail_service, 'start', lambda: started.append('thumbs'))
+    server.start_services()
+    assert started == []
+
+    monkeypatch.setattr(server, 'services_pid', None)
+    for name in ('blob_store', 'file_index', 'upload_sessions', 'compression_cache', 'search_index'):
+        monkeypatch.setattr(getattr(server, name), 'start', lambda: None)
+    for name in ('media_prober', 'storage_migrator'):
+        monkeypatch.setattr(getattr(server, name), 'start_background', lambda: None)
+    assert client.get('/api/files').status_code == 200
+    assert started == ['thumbs']
+    assert server.services_pid == os.getpid()
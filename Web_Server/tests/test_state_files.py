@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+STATE_FILES = ['.catalog.db', '.blobs.db', '.search.db', '.bandwidth.json']
+
+
+@pytest.fixture
+def state_files(server, client):
+    # .bandwidth.json 在修改带宽配置后才会创建
+    assert client.put('/api/bandwidth', json={}).status_code == 200
+    paths = {name: os.path.join(server.VIDEO_DIR, name) for name in STATE_FILES}
+    for path in paths.values():
+        assert os.path.isfile(path)
+    return paths
+
+
+# 服务状态文件不能通过删除接口删除
+def test_delete_rejects_state_files(client, state_files):
+    for name, path in state_files.items():
+        assert client.delete(f'/api/files/{name}').status_code == 404
+        assert os.path.isfile(path)
+
+
+# 下载、剪辑、HLS、缩略图等单文件接口同样不能读取服务状态文件
+@pytest.mark.parametrize('template', [
+    '/files/{}', '/videos/{}', '/files/{}/clip', '/hls/{}/index.m3u8', '/hls/{}/media.mp4', '/thumbs/128/{}',
+])
+def test_read_routes_reject_state_files(client, state_files, template):
+    for name in state_files:
+        response = client.get(template.format(name))
+        assert 400 <= response.status_code < 500
+        response.close()
@@ -0,0 +1,53 @@
+import errno
+import os
+
+import storage_layout
+from storage_layout import StorageLayout, StorageMigrator
+
+
+def flat_file(layout, name='a.txt'):
+    path = layout.flat_path(name)
+    with open(path, 'wb') as f:
+        f.write(b'data')
+    return name
+
+
+def test_run_moves_flat_files(tmp_path):
+    layout = StorageLayout(str(tmp_path))
+    name = flat_file(layout)
+    assert StorageMigrator(layout, grace_period=0).run() == 1
+    assert os.path.exists(layout.sharded_path(name))
+    assert not os.path.exists(layout.flat_path(name))
+
+
+# 无法创建分片目录时文件留在原位置，下次迁移重试
+def test_link_keeps_file_when_shard_directory_fails(tmp_path):
+    layout = StorageLayout(str(tmp_path))
+    name = flat_file(layout)
+    shard_dir = os.path.dirname(layout.sharded_path(name))
+    os.makedirs(os.path.dirname(shard_dir))
+    open(shard_dir, 'w').close()
+
+    assert StorageMigrator(layout)._link(name) is False
+    assert os.path.exists(layout.flat_path(name))
+
+
+# 不支持硬链接时重命名；重命名也失败时返回 False 而不是抛出异常
+def test_link_falls_back_to_rename(tmp_path, monkeypatch):
+    layout = StorageLayout(str(tmp_path))
+    name = flat_file(layout)
+
+    def unsupported(src, dst):
+        raise OSError(errno.EPERM, 'unsupported')
+    monkeypatch.setattr(storage_layout.os, 'link', unsupported)
+    migrator = StorageMigrator(layout)
+    assert migrator._link(name) is True
+    assert os.path.exists(layout.sharded_path(name))
+
+    other = flat_file(layout, 'b.txt')
+
+    def failing(src, dst):
+        raise OSError(errno.EIO, 'io error')
+    monkeypatch.setattr(storage_layout.os, 'replace', failing)
+    assert migrator._link(other) is False
+    assert os.path.exists(layout.flat_path(other))
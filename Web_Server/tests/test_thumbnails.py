@@ -0,0 +1,85 @@
+import io
+import os
+
+import pytest
+
+import thumbnails
+
+PNG_NAME = 'photo.png'
+
+
+# 不依赖 Pillow：启用缩略图服务并以假的生成函数代替 Pillow，每个尺寸写入可区分的内容
+@pytest.fixture
+def fake_render(server, monkeypatch):
+    calls = []
+
+    def render(source, targets):
+        calls.append(source)
+        for size, target in targets:
+            with open(target, 'wb') as f:
+                f.write(f'thumb-{size}'.encode())
+    monkeypatch.setattr(server.thumbnail_service, 'enabled', True)
+    monkeypatch.setattr(thumbnails, 'render_thumbnails', render)
+    for size in thumbnails.THUMBNAIL_SIZES:
+        os.makedirs(os.path.join(server.THUMB_DIR, str(size)), exist_ok=True)
+    return calls
+
+
+def test_thumbnail_is_generated_and_cached(server, client, upload, fake_render):
+    filename = upload(PNG_NAME, b'not really a png')
+    with client.get(f'/thumbs/256/{filename}') as response:
+        assert response.status_code == 200
+        assert response.get_data() == b'thumb-256'
+    assert response.mimetype == 'image/jpeg'
+
+    renders = len(fake_render)
+    with client.get(f'/thumbs/128/{filename}') as response:
+        assert response.get_data() == b'thumb-128'
+    assert len(fake_render) == renders
+
+
+@pytest.mark.parametrize('path', ['/thumbs/128/{filename}', '/thumbs/100/{image}'])
+def test_unsupported_requests_are_404(client, upload, fake_render, path):
+    filename = upload('notes.txt', b'text')
+    image = upload(PNG_NAME, b'image')
+    assert client.get(path.format(filename=filename, image=image)).status_code == 404
+
+
+def test_render_failure_is_415(server, client, upload, fake_render, monkeypatch):
+    def broken(source, targets):
+        raise OSError('cannot identify image file')
+    monkeypatch.setattr(thumbnails, 'render_thumbnails', broken)
+    filename = upload('broken.png', b'garbage')
+    server.thumbnail_service.remove(filename)
+    assert client.get(f'/thumbs/128/{filename}').status_code == 415
+
+
+# 删除原图时删除缓存的缩略图，之后的请求返回 404
+def test_delete_invalidates_thumbnails(server, client, upload, fake_render):
+    filename = upload(PNG_NAME, b'image')
+    assert client.get(f'/thumbs/512/{filename}').status_code == 200
+    paths = [server.thumbnail_service.thumb_path(filename, size) for size in thumbnails.THUMBNAIL_SIZES]
+    assert all(os.path.exists(path) for path in paths)
+
+    assert client.delete(f'/api/files/{filename}').status_code == 200
+    assert not any(os.path.exists(path) for path in paths)
+    assert client.get(f'/thumbs/512/{filename}').status_code == 404
+
+
+def test_disabled_without_pillow(server, client, upload, monkeypatch):
+    monkeypatch.setattr(server.thumbnail_service, 'enabled', False)
+    filename = upload(PNG_NAME, b'image')
+    assert server.thumbnail_service.urls(filename) is None
+    assert client.get(f'/thumbs/128/{filename}').status_code == 404
+
+
+@pytest.mark.skipif(thumbnails.Image is None, reason='需要 Pillow')
+def test_real_thumbnail(client, upload):
+    image = io.BytesIO()
+    thumbnails.Image.new('RGB', (1024, 512), (200, 30, 30)).save(image, 'PNG')
+    filename = upload(PNG_NAME, image.getvalue())
+    with client.get(f'/thumbs/128/{filename}') as response:
+        assert response.status_code == 200
+        thumb = thumbnails.Image.open(io.BytesIO(response.get_data()))
+    assert thumb.format == 'JPEG'
+    assert thumb.size == (128, 64)
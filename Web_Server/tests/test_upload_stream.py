@@ -0,0 +1,94 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+import upload_stream
+from upload_stream import UploadError, receive_multipart_file
+
+BOUNDARY = 'test-boundary'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+
+
+# 按顺序拼接表单字段；filename 为 None 的是普通字段
+def multipart_body(*fields):
+    parts = []
+    for name, filename, data in fields:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n'.encode() + data + b'\r\n')
+    return b''.join(parts) + f'--{BOUNDARY}--\r\n'.encode()
+
+
+def leftover_temp_files(directory):
+    return [name for name in os.listdir(directory) if name.startswith('.upload-')]
+
+
+# 文件内容跨越多个读取块时逐块写入临时文件，其他字段被跳过
+@pytest.mark.parametrize('chunk_size', [7, 64, upload_stream.CHUNK_SIZE])
+def test_receive_writes_temp_file_with_size_and_hash(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(upload_stream, 'CHUNK_SIZE', chunk_size)
+    data = os.urandom(1000) + b'\r\n--not-a-boundary\r\n' + os.urandom(500)
+    body = multipart_body(('note', None, b'hello'), ('file', 'movie.mp4', data), ('other', 'x.txt', b'ignored'))
+    timings = {}
+
+    result = receive_multipart_file(io.BytesIO(body), CONTENT_TYPE, str(tmp_path), timings=timings)
+    assert result['filename'] == 'movie.mp4'
+    assert result['size'] == len(data)
+    assert result['sha256'] == hashlib.sha256(data).hexdigest()
+    assert os.path.dirname(result['temp_path']) == str(tmp_path)
+    with open(result['temp_path'], 'rb') as f:
+        assert f.read() == data
+    assert set(timings) == {'read', 'write', 'hash'}
+
+
+@pytest.mark.parametrize('content_type, body, message', [
+    ('application/octet-stream', b'data', '请求必须为 multipart/form-data 格式'),
+    (CONTENT_TYPE, multipart_body(('note', None, b'hello')), '没有选择文件'),
+    (CONTENT_TYPE, multipart_body(('file', '', b'data')), '文件名不能为空'),
+])
+def test_receive_rejects_bad_requests(tmp_path, content_type, body, message):
+    with pytest.raises(UploadError) as excinfo:
+        receive_multipart_file(io.BytesIO(body), content_type, str(tmp_path))
+    assert excinfo.value.message == message
+    assert excinfo.value.status_code == 400
+    assert leftover_temp_files(tmp_path) == []
+
+
+# validate 在写入数据前调用，拒绝时不创建临时文件
+def test_receive_validate_rejects_before_writing(tmp_path):
+    def validate(filename):
+        assert leftover_temp_files(tmp_path) == []
+        raise UploadError('不支持的文件类型')
+
+    with pytest.raises(UploadError, match='不支持的文件类型'):
+        receive_multipart_file(io.BytesIO(multipart_body(('file', 'a.exe', b'data'))), CONTENT_TYPE,
+                               str(tmp_path), validate=validate)
+    assert leftover_temp_files(tmp_path) == []
+
+
+def test_upload_endpoint(server, client):
+    data = b'streamed upload\n' * 100
+    response = client.post('/upload', data=multipart_body(('file', 'streamed.txt', data)), content_type=CONTENT_TYPE)
+    assert response.status_code == 200
+    filename = response.get_json()['filename']
+    assert filename.endswith('_streamed.txt')
+    with client.get(f'/files/{filename}', headers={'Accept-Encoding': 'identity'}) as download:
+        assert download.get_data() == data
+    assert server.file_index.get(filename)['size'] == len(data)
+
+
+# 请求体在文件内容中途截断时解析器报错，已写入的临时文件被删除
+@pytest.mark.parametrize('name, content_type, truncate', [
+    ('blocked.exe', CONTENT_TYPE, None),
+    ('plain.txt', 'text/plain', None),
+    ('truncated.txt', CONTENT_TYPE, 200),
+])
+def test_upload_endpoint_rejects(server, client, name, content_type, truncate):
+    body = multipart_body(('file', name, b'data' * 100))[:truncate]
+    response = client.post('/upload', data=body, content_type=content_type)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert leftover_temp_files(server.VIDEO_DIR) == []
@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# 生成缩略图的图片扩展名与尺寸（最长边像素）
+THUMBNAIL_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'gif', 'bmp'}
+THUMBNAIL_SIZES = (128, 256, 512)
+THUMBNAIL_QUALITY = 85
+# 防止超大图片（解压炸弹）耗尽工作进程内存
+MAX_IMAGE_PIXELS = 100 * 1000 * 1000
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def is_thumbnailable(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in THUMBNAIL_EXTENSIONS
+
+
+# 在工作进程中执行：打开一次原图，按尺寸从大到小依次缩放并保存为 JPEG
+def render_thumbnails(source, targets):
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    with Image.open(source) as image:
+        # 大图 JPEG 解码时直接按比例缩小，减少解码开销
+        image.draft('RGB', (max(size for size, _ in targets),) * 2)
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        for size, target in sorted(targets, reverse=True):
+            image.thumbnail((size, size), Image.LANCZOS)
+            temp_path = f'{target}.{os.getpid()}.tmp'
+            image.save(temp_path, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+            os.replace(temp_path, target)
+
+
+# 缩略图缓存：在进程池中生成，保存在 cache_dir/<尺寸>/<文件名>.jpg；source_path(filename) 返回原图路径
+class ThumbnailService:
+    def __init__(self, cache_dir, source_path, max_workers=None, timeout=30):
+        self.cache_dir = cache_dir
+        self.source_path = source_path
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.timeout = timeout
+        self.enabled = Image is not None
+        self._executor = None
+        self._executor_pid = None
+        # 文件名 -> 正在生成的 Future
+        self._pending = {}
+        # 无法解码的图片，不再重复尝试
+        self._failed = set()
+        # 任务已完成时 add_done_callback 会在持锁的线程中立即回调，需要可重入锁
+        self._lock = threading.RLock()
+
+    # 每个进程在启动任何线程之前调用一次（生产模式下在工作进程的 post_fork 中调用）
+    def start(self):
+        if not self.enabled:
+            print(f"⚠️ 未安装 Pillow，已关闭缩略图生成")
+            return
+        for size in THUMBNAIL_SIZES:
+            os.makedirs(os.path.join(self.cache_dir, str(size)), exist_ok=True)
+        self._start_pool()
+
+    def thumb_path(self, filename, size):
+        return os.path.join(self.cache_dir, str(size), f'{filename}.jpg')
+
+    def urls(self, filename):
+        if not self.enabled or not is_thumbnailable(filename):
+            return None
+        return {str(size): f'/thumbs/{size}/{filename}' for size in THUMBNAIL_SIZES}
+
+    # 进程池按进程创建，使用 fork 启动子进程（spawn/forkserver 会在子进程中重新导入主模块，重复执行服务初始化）。
+    # 多线程进程中 fork 出的子进程可能继承被其他线程持有的锁，因此进程池只在启动任何线程之前创建，
+    # 并立即启动全部子进程，之后提交任务不再 fork
+    def _start_pool(self):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            return
+        executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('fork'))
+        executor.submit(os.getpid)
+        self._executor = executor
+        self._executor_pid = os.getpid()
+
+    # 当前进程没有进程池（不支持 fork 的平台，或未在启动线程之前创建）时使用线程池
+    def _get_executor(self):
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='thumbnail')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _submit(self, source, targets):
+        try:
+            return self._get_executor().submit(render_thumbnails, source, targets)
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可用，此时已不能安全地重新 fork，改用线程池
+            print(f"⚠️ 缩略图进程池已损坏，改用线程池")
+            self._executor = None
+            return self._get_executor().submit(render_thumbnails, source, targets)
+
+    def _is_fresh(self, filename, size, source_mtime):
+        try:
+            return os.path.getmtime(self.thumb_path(filename, size)) >= source_mtime
+        except OSError:
+            return False
+
+    # 安排生成所有尺寸的缩略图，返回 Future；已有生成任务时复用
+    def schedule(self, filename):
+        if not self.enabled or not is_thumbnailable(filename):
+            return None
+        source = self.source_path(filename)
+        targets = [(size, self.thumb_path(filename, size)) for size in THUMBNAIL_SIZES]
+        with self._lock:
+            if filename in self._failed:
+                return None
+            future = self._pending.get(filename)
+            if future is None:
+                future = self._submit(source, targets)
+                self._pending[filename] = future
+                future.add_done_callback(lambda f: self._finish(filename, f))
+        return future
+
+    def _finish(self, filename, future):
+        with self._lock:
+            if self._pending.get(filename) is future:
+                del self._pending[filename]
+            if not future.cancelled() and future.exception() is not None:
+                self._failed.add(filename)
+                print(f"⚠️ 生成缩略图失败 {filename}: {future.exception()}")
+
+    # 返回指定尺寸的缩略图路径，缓存不存在或已过期时等待生成（最多 timeout 秒）
+    def get(self, filename, size):
+        source_mtime = os.path.getmtime(self.source_path(filename))
+        if self._is_fresh(filename, size, source_mtime):
+            return self.thumb_path(filename, size)
+
+        future = self.schedule(filename)
+        if future is None:
+            raise ThumbnailError('无法生成缩略图')
+        try:
+            future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise
+        except Exception as e:
+            raise ThumbnailError(f'无法生成缩略图: {e}')
+        return self.thumb_path(filename, size)
+
+    def remove(self, filename):
+        with self._lock:
+            self._failed.discard(filename)
+        for size in THUMBNAIL_SIZES:
+            try:
+                os.remove(self.thumb_path(filename, size))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NEED_DATA
+
+# 每次从请求体读取的块大小；解析器缓冲区不超过一个块，其他表单字段的内容直接丢弃
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+# 创建上传目录内的隐藏临时文件（与目标文件同一文件系统，可原子重命名）
+def create_temp_file(directory, prefix='.upload-'):
+    fd, temp_path = tempfile.mkstemp(prefix=prefix, suffix='.part', dir=directory)
+    return os.fdopen(fd, 'wb'), temp_path
+
+
+# 流式解析 multipart/form-data 请求体，把指定字段的文件内容直接写入 directory 内的临时文件，
+# 同时计算大小和 SHA-256，不经过 Werkzeug 的表单解析与二次拷贝。
+# validate(filename) 在收到文件头后、写入数据前调用，可抛出 UploadError 拒绝上传。
+# 返回 {'filename', 'temp_path', 'size', 'sha256'}，调用方负责把临时文件重命名到最终位置。
+# timings 为字典时累加各环节耗时（秒）：read（读取请求体）、write（写入临时文件）、hash（计算 SHA-256），
+# 其余为 multipart 解析；用于请求剖析，为 None 时不计时
+def receive_multipart_file(stream, content_type, directory, field_name='file', validate=None, timings=None):
+    mimetype, options = parse_options_header(content_type or '')
+    boundary = options.get('boundary', '').encode('latin-1')
+    if mimetype != 'multipart/form-data' or not boundary:
+        raise UploadError('请求必须为 multipart/form-data 格式')
+
+    decoder = MultipartDecoder(boundary)
+    output = None
+    temp_path = None
+    result = None
+    writing = False
+    hasher = hashlib.sha256()
+    size = 0
+    if timings is not None:
+        for key in ('read', 'write', 'hash'):
+            timings.setdefault(key, 0.0)
+
+    try:
+        finished = False
+        while not finished:
+            if timings is None:
+                chunk = stream.read(CHUNK_SIZE)
+            else:
+                start = time.perf_counter()
+                chunk = stream.read(CHUNK_SIZE)
+                timings['read'] += time.perf_counter() - start
+            decoder.receive_data(chunk or None)
+
+            event = decoder.next_event()
+            while event is not NEED_DATA:
+                if isinstance(event, Epilogue):
+                    finished = True
+                    break
+
+                if isinstance(event, File):
+                    writing = event.name == field_name and result is None and output is None
+                    if writing:
+                        if event.filename == '':
+                            raise UploadError('文件名不能为空')
+                        if validate is not None:
+                            validate(event.filename)
+                        output, temp_path = create_temp_file(directory)
+                        result = {'filename': event.filename}
+                elif isinstance(event, Data):
+                    if writing:
+                        if timings is None:
+                            output.write(event.data)
+                            hasher.update(event.data)
+                        else:
+                            start = time.perf_counter()
+                            output.write(event.data)
+                            written = time.perf_counter()
+                            hasher.update(event.data)
+                            timings['write'] += written - start
+                            timings['hash'] += time.perf_counter() - written
+                        size += len(event.data)
+                        if not event.more_data:
+                            output.close()
+                            writing = False
+                else:
+                    writing = False
+
+                event = decoder.next_event()
+
+            if not chunk and not finished:
+                raise UploadError('请求体不完整')
+
+        if result is None:
+            raise UploadError('没有选择文件')
+        if writing or not output.closed:
+            raise UploadError('请求体不完整')
+    except BaseException:
+        if output is not None:
+            output.close()
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    result.update({'temp_path': temp_path, 'size': size, 'sha256': hasher.hexdigest()})
+    return result
@@ -1,14 +1,45 @@
-from flask import Flask, send_file, jsonify, abort, request, render_template_string
+from flask import Flask, Response, jsonify, abort, has_request_context, request, render_template_string
+import contextlib
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+import functools
+import mimetypes
 import os
+import re
+import threading
+import time
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import ClosingIterator
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
+from file_index import FileIndex, UNIQUE_NAME_PATTERN
+from file_catalog import FileCatalog
+from upload_stream import UploadError, receive_multipart_file
+from chunked_upload import UploadSessionManager
+from blob_store import BlobStore
+from storage_layout import StorageLayout, StorageMigrator
+from file_sender import send_file_response, send_pieces_response, send_virtual_response, make_etag, content_disposition, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+from compression import CompressionCache, compress_bytes, gzip_stream, is_compressible
+from media_probe import MediaProbeWorker
+from mp4_tools import FaststartWorker, Mp4Error, build_clip, is_mp4, moov_after_mdat
+from hls import load_plan
+from zip_stream import ZipArchive, unique_arcnames
+from search_index import SearchIndex
+from metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from profiling import Profiler, PROFILE_HEADER
+from bandwidth import BandwidthScheduler, ShapedBody, DEFAULT_CONFIG as DEFAULT_BANDWIDTH_CONFIG
+from thumbnails import ThumbnailService, ThumbnailError, THUMBNAIL_SIZES
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import server_runner
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB
 
-# 文件目录
-VIDEO_DIR = r'./files'
+# 文件目录（可通过环境变量 VIDEO_DIR 修改）
+VIDEO_DIR = os.environ.get('VIDEO_DIR', r'./files')
 
 # 支持的文件类型
 FILE_TYPES = {
@@ -59,6 +90,323 @@ def get_file_type(filename):
             return type_name
     return '其他文件'
 
+# 运行指标（/metrics，Prometheus 文本格式）：按路由和状态码统计请求数与耗时（从收到请求到响应发送完毕），
+# 上传/下载字节数（按 Content-Length），进行中的上传与下载数，目录扫描耗时
+metrics_registry = Registry()
+http_requests_total = metrics_registry.counter(
+    'http_requests_total', '请求数', ('route', 'method', 'status'))
+http_request_duration = metrics_registry.histogram(
+    'http_request_duration_seconds', '请求耗时（秒，含响应发送时间）', ('route', 'method', 'status'))
+http_request_bytes_total = metrics_registry.counter(
+    'http_request_bytes_total', '接收的请求体字节数', ('route',))
+http_response_bytes_total = metrics_registry.counter(
+    'http_response_bytes_total', '发送的响应体字节数（按 Content-Length）', ('route',))
+uploads_in_flight = metrics_registry.gauge('uploads_in_flight', '进行中的上传请求数')
+downloads_in_flight = metrics_registry.gauge('downloads_in_flight', '进行中的下载请求数')
+storage_scan_duration = metrics_registry.histogram(
+    'storage_scan_duration_seconds', '文件目录扫描耗时（秒）',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+storage_scan_files = metrics_registry.gauge('storage_scan_files', '最近一次目录扫描的文件数')
+
+def record_storage_scan(seconds, file_count):
+    storage_scan_duration.observe(seconds)
+    storage_scan_files.set(file_count)
+
+# 用户文件的目录布局：默认按文件名哈希分为两级子目录（VIDEO_DIR/ab/cd/<文件名>），URL 不变；
+# 环境变量 STORAGE_LAYOUT=flat 时新文件直接保存在 VIDEO_DIR 下。
+# 旧版本平铺保存的文件照常可以访问，并在后台迁移到分片目录（也可用 python storage_layout.py 离线迁移）
+os.makedirs(VIDEO_DIR, exist_ok=True)
+STORAGE_LAYOUT = os.environ.get('STORAGE_LAYOUT', 'sharded')
+storage = StorageLayout(VIDEO_DIR, sharded=STORAGE_LAYOUT != 'flat', on_scan=record_storage_scan)
+
+# 图片缩略图（VIDEO_DIR/.thumbs，需要 Pillow），上传后在进程池中生成
+THUMB_DIR = os.path.join(VIDEO_DIR, '.thumbs')
+thumbnail_service = ThumbnailService(THUMB_DIR, storage.path)
+
+# 内容寻址的去重存储（VIDEO_DIR/.blobs），用户文件为指向其中内容的硬链接；
+# 内容的大小与 inode 记录在 VIDEO_DIR/.blobs.db 中，各工作进程共享，启动时与磁盘对账
+BLOB_DIR = os.path.join(VIDEO_DIR, '.blobs')
+BLOB_DB_PATH = os.path.join(VIDEO_DIR, '.blobs.db')
+blob_store = BlobStore(BLOB_DIR, BLOB_DB_PATH)
+
+# 文件元数据目录：默认为 SQLite 数据库（VIDEO_DIR/.catalog.db，WAL 模式，各工作进程共享，不存在时从磁盘重建），
+# 上传/删除时在事务中更新，后台定期与磁盘对账。环境变量 FILE_CATALOG=memory 时使用进程内索引（启动时扫描目录构建）
+INDEX_RECONCILE_INTERVAL = int(os.environ.get('INDEX_RECONCILE_INTERVAL', 300))
+FILE_CATALOG = os.environ.get('FILE_CATALOG', 'sqlite')
+CATALOG_DB_PATH = os.path.join(VIDEO_DIR, '.catalog.db')
+if FILE_CATALOG == 'memory':
+    file_index = FileIndex(storage, get_file_type, reconcile_interval=INDEX_RECONCILE_INTERVAL,
+                           content_id=blob_store.content_id)
+else:
+    file_index = FileCatalog(CATALOG_DB_PATH, storage, get_file_type, reconcile_interval=INDEX_RECONCILE_INTERVAL,
+                             content_id=blob_store.content_id)
+
+# 分块上传会话（数据保存在 VIDEO_DIR/.sessions，超时未更新的会话自动清理）
+UPLOAD_SESSION_DIR = os.path.join(VIDEO_DIR, '.sessions')
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))
+upload_sessions = UploadSessionManager(UPLOAD_SESSION_DIR, app.config['MAX_CONTENT_LENGTH'],
+                                       session_ttl=UPLOAD_SESSION_TTL)
+
+# 文本类文件的预压缩版本（VIDEO_DIR/.compressed），上传后在后台线程中生成
+COMPRESSED_DIR = os.path.join(VIDEO_DIR, '.compressed')
+compression_cache = CompressionCache(COMPRESSED_DIR, storage.path)
+
+# 全文搜索索引（VIDEO_DIR/.search.db，SQLite FTS5）：原文件名和文本类文件内容，上传后在后台线程中建立，
+# 删除时同步删除，并定期与文件目录对账
+SEARCH_DB_PATH = os.path.join(VIDEO_DIR, '.search.db')
+search_index = SearchIndex(SEARCH_DB_PATH, storage.path, file_index.list_records,
+                           sync_interval=INDEX_RECONCILE_INTERVAL)
+
+# 替换、删除用户文件或迁移存储布局时持有，避免后台重写、删除与迁移交错（例如删除后又被重写任务放回）
+file_replace_lock = threading.Lock()
+
+# moov 位于文件末尾的 MP4/MOV 上传后立即以原始内容发布，在后台重排为 moov 在前（faststart，不重新编码），
+# 完成后原子替换为重排结果（新的 SHA-256 即新的 ETag），预览无需先读取文件末尾。
+# 去重存储记录原始内容到重排结果的别名，相同文件再次上传或秒传时直接链接重排结果
+def replace_remuxed_file(filename, temp_path, sha256, original_stat):
+    file_path = storage.path(filename)
+    with file_replace_lock:
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return
+        # 重排期间文件被删除或替换时放弃
+        if (stat.st_ino, stat.st_mtime_ns) != (original_stat.st_ino, original_stat.st_mtime_ns):
+            return
+        old_sha256 = blob_store.content_id(stat)
+        link_path = temp_path
+        if blob_store.enabled:
+            link_path = temp_path + '.link'
+            alias = (old_sha256, stat.st_size) if old_sha256 else None
+            blob_store.store(temp_path, sha256, link_path, alias=alias)
+        try:
+            # 先更新索引再替换文件：打开的已是重排结果时，索引中的 SHA-256 一定与之一致
+            record = file_index.add(filename, sha256=sha256 if blob_store.enabled else None,
+                                    stat=os.stat(link_path))
+            os.replace(link_path, file_path)
+        finally:
+            if os.path.exists(link_path):
+                os.remove(link_path)
+        search_index.schedule(record)
+        if old_sha256:
+            blob_store.release(old_sha256)
+    print(f"🎞️ 已重排 MP4（moov 前置）: {filename}")
+
+faststart_worker = FaststartWorker(storage.path, VIDEO_DIR, replace_remuxed_file)
+
+# 启动扫描与对账发现的文件在后台探测媒体信息并批量写入索引，列表接口不打开文件
+media_prober = MediaProbeWorker(storage.path, file_index.unprobed, file_index.set_media_many,
+                                interval=INDEX_RECONCILE_INTERVAL)
+
+# 平铺目录中的旧文件迁移到分片目录（与替换/删除文件互斥）
+storage_migrator = StorageMigrator(storage, lock=file_replace_lock)
+
+# 请求剖析（默认关闭）：环境变量 PROFILE_SAMPLE_RATE 为随机剖析的请求比例（0~1），
+# PROFILE_TOKEN 非空时请求头 X-Profile 等于该值的请求也会被剖析；PROFILE_DIR 非空时保存 cProfile 数据与调用栈。
+# 被剖析的请求在 Server-Timing 响应头中返回上传、列表、下载等接口各阶段的耗时
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '')
+profiler = Profiler(PROFILE_SAMPLE_RATE, PROFILE_TOKEN, PROFILE_DIR)
+NO_PROFILE_PHASE = contextlib.nullcontext()
+
+def current_profile():
+    if not profiler.enabled or not has_request_context():
+        return None
+    return request.environ.get('profiling.profile')
+
+# 当前请求被剖析时记录该阶段的耗时，否则不做任何处理
+def profile_phase(name):
+    profile = current_profile()
+    return profile.phase(name) if profile is not None else NO_PROFILE_PHASE
+
+@app.before_request
+def start_profiling():
+    if profiler.enabled and profiler.should_profile(request.headers.get(PROFILE_HEADER)):
+        request.environ['profiling.profile'] = profiler.begin()
+
+# 在 JSON 压缩之前注册，因而在其之后执行，压缩耗时计入剖析结果
+@app.after_request
+def finish_profiling(response):
+    profile = current_profile()
+    if profile is not None:
+        profiler.finish(profile, request.endpoint or 'unmatched')
+        response.headers['Server-Timing'] = profile.server_timing()
+    return response
+
+# 下载带宽整形（默认关闭）：环境变量 BANDWIDTH_LIMIT、CLIENT_BANDWIDTH_LIMIT 为全局与每个客户端 IP 的限速
+# （字节/秒，可带 K/M/G 单位，如 50M），BANDWIDTH_INTERACTIVE_SIZE 以下的响应视为交互请求优先发送；
+# 大文件下载按权重公平分配带宽（在线预览 BANDWIDTH_PREVIEW_WEIGHT，普通下载 BANDWIDTH_BULK_WEIGHT）。
+# 运行时通过 /api/bandwidth 修改，保存在 VIDEO_DIR/.bandwidth.json（优先于环境变量，删除该文件恢复）
+BANDWIDTH_CONFIG_PATH = os.path.join(VIDEO_DIR, '.bandwidth.json')
+bandwidth_scheduler = BandwidthScheduler({
+    'global_limit': os.environ.get('BANDWIDTH_LIMIT', 0),
+    'client_limit': os.environ.get('CLIENT_BANDWIDTH_LIMIT', 0),
+    'interactive_size': os.environ.get('BANDWIDTH_INTERACTIVE_SIZE', DEFAULT_BANDWIDTH_CONFIG['interactive_size']),
+    'preview_weight': os.environ.get('BANDWIDTH_PREVIEW_WEIGHT', DEFAULT_BANDWIDTH_CONFIG['preview_weight']),
+    'bulk_weight': os.environ.get('BANDWIDTH_BULK_WEIGHT', DEFAULT_BANDWIDTH_CONFIG['bulk_weight'])
+}, config_path=BANDWIDTH_CONFIG_PATH)
+bandwidth_active_transfers = metrics_registry.gauge(
+    'bandwidth_active_transfers', '限速排队中的下载数', callback=lambda: bandwidth_scheduler.active_transfers)
+bandwidth_wait_seconds_total = metrics_registry.counter(
+    'bandwidth_wait_seconds_total', '下载因限速等待的总时间（秒）', ('kind',))
+bandwidth_shaped_bytes_total = metrics_registry.counter(
+    'bandwidth_shaped_bytes_total', '限速排队发送的字节数', ('kind',))
+
+def record_shaped_transfer(transfer):
+    bandwidth_wait_seconds_total.labels(transfer.kind).inc(transfer.waited)
+    bandwidth_shaped_bytes_total.labels(transfer.kind).inc(transfer.sent)
+
+# 在 JSON 压缩之前注册，因而在其之后执行，交互请求按压缩后的大小扣除令牌；
+# 指标记录已替换原响应体的 close，包装后的响应体关闭时仍会调用
+@app.after_request
+def shape_response(response):
+    bandwidth_scheduler.refresh()
+    if not bandwidth_scheduler.enabled or request.method == 'HEAD':
+        return response
+    current_request = request._get_current_object()
+    client = current_request.remote_addr or ''
+    length = response.content_length
+    if (current_request.endpoint in DOWNLOAD_ENDPOINTS and response.direct_passthrough
+            and response.status_code in (200, 206)
+            and (length is None or length > bandwidth_scheduler.config['interactive_size'])):
+        preview = (current_request.endpoint == 'hls_media'
+                   or current_request.args.get('inline') in ('1', 'true'))
+        transfer = bandwidth_scheduler.open(client, 'preview' if preview else 'bulk')
+        # 包装后服务器不再对 file_wrapper 使用 sendfile，按块读取后限速发送
+        response.response = ShapedBody(bandwidth_scheduler, transfer, response.response, length,
+                                       on_close=record_shaped_transfer)
+    elif length:
+        bandwidth_scheduler.charge(client, length)
+    return response
+
+# JSON 响应超过该大小时按 Accept-Encoding 压缩（文件列表等接口）
+JSON_COMPRESS_MIN_SIZE = 1024
+
+@app.after_request
+def compress_json_response(response):
+    if (response.mimetype != 'application/json' or response.status_code != 200
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < JSON_COMPRESS_MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+    with profile_phase('compress'):
+        encoding, compressed = compress_bytes(data, request.accept_encodings)
+    if encoding:
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# 请求指标：请求开始时计时并更新进行中数量，响应发送完毕（或客户端断开）时记录
+UPLOAD_ENDPOINTS = {'upload_file', 'upload_chunk'}
+DOWNLOAD_ENDPOINTS = {'download_file', 'download_video', 'clip_file', 'hls_media', 'download_archive'}
+
+metrics_registry.gauge('files_total', '文件总数', callback=lambda: file_index.stats(days=1)['total_files'])
+metrics_registry.gauge('files_size_bytes', '文件总大小（字节）', callback=lambda: file_index.stats(days=1)['total_size'])
+metrics_registry.gauge('search_index_pending', '等待建立搜索索引的文件数', callback=lambda: search_index.pending)
+
+def in_flight_gauge(endpoint):
+    if endpoint in UPLOAD_ENDPOINTS:
+        return uploads_in_flight
+    if endpoint in DOWNLOAD_ENDPOINTS:
+        return downloads_in_flight
+    return None
+
+# 下载路径上每个请求都会执行：只解析一次 request 代理，开始时间保存在 WSGI environ 中
+@app.before_request
+def start_request_metrics():
+    current_request = request._get_current_object()
+    current_request.environ['metrics.start'] = time.perf_counter()
+    gauge = in_flight_gauge(current_request.endpoint)
+    if gauge is not None:
+        gauge.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    current_request = request._get_current_object()
+    start = current_request.environ.get('metrics.start')
+    if start is None:
+        return response
+    rule = current_request.url_rule
+    route = rule.rule if rule is not None else 'unmatched'
+    method = current_request.method
+    gauge = in_flight_gauge(current_request.endpoint)
+    request_length = current_request.content_length
+    finished = []
+    
+    def finish():
+        if finished:
+            return
+        finished.append(True)
+        status = str(response.status_code)
+        http_requests_total.labels(route, method, status).inc()
+        http_request_duration.labels(route, method, status).observe(time.perf_counter() - start)
+        if request_length:
+            http_request_bytes_total.labels(route).inc(request_length)
+        # 在关闭时读取，此时已是压缩等处理后的最终响应头
+        response_length = response.headers.get('Content-Length')
+        if response_length and method != 'HEAD':
+            http_response_bytes_total.labels(route).inc(int(response_length))
+        if gauge is not None:
+            gauge.dec()
+    
+    response.call_on_close(finish)
+    # direct_passthrough 的响应体（sendfile 的 file_wrapper、分段读取迭代器）由服务器直接迭代并关闭，
+    # 不经过 call_on_close，在响应体的 close 中记录（不包装 file_wrapper，以免服务器无法使用 sendfile）；
+    # 生成器的 close 不能替换，包装为 ClosingIterator
+    body = response.response
+    if response.direct_passthrough and hasattr(body, 'close'):
+        close_body = body.close
+        
+        def close():
+            try:
+                close_body()
+            finally:
+                finish()
+        try:
+            body.close = close
+        except AttributeError:
+            response.response = ClosingIterator(body, finish)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+# 启动各服务：打开数据库、与磁盘对账、启动后台线程。导入模块时不启动任何服务，
+# 生产模式下 gunicorn 主进程只导入应用，由每个工作进程在 post_fork 中（尚未启动任何线程时）启动；
+# 开发服务器在开始监听前启动，以其他方式加载应用时在第一个请求之前启动。每个进程只启动一次，
+# 各工作进程的启动对账通过 VIDEO_DIR/.startup.lock 依次执行（第一个进程重建的数据库其他进程直接使用）
+STARTUP_LOCK_PATH = os.path.join(VIDEO_DIR, '.startup.lock')
+services_pid = None
+services_lock = threading.Lock()
+
+def start_services():
+    global services_pid
+    with services_lock:
+        if services_pid == os.getpid():
+            return
+        with open(STARTUP_LOCK_PATH, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # 缩略图进程池以 fork 创建，必须在其他服务启动后台线程之前创建
+            thumbnail_service.start()
+            blob_store.start()
+            file_index.start()
+            upload_sessions.start()
+            compression_cache.start()
+            search_index.start()
+        media_prober.start_background()
+        storage_migrator.start_background()
+        services_pid = os.getpid()
+
+@app.before_request
+def ensure_services_started():
+    if services_pid != os.getpid():
+        start_services()
+
 @app.route('/')
 def index():
     upload_page = '''
@@ -379,7 +727,7 @@ def index():
             
             .file-header {
                 display: grid;
-                grid-template-columns: 140px 1fr 100px 140px 90px 240px;
+                grid-template-columns: 24px 140px 1fr 100px 140px 90px 240px;
                 background: #f8f9fa;
                 padding: 15px;
                 font-weight: 600;
@@ -390,7 +738,7 @@ def index():
             
             .file-row {
                 display: grid;
-                grid-template-columns: 140px 1fr 100px 140px 90px 240px;
+                grid-template-columns: 24px 140px 1fr 100px 140px 90px 240px;
                 padding: 15px;
                 border-bottom: 1px solid #e9ecef;
                 background: white;
@@ -407,6 +755,22 @@ def index():
                 border-bottom: none;
             }
             
+            /* 选择列 */
+            .file-select-column {
+                display: flex;
+                align-items: center;
+            }
+            
+            /* 批量操作栏 */
+            .bulk-toolbar {
+                display: flex;
+                align-items: center;
+                gap: 10px;
+                margin-bottom: 12px;
+                color: #666;
+                font-size: 0.9rem;
+            }
+            
             /* 文件类型列 */
             .file-type-column {
                 display: flex;
@@ -436,6 +800,40 @@ def index():
                 word-break: break-all;
             }
             
+            .file-name-secondary {
+                color: #888;
+                font-size: 0.8rem;
+                margin-top: 2px;
+            }
+            
+            /* 搜索结果摘要 */
+            .file-snippet {
+                color: #555;
+                font-size: 0.8rem;
+                margin-top: 4px;
+                word-break: break-all;
+            }
+            
+            .file-snippet mark {
+                background: #fff3a0;
+                padding: 0 1px;
+            }
+            
+            /* 搜索栏 */
+            .search-bar {
+                display: flex;
+                gap: 10px;
+                margin-bottom: 15px;
+            }
+            
+            .search-input {
+                flex: 1;
+                padding: 8px 12px;
+                border: 1px solid #ddd;
+                border-radius: 6px;
+                font-size: 0.95rem;
+            }
+            
             /* 文件大小列 */
             .file-size-column {
                 font-weight: 500;
@@ -612,7 +1010,7 @@ def index():
             @media (max-width: 1200px) {
                 .file-header,
                 .file-row {
-                    grid-template-columns: 120px 1fr 90px 120px 80px 200px;
+                    grid-template-columns: 24px 120px 1fr 90px 120px 80px 200px;
                     gap: 10px;
                 }
                 
@@ -837,6 +1235,11 @@ def index():
                     📋 文件列表
                 </div>
                 <div class="card-body">
+                    <div class="search-bar">
+                        <input type="search" id="searchInput" class="search-input"
+                               placeholder="🔍 搜索文件名或文本内容（多个词用空格分隔）" oninput="onSearchInput(this.value)">
+                        <button class="action-btn" onclick="clearSearch()">清除</button>
+                    </div>
                     <div id="existingFiles">
                         <p style="text-align: center; color: #666; padding: 20px;">
                             正在加载文件列表...
@@ -870,9 +1273,36 @@ def index():
             
             let selectedFileTypes = new Set();
             let uploadQueue = [];
-            let allFiles = [];
+            let currentFiles = [];
+            let totalFiles = 0;
             let currentPage = 1;
+            let searchQuery = '';
+            let searchTimer = null;
             const filesPerPage = 10;
+            // 批量操作选中的文件（跨页保留）
+            let selectedFiles = new Set();
+            // 超过该长度的批量下载请求改用 POST 表单提交，避免 URL 过长
+            const ARCHIVE_MAX_URL_LENGTH = 2000;
+            
+            // 大于该大小的文件使用分块上传（并发上传、失败自动重试、可断点续传）
+            const CHUNKED_UPLOAD_THRESHOLD = 16 * 1024 * 1024;
+            const CHUNK_CONCURRENCY = 4;
+            const CHUNK_MAX_RETRIES = 5;
+            
+            // 上传前在 Worker 线程中计算 SHA-256，服务器已有相同内容时秒传（跳过文件传输）
+            const HASH_PROBE_MAX_SIZE = 500 * 1024 * 1024;
+            const hashWorkerSource = `
+                self.onmessage = async (event) => {
+                    try {
+                        const buffer = await event.data.arrayBuffer();
+                        const digest = await crypto.subtle.digest('SHA-256', buffer);
+                        const hex = Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+                        self.postMessage({ hash: hex });
+                    } catch (error) {
+                        self.postMessage({ error: String(error) });
+                    }
+                };
+            `;
             
             // 初始化页面
             document.addEventListener('DOMContentLoaded', function() {
@@ -990,6 +1420,9 @@ def index():
                     uploadedSize: 0
                 };
                 
+                // 选择文件后立即开始计算哈希，与界面渲染并行
+                fileItem.hashPromise = computeFileHash(file);
+                
                 uploadQueue.push(fileItem);
                 renderFileItem(fileItem);
                 
@@ -1032,8 +1465,66 @@ def index():
                 fileList.appendChild(itemElement);
             }
             
-            // 上传文件
+            // 在 Worker 线程中计算文件的 SHA-256；浏览器不支持或文件过大时返回 null
+            function computeFileHash(file) {
+                if (!window.Worker || !window.crypto || !window.crypto.subtle || file.size > HASH_PROBE_MAX_SIZE) {
+                    return Promise.resolve(null);
+                }
+                
+                return new Promise(resolve => {
+                    const url = URL.createObjectURL(new Blob([hashWorkerSource], { type: 'text/javascript' }));
+                    const worker = new Worker(url);
+                    const finish = (hash) => {
+                        worker.terminate();
+                        URL.revokeObjectURL(url);
+                        resolve(hash);
+                    };
+                    worker.onmessage = (event) => finish(event.data.hash || null);
+                    worker.onerror = () => finish(null);
+                    worker.postMessage(file);
+                });
+            }
+            
+            // 秒传：服务器已有相同内容时直接创建文件记录，返回是否成功
+            async function probeExistingFile(fileItem) {
+                try {
+                    const hash = await fileItem.hashPromise;
+                    if (!hash) return false;
+                    
+                    const response = await fetch('/api/files/probe', {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ sha256: hash, size: fileItem.file.size, filename: fileItem.file.name })
+                    });
+                    return response.ok;
+                } catch (error) {
+                    console.error('Hash probe error:', error);
+                    return false;
+                }
+            }
+            
+            // 上传文件（先尝试秒传）
             function uploadFile(fileItem) {
+                updateFileProgress(fileItem.id, 0, '正在校验文件...');
+                
+                probeExistingFile(fileItem).then(found => {
+                    if (found) {
+                        updateFileProgress(fileItem.id, 100, '秒传成功', 'success');
+                        loadExistingFiles(); // 重新加载文件列表
+                        updateStats();
+                    } else {
+                        sendFile(fileItem);
+                    }
+                });
+            }
+            
+            // 传输文件内容
+            function sendFile(fileItem) {
+                if (fileItem.file.size > CHUNKED_UPLOAD_THRESHOLD) {
+                    uploadFileChunked(fileItem);
+                    return;
+                }
+                
                 const formData = new FormData();
                 formData.append('file', fileItem.file);
                 
@@ -1070,6 +1561,113 @@ def index():
                 updateFileProgress(fileItem.id, 0, '正在上传...');
             }
             
+            // 分块上传会话按文件名、大小和修改时间记录在 localStorage 中，重新选择同一文件时自动续传
+            function uploadSessionKey(file) {
+                return `upload-session:${file.name}:${file.size}:${file.lastModified}`;
+            }
+            
+            async function getOrCreateUploadSession(file) {
+                const key = uploadSessionKey(file);
+                const savedId = localStorage.getItem(key);
+                if (savedId) {
+                    const response = await fetch(`/api/uploads/${savedId}`);
+                    if (response.ok) {
+                        return response.json();
+                    }
+                    localStorage.removeItem(key);
+                }
+                
+                const response = await fetch('/api/uploads', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ filename: file.name, size: file.size })
+                });
+                const data = await response.json();
+                if (!response.ok) {
+                    throw new Error(data.error || '创建上传会话失败');
+                }
+                localStorage.setItem(key, data.upload_id);
+                return data;
+            }
+            
+            function chunkLength(session, index) {
+                const start = index * session.chunk_size;
+                return Math.min(session.chunk_size, session.size - start);
+            }
+            
+            // 上传单个分块，网络错误和服务端错误按指数退避重试
+            async function uploadChunkWithRetry(session, file, index) {
+                const start = index * session.chunk_size;
+                const blob = file.slice(start, start + chunkLength(session, index));
+                
+                for (let attempt = 0; ; attempt++) {
+                    let response = null;
+                    try {
+                        response = await fetch(`/api/uploads/${session.upload_id}/chunks/${index}`, {
+                            method: 'PUT',
+                            body: blob
+                        });
+                    } catch (error) {
+                        if (attempt >= CHUNK_MAX_RETRIES) throw error;
+                    }
+                    
+                    if (response) {
+                        if (response.ok) return blob.size;
+                        const data = await response.json().catch(() => ({}));
+                        if (response.status === 404) {
+                            localStorage.removeItem(uploadSessionKey(file));
+                        }
+                        if (response.status < 500 || attempt >= CHUNK_MAX_RETRIES) {
+                            throw new Error(data.error || `分块 ${index} 上传失败`);
+                        }
+                    }
+                    
+                    await new Promise(resolve => setTimeout(resolve, 1000 * Math.pow(2, attempt)));
+                }
+            }
+            
+            // 分块上传：只上传服务端缺失的分块，多个分块并发上传
+            async function uploadFileChunked(fileItem) {
+                const file = fileItem.file;
+                
+                try {
+                    updateFileProgress(fileItem.id, 0, '正在准备分块上传...');
+                    const session = await getOrCreateUploadSession(file);
+                    const pending = session.missing_chunks.slice();
+                    let uploadedBytes = file.size - pending.reduce((sum, index) => sum + chunkLength(session, index), 0);
+                    
+                    const reportProgress = () => {
+                        const percentComplete = file.size ? Math.round((uploadedBytes / file.size) * 100) : 100;
+                        updateFileProgress(fileItem.id, percentComplete, `上传中... ${percentComplete}%`);
+                    };
+                    reportProgress();
+                    
+                    const worker = async () => {
+                        while (pending.length > 0) {
+                            const index = pending.shift();
+                            uploadedBytes += await uploadChunkWithRetry(session, file, index);
+                            reportProgress();
+                        }
+                    };
+                    const workerCount = Math.min(CHUNK_CONCURRENCY, pending.length);
+                    await Promise.all(Array.from({ length: workerCount }, worker));
+                    
+                    const response = await fetch(`/api/uploads/${session.upload_id}/complete`, { method: 'POST' });
+                    const data = await response.json();
+                    if (!response.ok) {
+                        throw new Error(data.error || '上传失败');
+                    }
+                    
+                    localStorage.removeItem(uploadSessionKey(file));
+                    updateFileProgress(fileItem.id, 100, '上传成功', 'success');
+                    loadExistingFiles(); // 重新加载文件列表
+                    updateStats();
+                } catch (error) {
+                    console.error('Chunked upload error:', error);
+                    updateFileProgress(fileItem.id, 0, `上传失败，重新选择该文件可继续上传：${error.message}`, 'error');
+                }
+            }
+            
             // 更新文件进度
             function updateFileProgress(fileId, progress, statusText, statusClass = '') {
                 const element = document.getElementById(fileId);
@@ -1120,12 +1718,46 @@ def index():
                 return parseFloat((bytes / Math.pow(k, i)).toFixed(1)) + ' ' + sizes[i];
             }
             
-            // 加载已存在的文件
+            // 搜索框输入停止 300ms 后搜索
+            function onSearchInput(value) {
+                clearTimeout(searchTimer);
+                searchTimer = setTimeout(() => {
+                    searchQuery = value.trim();
+                    currentPage = 1;
+                    loadExistingFiles();
+                }, 300);
+            }
+            
+            function clearSearch() {
+                clearTimeout(searchTimer);
+                document.getElementById('searchInput').value = '';
+                if (searchQuery) {
+                    searchQuery = '';
+                    currentPage = 1;
+                    loadExistingFiles();
+                }
+            }
+            
+            // 加载已存在的文件（仅请求当前页；有搜索词时请求搜索结果）
             function loadExistingFiles() {
-                fetch('/api/files')
+                const params = new URLSearchParams({ page: currentPage, per_page: filesPerPage });
+                if (selectedFileTypes.size > 0) {
+                    params.set('type', Array.from(selectedFileTypes).join(','));
+                }
+                if (searchQuery) {
+                    params.set('q', searchQuery);
+                }
+                
+                fetch(`${searchQuery ? '/api/search' : '/api/files'}?${params}`)
                     .then(response => response.json())
                     .then(data => {
-                        renderExistingFiles(data.files);
+                        // 当前页已被删空时回退到最后一页
+                        if (data.files.length === 0 && data.total > 0 && currentPage > 1) {
+                            currentPage = Math.max(1, data.pages);
+                            loadExistingFiles();
+                            return;
+                        }
+                        renderExistingFiles(data.files, data.total);
                     })
                     .catch(error => {
                         document.getElementById('existingFiles').innerHTML = 
@@ -1134,8 +1766,9 @@ def index():
             }
             
             // 渲染已存在的文件
-            function renderExistingFiles(files) {
-                allFiles = files;
+            function renderExistingFiles(files, total) {
+                currentFiles = files;
+                totalFiles = total;
                 renderCurrentPage();
             }
             
@@ -1143,16 +1776,15 @@ def index():
             function renderCurrentPage() {
                 const container = document.getElementById('existingFiles');
                 
-                if (allFiles.length === 0) {
-                    container.innerHTML = '<p style="text-align: center; color: #666; padding: 20px;">暂无文件</p>';
+                if (totalFiles === 0) {
+                    const emptyText = searchQuery ? '没有匹配的文件' : '暂无文件';
+                    container.innerHTML = `<p style="text-align: center; color: #666; padding: 20px;">${emptyText}</p>`;
                     return;
                 }
                 
-                // 计算分页
-                const totalPages = Math.ceil(allFiles.length / filesPerPage);
+                // 计算分页（服务端已返回当前页数据）
+                const totalPages = Math.ceil(totalFiles / filesPerPage);
                 const startIndex = (currentPage - 1) * filesPerPage;
-                const endIndex = startIndex + filesPerPage;
-                const currentFiles = allFiles.slice(startIndex, endIndex);
                 
                 // 生成文件列表
                 const fileList = currentFiles.map((file, index) => {
@@ -1162,12 +1794,18 @@ def index():
                     
                     return `
                         <div class="file-row" data-index="${startIndex + index}">
+                            <div class="file-select-column">
+                                <input type="checkbox" ${selectedFiles.has(file.filename) ? 'checked' : ''}
+                                       onchange="toggleFileSelection('${file.filename}', this.checked)">
+                            </div>
                             <div class="file-type-column">
                                 <span class="file-type-icon" style="color: ${typeInfo.color}">${typeInfo.icon}</span>
                                 <span class="file-type-name">${typeInfo.typeName}</span>
                             </div>
                             <div class="file-name-column">
                                 <div class="file-name-primary">${file.filename}</div>
+                                ${file.media ? `<div class="file-name-secondary">${formatMediaInfo(file.media)}</div>` : ''}
+                                ${file.snippet_html ? `<div class="file-snippet">${file.snippet_html}</div>` : ''}
                             </div>
                             <div class="file-size-column">
                                 ${formatFileSize(file.size)}
@@ -1198,11 +1836,29 @@ def index():
                 }).join('');
                 
                 // 生成分页控件
-                const paginationHtml = generatePagination(currentPage, totalPages, allFiles.length);
+                const paginationHtml = generatePagination(currentPage, totalPages, totalFiles);
+                
+                const allSelected = currentFiles.every(file => selectedFiles.has(file.filename));
                 
                 container.innerHTML = `
+                    <div class="bulk-toolbar">
+                        <span id="selectionInfo"></span>
+                        <button class="action-btn download-btn" id="bulkDownloadBtn" onclick="downloadSelectedFiles()">
+                            📦 打包下载
+                        </button>
+                        <button class="action-btn delete-btn" id="bulkDeleteBtn" onclick="deleteSelectedFiles()">
+                            🗑️ 删除所选
+                        </button>
+                        <button class="action-btn copy-btn" id="clearSelectionBtn" onclick="clearSelection()">
+                            取消选择
+                        </button>
+                    </div>
                     <div class="file-table">
                         <div class="file-header">
+                            <div class="file-select-column">
+                                <input type="checkbox" title="全选本页" ${allSelected ? 'checked' : ''}
+                                       onchange="togglePageSelection(this.checked)">
+                            </div>
                             <div class="file-type-column">类型</div>
                             <div class="file-name-column">文件名</div>
                             <div class="file-size-column">大小</div>
@@ -1214,6 +1870,69 @@ def index():
                     </div>
                     ${paginationHtml}
                 `;
+                updateSelectionInfo();
+            }
+            
+            // 批量选择
+            function toggleFileSelection(filename, checked) {
+                if (checked) {
+                    selectedFiles.add(filename);
+                } else {
+                    selectedFiles.delete(filename);
+                }
+                updateSelectionInfo();
+            }
+            
+            function togglePageSelection(checked) {
+                currentFiles.forEach(file => toggleFileSelection(file.filename, checked));
+                renderCurrentPage();
+            }
+            
+            function clearSelection() {
+                selectedFiles.clear();
+                renderCurrentPage();
+            }
+            
+            function updateSelectionInfo() {
+                const info = document.getElementById('selectionInfo');
+                if (!info) return;
+                const count = selectedFiles.size;
+                info.textContent = count > 0 ? `已选择 ${count} 个文件` : '勾选文件后可打包下载（未勾选时打包当前筛选的全部文件）';
+                document.getElementById('clearSelectionBtn').style.display = count > 0 ? '' : 'none';
+                document.getElementById('bulkDeleteBtn').style.display = count > 0 ? '' : 'none';
+            }
+            
+            // 打包下载：服务器流式生成 ZIP；未勾选文件时按当前类型筛选打包
+            function downloadSelectedFiles() {
+                const params = new URLSearchParams();
+                if (selectedFiles.size > 0) {
+                    params.set('files', Array.from(selectedFiles).join(','));
+                } else if (selectedFileTypes.size > 0) {
+                    params.set('type', Array.from(selectedFileTypes).join(','));
+                }
+                const url = `/api/files/archive?${params}`;
+                if (url.length <= ARCHIVE_MAX_URL_LENGTH) {
+                    const link = document.createElement('a');
+                    link.href = url;
+                    document.body.appendChild(link);
+                    link.click();
+                    document.body.removeChild(link);
+                    return;
+                }
+                
+                const form = document.createElement('form');
+                form.method = 'POST';
+                form.action = '/api/files/archive';
+                selectedFiles.forEach(filename => {
+                    const input = document.createElement('input');
+                    input.type = 'hidden';
+                    input.name = 'files';
+                    input.value = filename;
+                    form.appendChild(input);
+                });
+                document.body.appendChild(form);
+                form.submit();
+                document.body.removeChild(form);
             }
             
             // 生成分页HTML
@@ -1274,11 +1993,11 @@ def index():
             
             // 切换页面
             function changePage(page) {
-                const totalPages = Math.ceil(allFiles.length / filesPerPage);
+                const totalPages = Math.ceil(totalFiles / filesPerPage);
                 if (page < 1 || page > totalPages) return;
                 
                 currentPage = page;
-                renderCurrentPage();
+                loadExistingFiles();
                 
                 // 滚动到文件列表顶部
                 document.getElementById('existingFiles').scrollIntoView({ 
@@ -1297,6 +2016,30 @@ def index():
                 document.body.removeChild(link);
             }
             
+            // 片段下载控件：服务器按关键帧截取 MP4，不下载整个文件
+            function createClipControls(filename, duration) {
+                const controls = document.createElement('p');
+                controls.innerHTML = `
+                    片段下载: 从 <input type="number" class="clip-start" min="0" step="1" value="0" style="width: 80px;"> 秒
+                    到 <input type="number" class="clip-end" min="0" step="1" value="${Math.ceil(duration)}" style="width: 80px;"> 秒
+                    <button class="action-btn download-btn">📥 下载片段</button>
+                `;
+                controls.querySelector('button').onclick = function() {
+                    const start = parseFloat(controls.querySelector('.clip-start').value) || 0;
+                    const end = parseFloat(controls.querySelector('.clip-end').value);
+                    if (!(end > start)) {
+                        alert('结束时间必须大于开始时间');
+                        return;
+                    }
+                    const link = document.createElement('a');
+                    link.href = `/files/${encodeURIComponent(filename)}/clip?start=${start}&end=${end}`;
+                    document.body.appendChild(link);
+                    link.click();
+                    document.body.removeChild(link);
+                };
+                return controls;
+            }
+            
             // 复制文件URL
             function copyFileUrl(url, button) {
                 console.log('尝试复制URL:', url);
@@ -1458,9 +2201,10 @@ def index():
                     });
             }
             
-            // 更新文件过滤器（如果需要的话）
+            // 更新文件过滤器：按选中的文件类型重新请求第一页
             function updateFileFilter() {
-                // 可以在这里添加实时过滤逻辑
+                currentPage = 1;
+                loadExistingFiles();
             }
             
             // 检查文件是否可预览
@@ -1482,7 +2226,9 @@ def index():
             // 预览文件
             function previewFile(filename, fileType) {
                 console.log('previewFile called with:', filename, fileType);
-                const fileUrl = `/files/${filename}`;
+                const fileUrl = `/files/${encodeURIComponent(filename)}?inline=1`;
+                const fileRecord = currentFiles.find(f => f.filename === filename);
+                const thumbnailUrl = fileRecord && fileRecord.thumbnails ? fileRecord.thumbnails['512'] : null;
                 const modal = document.getElementById('previewModal');
                 const container = document.getElementById('previewContainer');
                 const title = document.getElementById('previewTitle');
@@ -1504,14 +2250,26 @@ def index():
                     // 图片预览
                     const img = document.createElement('img');
                     img.className = 'preview-media';
-                    img.src = fileUrl;
+                    // 有缩略图时先显示缩略图，不下载原图
+                    img.src = thumbnailUrl || fileUrl;
                     img.alt = filename;
                     img.onload = function() {
-                        info.innerHTML = `
-                            <p>文件类型: ${fileType} | 分辨率: ${this.naturalWidth} × ${this.naturalHeight}</p>
-                        `;
+                        if (this.src.endsWith(fileUrl)) {
+                            info.innerHTML = `
+                                <p>文件类型: ${fileType} | 分辨率: ${this.naturalWidth} × ${this.naturalHeight}</p>
+                            `;
+                        } else {
+                            info.innerHTML = `
+                                <p>文件类型: ${fileType}${fileRecord.media && fileRecord.media.width ? ` | 分辨率: ${fileRecord.media.width} × ${fileRecord.media.height}` : ''} | 缩略图预览 | <a href="${fileUrl}" target="_blank">查看原图</a></p>
+                            `;
+                        }
                     };
                     img.onerror = function() {
+                        if (!this.src.endsWith(fileUrl)) {
+                            // 缩略图不可用时退回原图
+                            this.src = fileUrl;
+                            return;
+                        }
                         container.innerHTML = '<p style="color: #dc3545; padding: 40px;">图片加载失败</p>';
                     };
                     container.appendChild(img);
@@ -1526,6 +2284,9 @@ def index():
                         info.innerHTML = `
                             <p>文件类型: ${fileType} | 分辨率: ${this.videoWidth} × ${this.videoHeight} | 时长: ${formatDuration(this.duration)}</p>
                         `;
+                        if (['mp4', 'mov'].includes(extension)) {
+                            info.appendChild(createClipControls(filename, this.duration));
+                        }
                     };
                     video.onerror = function() {
                         container.innerHTML = '<p style="color: #dc3545; padding: 40px;">视频加载失败</p>';
@@ -1576,6 +2337,17 @@ def index():
             }
             
             // 格式化时长
+            // 媒体信息摘要：分辨率 · 时长 · 编码
+            function formatMediaInfo(media) {
+                const parts = [];
+                if (media.width && media.height) parts.push(`${media.width} × ${media.height}`);
+                if (media.duration) parts.push(formatDuration(media.duration));
+                const codecs = [media.video_codec, media.audio_codec].filter(Boolean);
+                if (codecs.length) parts.push(codecs.join(' / '));
+                if (media.bitrate && media.duration) parts.push(`${Math.round(media.bitrate / 1000)} kbps`);
+                return parts.join(' · ');
+            }
+            
             function formatDuration(seconds) {
                 if (isNaN(seconds)) return '未知';
                 
@@ -1607,6 +2379,49 @@ def index():
                 }
             });
             
+            // 批量删除所选文件：一次请求删除，完成后只刷新一次列表和统计
+            function deleteSelectedFiles() {
+                const filenames = Array.from(selectedFiles);
+                if (filenames.length === 0) return;
+                if (!confirm(`确定要删除所选的 ${filenames.length} 个文件吗？此操作无法撤销！`)) {
+                    return;
+                }
+                
+                fetch('/api/files/batch/delete', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({ filenames: filenames })
+                })
+                .then(response => response.json().then(data => {
+                    if (!response.ok) {
+                        throw new Error(data.error || '删除失败');
+                    }
+                    return data;
+                }))
+                .then(data => {
+                    data.results.forEach(result => {
+                        if (result.status === 'success' || result.error === '文件不存在') {
+                            selectedFiles.delete(result.filename);
+                        }
+                    });
+                    const failures = data.results.filter(result => result.status !== 'success');
+                    if (failures.length > 0) {
+                        const details = failures.slice(0, 10).map(result => `${result.filename}: ${result.error}`).join('; ');
+                        alert(`已删除 ${data.deleted} 个文件，${data.failed} 个失败：${details}`);
+                    } else {
+                        alert(`已删除 ${data.deleted} 个文件`);
+                    }
+                    loadExistingFiles();
+                    updateStats();
+                })
+                .catch(error => {
+                    console.error('Batch delete error:', error);
+                    alert(`删除失败：${error.message}`);
+                });
+            }
+            
             // 删除文件
             function deleteFile(filename) {
                 // 确认删除
@@ -1636,6 +2451,7 @@ def index():
                     // 显示成功消息
                     alert('文件删除成功！');
                     
+                    selectedFiles.delete(filename);
                     // 重新加载文件列表
                     loadExistingFiles();
                     updateStats();
@@ -1652,119 +2468,456 @@ def index():
     return upload_page
 
 # 上传文件接口
+# 请求体流式写入 VIDEO_DIR 内的临时文件，边写边计算大小和 SHA-256，完成后原子重命名
+def validate_upload_filename(filename):
+    if not allowed_file(filename):
+        raise UploadError('不支持的文件类型')
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': '没有选择文件'}), 400
+        # 剖析时分别统计读取请求体、multipart 解析、写入临时文件、计算哈希的耗时
+        profile = current_profile()
+        timings = {} if profile is not None else None
+        try:
+            started = time.perf_counter()
+            upload = receive_multipart_file(request.stream, request.content_type, VIDEO_DIR,
+                                            validate=validate_upload_filename, timings=timings)
+            if profile is not None:
+                timings['parse'] = time.perf_counter() - started - sum(timings.values())
+                for name, seconds in timings.items():
+                    profile.add(name, seconds)
+        except UploadError as e:
+            return jsonify({'error': e.message}), e.status_code
+        except RequestEntityTooLarge:
+            return jsonify({'error': '文件大小超过限制'}), 413
+        except ValueError as e:
+            return jsonify({'error': f'请求格式错误: {str(e)}'}), 400
         
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': '文件名不能为空'}), 400
+        result = store_upload(upload)
+        with profile_phase('json'):
+            return jsonify(result)
         
-        if not allowed_file(file.filename):
+    except Exception as e:
+        return jsonify({'error': f'上传失败: {str(e)}'}), 500
+
+# 用户文件名：VIDEO_DIR 中以 . 开头的是服务自身的状态（.catalog.db、.blobs.db、.search.db、.bandwidth.json 等），
+# 单个文件和批量接口都必须先检查，不能通过文件接口读取或删除
+def is_user_filename(filename):
+    return bool(filename) and not filename.startswith('.') and os.path.basename(filename) == filename
+
+# 生成安全的唯一文件名，返回 (安全文件名, 唯一文件名)
+def make_unique_filename(original_filename):
+    filename = secure_filename(original_filename)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
+    return filename, timestamp + str(uuid.uuid4())[:8] + '_' + filename
+
+# 把已写完的临时文件存入去重存储、以唯一文件名链接到 VIDEO_DIR 并加入索引，返回上传结果。
+# MP4 的原始内容已在后台重排过时（去重存储中记录了别名）直接链接重排结果
+def store_upload(upload):
+    filename, unique_filename = make_unique_filename(upload['filename'])
+    file_path = storage.new_path(unique_filename)
+    if is_mp4(unique_filename):
+        with profile_phase('store'):
+            sha256 = blob_store.link(upload['sha256'], upload['size'], file_path)
+        if sha256:
+            os.remove(upload['temp_path'])
+            return register_upload(filename, unique_filename, sha256, True)
+    with profile_phase('store'):
+        deduplicated = blob_store.store(upload['temp_path'], upload['sha256'], file_path)
+    return register_upload(filename, unique_filename, upload['sha256'], deduplicated)
+
+# 更新索引并返回上传结果
+def register_upload(filename, unique_filename, sha256, deduplicated):
+    with profile_phase('index'):
+        record = file_index.add(unique_filename, sha256=sha256 if blob_store.enabled else None)
+    with profile_phase('schedule'):
+        compression_cache.schedule(unique_filename)
+        search_index.schedule(record)
+        thumbnail_service.schedule(unique_filename)
+        faststart_worker.schedule(unique_filename)
+    with profile_phase('probe'):
+        media = get_media(record)
+    
+    return {
+        'status': 'success',
+        'message': '文件上传成功',
+        'filename': unique_filename,
+        'original_name': filename,
+        'size': record['size'],
+        'type': record['type'],
+        'sha256': sha256,
+        'deduplicated': deduplicated,
+        'media': media,
+        'download_url': f'/files/{unique_filename}'
+    }
+
+# 返回记录中缓存的媒体元数据（时长、分辨率、编码、码率），只读取文件头；上传时调用，
+# 尚未探测过的文件由后台线程探测（探测失败同样缓存为 None，一个损坏的文件不会让上传或列表请求失败）
+def get_media(record):
+    if 'media' in record:
+        return record['media']
+    media = media_prober.probe(record['filename'])
+    file_index.set_media(record['filename'], media)
+    return media
+
+# 秒传接口：客户端先提交文件的 SHA-256 和大小（JSON: sha256, size, filename），
+# 服务器已有相同内容时直接创建新文件记录，无需上传文件内容；否则返回 404，客户端再正常上传
+@app.route('/api/files/probe', methods=['POST'])
+def probe_file():
+    try:
+        data = request.get_json(silent=True) or {}
+        sha256 = str(data.get('sha256') or '').lower()
+        original_filename = data.get('filename') or ''
+        if not re.fullmatch(r'[0-9a-f]{64}', sha256):
+            return jsonify({'error': '参数错误: sha256 格式无效'}), 400
+        if not original_filename:
+            return jsonify({'error': '文件名不能为空'}), 400
+        if not allowed_file(original_filename):
             return jsonify({'error': '不支持的文件类型'}), 400
+        try:
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': '参数错误: size 必须为整数'}), 400
+        
+        # 上传时被重排过的内容按原始内容的别名匹配，返回的 sha256 为实际保存的内容
+        filename, unique_filename = make_unique_filename(original_filename)
+        stored_sha256 = blob_store.link(sha256, size, storage.new_path(unique_filename))
+        if not stored_sha256:
+            return jsonify({'status': 'missing', 'message': '服务器上没有相同内容的文件'}), 404
+        
+        return jsonify(register_upload(filename, unique_filename, stored_sha256, True))
         
-        # 生成安全的文件名
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-        unique_filename = timestamp + str(uuid.uuid4())[:8] + '_' + filename
+    except Exception as e:
+        return jsonify({'error': f'秒传失败: {str(e)}'}), 500
+
+# 分块上传接口
+# 1. POST /api/uploads 创建会话（JSON: filename, size, 可选 chunk_size）
+# 2. PUT /api/uploads/<id>/chunks/<n> 上传第 n 个分块（请求体为原始字节，可乱序、并发）
+# 3. GET /api/uploads/<id> 查询已接收的区间与缺失的分块（用于断点续传）
+# 4. POST /api/uploads/<id>/complete 完成上传；DELETE /api/uploads/<id> 取消上传
+@app.route('/api/uploads', methods=['POST'])
+def create_upload_session():
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename') or ''
+        if not filename:
+            return jsonify({'error': '文件名不能为空'}), 400
+        if not allowed_file(filename):
+            return jsonify({'error': '不支持的文件类型'}), 400
         
-        file_path = os.path.join(VIDEO_DIR, unique_filename)
-        file.save(file_path)
+        try:
+            size = int(data.get('size'))
+            chunk_size = int(data['chunk_size']) if data.get('chunk_size') else None
+        except (TypeError, ValueError):
+            return jsonify({'error': '参数错误: size/chunk_size 必须为整数'}), 400
         
-        # 获取文件信息
-        file_size = os.path.getsize(file_path)
-        file_type = get_file_type(filename)
+        return jsonify(upload_sessions.create(filename, size, chunk_size)), 201
         
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status_code
+    except Exception as e:
+        return jsonify({'error': f'创建上传会话失败: {str(e)}'}), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_session_status(upload_id):
+    try:
+        return jsonify(upload_sessions.status(upload_id))
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status_code
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    try:
+        received = upload_sessions.write_chunk(upload_id, index, request.stream, request.content_length)
         return jsonify({
             'status': 'success',
-            'message': '文件上传成功',
-            'filename': unique_filename,
-            'original_name': filename,
-            'size': file_size,
-            'type': file_type,
-            'download_url': f'/files/{unique_filename}'
+            'upload_id': upload_id,
+            'chunk': index,
+            'received_chunks': received
         })
-        
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status_code
+    except RequestEntityTooLarge:
+        return jsonify({'error': '分块大小超过限制'}), 413
+    except Exception as e:
+        return jsonify({'error': f'分块上传失败: {str(e)}'}), 500
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload_session(upload_id):
+    try:
+        with profile_phase('finalize'):
+            upload = upload_sessions.finalize(upload_id)
+        result = store_upload(upload)
+        with profile_phase('json'):
+            return jsonify(result)
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status_code
     except Exception as e:
         return jsonify({'error': f'上传失败: {str(e)}'}), 500
 
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload_session(upload_id):
+    try:
+        upload_sessions.abort(upload_id)
+        return jsonify({'status': 'success', 'message': '上传已取消', 'upload_id': upload_id})
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status_code
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# 列表类接口的条件请求：以索引版本号作为 ETag，数据未变化时直接返回 304，不生成响应体
+def conditional_listing(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # 统计信息中的"今日上传"随日期变化，ETag 需包含日期
+        etag = f"{file_index.generation}-{blob_store.total_size}-{datetime.now().strftime('%Y%m%d')}"
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
 # 文件列表API
+# 支持参数: page/per_page 或 cursor 分页，type（可逗号分隔多个类型）、name（原文件名子串）、
+# min_size/max_size（字节）、date_from/date_to（YYYY-MM-DD，含当天）过滤，sort（date/size/name）与 order（asc/desc）排序
+# 不带分页参数时返回全部文件（兼容旧客户端）
+MAX_PER_PAGE = 1000
+
+def parse_date_param(value, end=False):
+    if not value:
+        return None
+    day = datetime.strptime(value, '%Y-%m-%d')
+    if end:
+        day += timedelta(days=1)
+    return day.timestamp()
+
+def parse_int_param(name, minimum=None):
+    value = request.values.get(name)
+    if value in (None, ''):
+        return None
+    value = int(value)
+    if minimum is not None and value < minimum:
+        raise ValueError(f'参数 {name} 不能小于 {minimum}')
+    return value
+
+def file_entry(record):
+    return {
+        'filename': record['filename'],
+        'original_name': record['original_name'],
+        'size': record['size'],
+        'type': record['type'],
+        'download_url': f"/files/{record['filename']}",
+        'thumbnails': thumbnail_service.urls(record['filename']),
+        'media': record.get('media'),
+        'hls_url': f"/hls/{record['filename']}/index.m3u8" if is_mp4(record['filename']) else None,
+        'upload_date': record['upload_date']
+    }
+
 @app.route('/api/files')
+@conditional_listing
 def api_files():
     try:
-        if not os.path.exists(VIDEO_DIR):
-            return jsonify({'files': [], 'total': 0})
+        try:
+            file_types = [t for t in request.args.get('type', '').split(',') if t]
+            for file_type in file_types:
+                if file_type not in FILE_TYPES:
+                    raise ValueError(f'不支持的文件类型: {file_type}')
+            
+            page = parse_int_param('page', minimum=1) or 1
+            per_page = parse_int_param('per_page', minimum=1)
+            cursor = request.args.get('cursor') or None
+            if per_page is None and ('page' in request.args or cursor):
+                per_page = 10
+            if per_page is not None:
+                per_page = min(per_page, MAX_PER_PAGE)
+            
+            with profile_phase('query'):
+                result = file_index.query(
+                    sort=request.args.get('sort', 'date'),
+                    order=request.args.get('order', 'desc'),
+                    file_types=file_types,
+                    name=request.args.get('name', '').strip(),
+                    min_size=parse_int_param('min_size', minimum=0),
+                    max_size=parse_int_param('max_size', minimum=0),
+                    start_time=parse_date_param(request.args.get('date_from')),
+                    end_time=parse_date_param(request.args.get('date_to'), end=True),
+                    page=page,
+                    per_page=per_page,
+                    cursor=cursor
+                )
+        except ValueError as e:
+            return jsonify({'error': f'参数错误: {str(e)}'}), 400
         
-        files = []
-        for filename in os.listdir(VIDEO_DIR):
-            file_path = os.path.join(VIDEO_DIR, filename)
-            if os.path.isfile(file_path):
-                file_size = os.path.getsize(file_path)
-                file_type = get_file_type(filename)
-                
-                files.append({
-                    'filename': filename,
-                    'size': file_size,
-                    'type': file_type,
-                    'download_url': f'/files/{filename}',
-                    'upload_date': datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
-                })
+        with profile_phase('entries'):
+            files = [file_entry(record) for record in result['records']]
+        
+        response = {
+            'files': files,
+            'total': result['total']
+        }
+        if per_page is not None:
+            response.update({
+                'page': page if cursor is None else None,
+                'per_page': per_page,
+                'pages': (result['total'] + per_page - 1) // per_page,
+                'has_more': result['has_more'],
+                'next_cursor': result['next_cursor']
+            })
+        with profile_phase('json'):
+            return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# 全文搜索接口：参数 q（多个词用空格分隔，文件需包含所有词）、type、page、per_page，
+# 在原文件名和文本类文件内容中搜索，按相关度排序；返回的文件信息同 /api/files，另有高亮摘要 snippet_html
+@app.route('/api/search')
+def api_search():
+    try:
+        try:
+            query = request.args.get('q', '').strip()
+            if not query:
+                raise ValueError('缺少搜索词 q')
+            file_types = [t for t in request.args.get('type', '').split(',') if t]
+            for file_type in file_types:
+                if file_type not in FILE_TYPES:
+                    raise ValueError(f'不支持的文件类型: {file_type}')
+            page = parse_int_param('page', minimum=1) or 1
+            per_page = min(parse_int_param('per_page', minimum=1) or 10, MAX_PER_PAGE)
+        except ValueError as e:
+            return jsonify({'error': f'参数错误: {str(e)}'}), 400
         
-        # 按上传时间排序，最新的在前
-        files.sort(key=lambda x: x['upload_date'], reverse=True)
+        total, hits = search_index.search(query, file_types=file_types,
+                                          limit=per_page, offset=(page - 1) * per_page)
+        files = []
+        for filename, snippet_html in hits:
+            # 索引由后台线程更新，可能短暂包含刚删除的文件
+            record = file_index.get(filename)
+            if record is not None:
+                files.append(dict(file_entry(record), snippet_html=snippet_html))
         
         return jsonify({
             'files': files,
-            'total': len(files)
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'pages': (total + per_page - 1) // per_page
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# 批量下载接口：把多个文件打包为 ZIP 流式返回（存储模式，不压缩，不生成临时文件）
+# 参数 files 指定文件名（可重复或逗号分隔，文件较多时可用 POST 表单提交）；
+# 不指定时按 type、name、min_size/max_size、date_from/date_to 过滤（与 /api/files 相同）。
+# 响应有准确的 Content-Length，并支持 Range/If-Range 断点续传
+MAX_ARCHIVE_FILES = 100000
+
+@app.route('/api/files/archive', methods=['GET', 'POST'])
+def download_archive():
+    filenames = [name for value in request.values.getlist('files') for name in value.split(',') if name]
+    try:
+        if filenames:
+            records = []
+            for filename in dict.fromkeys(filenames):
+                record = file_index.get(filename)
+                if record is None:
+                    return jsonify({'error': f'文件不存在: {filename}'}), 404
+                records.append(record)
+        else:
+            file_types = [t for t in request.values.get('type', '').split(',') if t]
+            for file_type in file_types:
+                if file_type not in FILE_TYPES:
+                    raise ValueError(f'不支持的文件类型: {file_type}')
+            records = file_index.query(
+                sort='date',
+                order='asc',
+                file_types=file_types,
+                name=request.values.get('name', '').strip(),
+                min_size=parse_int_param('min_size', minimum=0),
+                max_size=parse_int_param('max_size', minimum=0),
+                start_time=parse_date_param(request.values.get('date_from')),
+                end_time=parse_date_param(request.values.get('date_to'), end=True)
+            )['records']
+    except ValueError as e:
+        return jsonify({'error': f'参数错误: {str(e)}'}), 400
+    
+    if not records:
+        return jsonify({'error': '没有符合条件的文件'}), 404
+    if len(records) > MAX_ARCHIVE_FILES:
+        return jsonify({'error': f'一次最多打包 {MAX_ARCHIVE_FILES} 个文件'}), 400
+    
+    try:
+        files = []
+        arcnames = unique_arcnames([record['original_name'] for record in records])
+        for arcname, record in zip(arcnames, records):
+            file_path = storage.path(record['filename'])
+            files.append((arcname, file_path, os.stat(file_path)))
+        archive = ZipArchive(files)
+    except FileNotFoundError as e:
+        return jsonify({'error': f'文件不存在: {os.path.basename(e.filename)}'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return send_virtual_response(archive.size, archive.mtime, archive.iter_range,
+                                 f"files_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip", archive.etag())
+
 # 统计信息API
+# 可选参数 days：返回最近 N 天（默认 7，最多 366）的每日上传数量与大小
+MAX_HISTORY_DAYS = 366
+
 @app.route('/api/stats')
+@conditional_listing
 def api_stats():
     try:
-        if not os.path.exists(VIDEO_DIR):
-            return jsonify({
-                'total_files': 0,
-                'uploaded_today': 0,
-                'total_size': 0
-            })
-        
-        total_files = 0
-        uploaded_today = 0
-        total_size = 0
-        today = datetime.now().date()
-        
-        for filename in os.listdir(VIDEO_DIR):
-            file_path = os.path.join(VIDEO_DIR, filename)
-            if os.path.isfile(file_path):
-                total_files += 1
-                file_size = os.path.getsize(file_path)
-                total_size += file_size
-                
-                # 检查是否是今天上传的
-                file_date = datetime.fromtimestamp(os.path.getmtime(file_path)).date()
-                if file_date == today:
-                    uploaded_today += 1
-        
-        return jsonify({
-            'total_files': total_files,
-            'uploaded_today': uploaded_today,
-            'total_size': total_size
-        })
+        try:
+            days = parse_int_param('days', minimum=1) or 7
+        except ValueError as e:
+            return jsonify({'error': f'参数错误: {str(e)}'}), 400
         
+        stats = file_index.stats(days=min(days, MAX_HISTORY_DAYS))
+        # 逻辑大小为所有文件大小之和，物理大小为去重后实际占用的空间
+        stats['logical_size'] = stats['total_size']
+        stats['physical_size'] = stats.pop('unshared_size') + blob_store.total_size
+        return jsonify(stats)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# 带宽整形配置：GET 返回当前配置与限速排队中的下载；PUT 修改配置（JSON，只需给出要修改的项：
+# global_limit、client_limit、interactive_size 为字节数或带单位的字符串，preview_weight、bulk_weight 为权重），
+# 立即对进行中的下载生效，并在 1 秒内同步到其他工作进程
+@app.route('/api/bandwidth', methods=['GET', 'PUT'])
+def bandwidth_config():
+    try:
+        if request.method == 'PUT':
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'error': '请求体必须为 JSON 对象'}), 400
+            try:
+                bandwidth_scheduler.update(data)
+            except ValueError as e:
+                return jsonify({'error': f'参数错误: {str(e)}'}), 400
+        return jsonify(bandwidth_scheduler.status())
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # 删除文件API
 @app.route('/api/files/<filename>', methods=['DELETE'])
 def delete_file(filename):
+    if not is_user_filename(filename):
+        return jsonify({'error': '文件不存在'}), 404
     try:
-        file_path = os.path.join(VIDEO_DIR, filename)
+        file_path = storage.path(filename)
         
         if not os.path.exists(file_path):
             return jsonify({'error': '文件不存在'}), 404
@@ -1772,8 +2925,16 @@ def delete_file(filename):
         if not os.path.isfile(file_path):
             return jsonify({'error': '无效的文件'}), 400
             
-        # 删除文件
-        os.remove(file_path)
+        # 删除文件；去重存储中的内容在最后一个引用删除后释放
+        with file_replace_lock:
+            sha256 = blob_store.content_id(os.stat(file_path))
+            storage.remove(filename)
+            file_index.remove(filename)
+        search_index.remove(filename)
+        compression_cache.remove(filename)
+        thumbnail_service.remove(filename)
+        if sha256:
+            blob_store.release(sha256)
         
         return jsonify({
             'status': 'success',
@@ -1786,39 +2947,305 @@ def delete_file(filename):
     except Exception as e:
         return jsonify({'error': f'删除失败: {str(e)}'}), 500
 
+# 批量接口：JSON 参数 filenames（文件名数组，最多 BATCH_MAX_FILES 个），
+# 文件系统操作在线程池中并发执行，索引与统计每批只更新一次；返回与 filenames 顺序一致的逐项结果
+BATCH_MAX_FILES = 1000
+BATCH_WORKERS = 8
+
+def parse_batch_filenames():
+    data = request.get_json(silent=True) or {}
+    filenames = data.get('filenames')
+    if not isinstance(filenames, list) or not all(isinstance(name, str) for name in filenames):
+        raise ValueError('filenames 必须为文件名数组')
+    if not filenames:
+        raise ValueError('filenames 不能为空')
+    if len(filenames) > BATCH_MAX_FILES:
+        raise ValueError(f'一次最多处理 {BATCH_MAX_FILES} 个文件')
+    return list(dict.fromkeys(filenames))
+
+def run_batch(func, items):
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(items))) as executor:
+        return list(executor.map(func, items))
+
+# 批量删除：删除期间持有 file_replace_lock（与单个删除相同，避免与后台重写、存储布局迁移交错）
+@app.route('/api/files/batch/delete', methods=['POST'])
+def batch_delete_files():
+    try:
+        filenames = parse_batch_filenames()
+    except ValueError as e:
+        return jsonify({'error': f'参数错误: {str(e)}'}), 400
+    
+    def remove(filename):
+        result = {'filename': filename, 'status': 'error'}
+        if not is_user_filename(filename):
+            return dict(result, error='无效的文件名'), None
+        try:
+            file_path = storage.path(filename)
+            if not os.path.isfile(file_path):
+                return dict(result, error='文件不存在' if not os.path.exists(file_path) else '无效的文件'), None
+            sha256 = blob_store.content_id(os.stat(file_path))
+            storage.remove(filename)
+        except FileNotFoundError:
+            return dict(result, error='文件不存在'), None
+        except PermissionError:
+            return dict(result, error='没有权限删除文件'), None
+        except OSError as e:
+            return dict(result, error=f'删除失败: {str(e)}'), None
+        return dict(result, status='success'), sha256
+    
+    def cleanup(item):
+        filename, sha256 = item
+        compression_cache.remove(filename)
+        thumbnail_service.remove(filename)
+        if sha256:
+            blob_store.release(sha256)
+    
+    try:
+        with file_replace_lock:
+            outcomes = run_batch(remove, filenames)
+            deleted = [(result['filename'], sha256) for result, sha256 in outcomes if result['status'] == 'success']
+            file_index.remove_many([filename for filename, _ in deleted])
+        if deleted:
+            search_index.remove_many([filename for filename, _ in deleted])
+            run_batch(cleanup, deleted)
+    except Exception as e:
+        return jsonify({'error': f'删除失败: {str(e)}'}), 500
+    
+    results = [result for result, _ in outcomes]
+    return jsonify({
+        'results': results,
+        'deleted': len(deleted),
+        'failed': len(results) - len(deleted)
+    })
+
+# 批量查询元数据：返回与 /api/files 相同的文件信息（媒体信息未缓存的文件在线程池中并发探测）
+@app.route('/api/files/batch/info', methods=['POST'])
+def batch_file_info():
+    try:
+        filenames = parse_batch_filenames()
+    except ValueError as e:
+        return jsonify({'error': f'参数错误: {str(e)}'}), 400
+    
+    def lookup(filename):
+        record = file_index.get(filename) if is_user_filename(filename) else None
+        if record is None:
+            return {'filename': filename, 'status': 'error', 'error': '文件不存在'}
+        return {'filename': filename, 'status': 'success', 'file': file_entry(record)}
+    
+    try:
+        results = run_batch(lookup, filenames)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    found = sum(1 for result in results if result['status'] == 'success')
+    return jsonify({
+        'results': results,
+        'found': found,
+        'missing': len(results) - found
+    })
+
+# MP4/MOV 的 ETag 与是否可标记为 immutable，file 为已打开的文件。
+# moov 仍在末尾的文件等待后台重排后被替换，以打开文件的 stat 生成 ETag 且不标记 immutable；
+# 重排结果替换文件之前已写入索引，因此打开的是重排结果（或无需重排的文件）时索引中的 SHA-256 与之一致
+def content_validators(filename, file):
+    stat = os.fstat(file.fileno())
+    try:
+        pending = moov_after_mdat(file, stat.st_size)
+    except Mp4Error:
+        pending = False
+    if pending:
+        return make_etag(stat), False
+    record = file_index.get(filename)
+    return make_etag(stat, record['sha256'] if record else None), bool(UNIQUE_NAME_PATTERN.match(filename))
+
 # 文件下载接口（兼容原有的视频接口）
+# 支持 Range（单区间与多区间）、If-Range 和强 ETag；inline=1 时以内联方式返回，供页面预览使用
 @app.route('/files/<filename>')
 def download_file(filename):
-    try:
-        file_path = os.path.join(VIDEO_DIR, filename)
-        
-        if not os.path.exists(file_path):
+    with profile_phase('lookup'):
+        if not is_user_filename(filename):
             abort(404)
-        
+        file_path = storage.path(filename)
         if not os.path.isfile(file_path):
             abort(404)
-        
-        return send_file(file_path, as_attachment=True, download_name=filename)
+    
+    try:
+        as_attachment = request.args.get('inline') not in ('1', 'true')
+        # 剖析结果只包含准备响应（stat、打开文件、解析 Range）的耗时，不含之后的数据传输
+        if is_mp4(filename):
+            with profile_phase('open'):
+                file = open(file_path, 'rb')
+                try:
+                    etag, immutable = content_validators(filename, file)
+                except BaseException:
+                    file.close()
+                    raise
+                return send_file_response(file_path, filename, as_attachment=as_attachment,
+                                          etag=etag, immutable=immutable, file=file)
+        with profile_phase('lookup'):
+            record = file_index.get(filename)
+        sha256 = record['sha256'] if record else None
+        immutable = bool(UNIQUE_NAME_PATTERN.match(filename))
+        with profile_phase('open'):
+            if is_compressible(filename):
+                return send_compressible_file(file_path, filename, as_attachment, sha256, immutable)
+            return send_file_response(file_path, filename, as_attachment=as_attachment,
+                                      sha256=sha256, immutable=immutable)
+    except FileNotFoundError:
+        abort(404)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# 文本类文件按 Accept-Encoding 协商编码：优先发送后台生成的预压缩版本（br/zstd/gzip，支持 Range 与 304），
+# 尚未生成时实时 gzip 压缩（不支持 Range，带 Range 的请求仍返回原始内容）
+def send_compressible_file(file_path, filename, as_attachment, sha256, immutable):
+    stat = os.stat(file_path)
+    etag = make_etag(stat, sha256)
+    vary = {'Vary': 'Accept-Encoding'}
+    encoding, variant_path = compression_cache.negotiate(filename, stat, request.accept_encodings)
+    
+    if encoding and variant_path:
+        return send_file_response(variant_path, filename, as_attachment=as_attachment, immutable=immutable,
+                                  etag=f'{etag[:-1]}-{encoding}"',
+                                  extra_headers=dict(vary, **{'Content-Encoding': encoding}))
+    
+    if encoding and request.range is None:
+        # 实时压缩的输出与预压缩版本字节不同，使用弱 ETag
+        weak_etag = f'{etag[:-1]}-{encoding}-stream"'
+        headers = dict(vary, **{
+            'ETag': f'W/{weak_etag}',
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            'Content-Disposition': content_disposition(filename, as_attachment),
+            'Content-Encoding': encoding
+        })
+        if request.if_none_match.contains_weak(weak_etag.strip('"')):
+            return Response(status=304, headers=headers)
+        return Response(gzip_stream(file_path), headers=headers, direct_passthrough=True,
+                        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    
+    return send_file_response(file_path, filename, as_attachment=as_attachment, sha256=sha256,
+                              immutable=immutable, extra_headers=vary)
+
+# MP4 剪辑接口：start/end 为秒（可为小数，end 缺省为文件末尾），从 start 之前最近的关键帧开始截取，不重新编码。
+# 重建采样表后只读取剪辑范围内的媒体数据，不在磁盘上生成副本；支持 Range 与条件请求
+@app.route('/files/<filename>/clip')
+def clip_file(filename):
+    if not is_user_filename(filename):
+        abort(404)
+    file_path = storage.path(filename)
+    if not os.path.isfile(file_path):
+        abort(404)
+    if not is_mp4(filename):
+        return jsonify({'error': '只支持 MP4/MOV 文件剪辑'}), 415
+    try:
+        start = float(request.args.get('start') or 0)
+        end = float(request.args.get('end') or 'inf')
+    except ValueError:
+        return jsonify({'error': '参数错误: start/end 必须为数字（秒）'}), 400
+    if start < 0 or end <= start:
+        return jsonify({'error': '参数错误: 需要 0 <= start < end'}), 400
+    
+    try:
+        file = open(file_path, 'rb')
+    except FileNotFoundError:
+        abort(404)
+    try:
+        header, pieces, clip_start, clip_end = build_clip(file_path, start, end, file)
+        etag, immutable = content_validators(filename, file)
+    except Mp4Error as e:
+        file.close()
+        return jsonify({'error': f'无法剪辑: {str(e)}'}), 415
+    except Exception as e:
+        file.close()
+        return jsonify({'error': str(e)}), 500
+    
+    name, extension = os.path.splitext(filename)
+    response = send_pieces_response(file, [header] + pieces, f'{name}_{clip_start:g}-{clip_end:g}s{extension}',
+                                    f'{etag[:-1]}-clip-{clip_start:g}-{clip_end:g}"',
+                                    as_attachment=request.args.get('inline') not in ('1', 'true'),
+                                    immutable=immutable)
+    response.headers['X-Clip-Start'] = f'{clip_start:g}'
+    response.headers['X-Clip-End'] = f'{clip_end:g}'
+    return response
+
+# HLS 点播接口（MP4/MOV）：按关键帧切分为约 6 秒的片段，不转码、不生成副本。
+# 片段描述为一个虚拟的分片 MP4（/hls/<filename>/media.mp4，由生成的 moof 与原文件中的采样数据拼接，支持 Range），
+# 播放列表通过 EXT-X-MAP 与 EXT-X-BYTERANGE 引用其中的初始化段和各个片段；切分方案按文件缓存
+def open_hls_plan(filename):
+    if not is_user_filename(filename) or not is_mp4(filename):
+        abort(404)
+    file_path = storage.path(filename)
+    if not os.path.isfile(file_path):
+        abort(404)
+    try:
+        file = open(file_path, 'rb')
+    except FileNotFoundError:
+        abort(404)
+    try:
+        plan = load_plan(file_path, file)
+        etag, immutable = content_validators(filename, file)
+    except BaseException:
+        file.close()
+        raise
+    return file, plan, etag, immutable
+
+@app.route('/hls/<filename>/index.m3u8')
+def hls_playlist(filename):
+    try:
+        file, plan, etag, immutable = open_hls_plan(filename)
+    except Mp4Error as e:
+        return jsonify({'error': f'无法生成 HLS: {str(e)}'}), 415
+    file.close()
+    response = Response(plan.playlist('media.mp4'), mimetype='application/vnd.apple.mpegurl')
+    response.set_etag(etag.strip('"') + '-m3u8')
+    response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+    return response.make_conditional(request)
+
+@app.route('/hls/<filename>/media.mp4')
+def hls_media(filename):
+    try:
+        file, plan, etag, immutable = open_hls_plan(filename)
+    except Mp4Error as e:
+        return jsonify({'error': f'无法生成 HLS: {str(e)}'}), 415
+    name = os.path.splitext(filename)[0]
+    return send_pieces_response(file, plan.pieces, f'{name}_hls.mp4', f'{etag[:-1]}-hls"',
+                                as_attachment=False, immutable=immutable)
+
+# 缩略图接口：size 为 128/256/512（最长边像素），返回 JPEG；缓存未生成时等待生成完成
+@app.route('/thumbs/<int:size>/<filename>')
+def thumbnail(size, filename):
+    if size not in THUMBNAIL_SIZES or not is_user_filename(filename):
+        abort(404)
+    file_path = storage.path(filename)
+    if not os.path.isfile(file_path):
+        abort(404)
+    if not thumbnail_service.urls(filename):
+        return jsonify({'error': '该文件不支持缩略图'}), 404
+    
+    try:
+        thumb_path = thumbnail_service.get(filename, size)
+        name = filename.rsplit('.', 1)[0]
+        return send_file_response(thumb_path, f'{name}_{size}.jpg', as_attachment=False,
+                                  immutable=bool(UNIQUE_NAME_PATTERN.match(filename)))
+    except FileNotFoundError:
+        abort(404)
+    except FutureTimeoutError:
+        return jsonify({'error': '缩略图生成中，请稍后重试'}), 503
+    except ThumbnailError as e:
+        return jsonify({'error': str(e)}), 415
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # 兼容原有的视频接口
 @app.route('/videos')
+@conditional_listing
 def list_videos():
     try:
-        if not os.path.exists(VIDEO_DIR):
-            return jsonify({'error': '文件目录不存在'}), 404
-        
-        files = []
-        for filename in os.listdir(VIDEO_DIR):
-            file_path = os.path.join(VIDEO_DIR, filename)
-            if os.path.isfile(file_path):
-                file_size = os.path.getsize(file_path)
-                files.append({
-                    'filename': filename,
-                    'size': file_size,
-                    'download_url': f'/files/{filename}'
-                })
+        files = [{
+            'filename': record['filename'],
+            'size': record['size'],
+            'download_url': f"/files/{record['filename']}"
+        } for record in file_index.list_records()]
         
         return jsonify({
             'directory': VIDEO_DIR,
@@ -1834,20 +3261,31 @@ def download_video(filename):
     return download_file(filename)
 
 if __name__ == '__main__':
+    args = server_runner.parse_args()
     print(f"🚀 文件管理系统启动中...")
     print(f"📁 文件目录: {VIDEO_DIR}")
     print(f"🌐 访问地址:")
-    print(f"   主页 (上传界面): http://localhost:8080/")
-    print(f"   文件列表 API: http://localhost:8080/api/files")
-    print(f"   统计信息 API: http://localhost:8080/api/stats")
-    print(f"   文件下载接口: http://localhost:8080/files/<filename>")
-    print(f"   兼容接口: http://localhost:8080/videos")
+    print(f"   主页 (上传界面): http://localhost:{args.port}/")
+    print(f"   文件列表 API: http://localhost:{args.port}/api/files")
+    print(f"   统计信息 API: http://localhost:{args.port}/api/stats")
+    print(f"   文件下载接口: http://localhost:{args.port}/files/<filename>")
+    print(f"   批量下载接口: http://localhost:{args.port}/api/files/archive")
+    print(f"   缩略图接口: http://localhost:{args.port}/thumbs/<size>/<filename>")
+    print(f"   运行指标: http://localhost:{args.port}/metrics")
+    print(f"   带宽配置: http://localhost:{args.port}/api/bandwidth")
+    print(f"   兼容接口: http://localhost:{args.port}/videos")
     print(f"💡 支持的文件类型:")
     for type_name, type_info in FILE_TYPES.items():
         print(f"   {type_info['icon']} {type_name}: {', '.join(type_info['extensions'][:5])}{'...' if len(type_info['extensions']) > 5 else ''}")
     print(f"📊 最大文件大小: 500MB")
     print(f"📄 分页显示: 每页10个文件")
     print(f"✨ 功能特性: 拖拽上传、多文件上传、实时进度、文件分类、分页浏览")
+    if args.server == 'gunicorn':
+        print(f"⚙️ 运行模式: gunicorn ({args.worker_class}), 进程数 {args.workers}, 每进程线程数 {args.threads}")
+    else:
+        print(f"⚙️ 运行模式: Flask 开发服务器（生产环境请使用 --server gunicorn）")
     print("=" * 60)
     
-    app.run(host='0.0.0.0', port=8080, debug=False)
\ No newline at end of file
+    if args.server != 'gunicorn':
+        start_services()
+    server_runner.run(app, args, post_fork=start_services)
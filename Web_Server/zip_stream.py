@@ -0,0 +1,236 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+# 流式 ZIP 打包：存储模式（不压缩），所有条目使用数据描述符（CRC 在发送数据时计算，写在数据之后），
+# 超过 4GB 的条目、偏移或超过 65535 个条目时使用 ZIP64。
+# 各部分长度在发送前即可确定，因此响应有准确的 Content-Length，并支持按 Range 续传：
+# 续传时跳过的条目的 CRC 从缓存中取得（之前发送时计算并缓存），缓存中没有时读取该文件计算
+
+READ_CHUNK_SIZE = 1024 * 1024
+# CRC 缓存的条目数，按 (inode, 修改时间, 大小) 缓存
+CRC_CACHE_SIZE = 10000
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+# 通用标志：bit 3 数据描述符，bit 11 文件名为 UTF-8
+GENERAL_FLAGS = 0x0008 | 0x0800
+# 创建系统为 Unix（外部属性为文件权限）
+VERSION_MADE_BY = (3 << 8) | 45
+EXTERNAL_ATTRIBUTES = 0o100644 << 16
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+DATA_DESCRIPTOR = struct.Struct('<IIII')
+DATA_DESCRIPTOR64 = struct.Struct('<IIQQ')
+END_RECORD = struct.Struct('<IHHHHIIH')
+END_RECORD64 = struct.Struct('<IQHHIIQQQQ')
+END_LOCATOR64 = struct.Struct('<IIQI')
+
+
+class ZipStreamError(Exception):
+    pass
+
+
+_crc_cache = OrderedDict()
+_crc_cache_lock = threading.Lock()
+
+
+def _cached_crc(key):
+    with _crc_cache_lock:
+        crc = _crc_cache.get(key)
+        if crc is not None:
+            _crc_cache.move_to_end(key)
+        return crc
+
+
+def _store_crc(key, crc):
+    with _crc_cache_lock:
+        _crc_cache[key] = crc
+        _crc_cache.move_to_end(key)
+        while len(_crc_cache) > CRC_CACHE_SIZE:
+            _crc_cache.popitem(last=False)
+
+
+def _dos_time(timestamp):
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+# 同名文件在压缩包中追加序号：a.txt、a (2).txt
+def unique_arcnames(names):
+    used = set()
+    result = []
+    for name in names:
+        candidate = name
+        stem, extension = os.path.splitext(name)
+        number = 2
+        while candidate.lower() in used:
+            candidate = f'{stem} ({number}){extension}'
+            number += 1
+        used.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+
+class ZipEntry:
+    def __init__(self, arcname, path, stat):
+        self.arcname = arcname
+        self.name = arcname.encode('utf-8')
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self.zip64 = self.size >= ZIP64_LIMIT
+        self.offset = 0
+        self.crc = _cached_crc(self.identity)
+
+    def local_header(self):
+        dos_time, dos_date = _dos_time(self.mtime)
+        extra = b''
+        size_field = 0
+        if self.zip64:
+            # 大小未知（写在数据描述符中），ZIP64 扩展字段中的大小为 0，表示数据描述符使用 8 字节大小
+            extra = struct.pack('<HHQQ', 0x0001, 16, 0, 0)
+            size_field = ZIP64_LIMIT
+        return LOCAL_HEADER.pack(0x04034b50, 45 if self.zip64 else 20, GENERAL_FLAGS, 0, dos_time, dos_date,
+                                 0, size_field, size_field, len(self.name), len(extra)) + self.name + extra
+
+    def local_header_size(self):
+        return LOCAL_HEADER.size + len(self.name) + (20 if self.zip64 else 0)
+
+    def data_descriptor(self):
+        if self.zip64:
+            return DATA_DESCRIPTOR64.pack(0x08074b50, self.crc, self.size, self.size)
+        return DATA_DESCRIPTOR.pack(0x08074b50, self.crc, self.size, self.size)
+
+    def data_descriptor_size(self):
+        return DATA_DESCRIPTOR64.size if self.zip64 else DATA_DESCRIPTOR.size
+
+    def central_header(self):
+        dos_time, dos_date = _dos_time(self.mtime)
+        size_field = ZIP64_LIMIT if self.zip64 else self.size
+        offset_field = self.offset
+        zip64_values = [self.size, self.size] if self.zip64 else []
+        if self.offset >= ZIP64_LIMIT:
+            offset_field = ZIP64_LIMIT
+            zip64_values.append(self.offset)
+        extra = b''
+        if zip64_values:
+            extra = struct.pack(f'<HH{len(zip64_values)}Q', 0x0001, 8 * len(zip64_values), *zip64_values)
+        version = 45 if zip64_values else 20
+        return CENTRAL_HEADER.pack(0x02014b50, VERSION_MADE_BY, version, GENERAL_FLAGS, 0, dos_time, dos_date,
+                                   self.crc, size_field, size_field, len(self.name), len(extra), 0, 0, 0,
+                                   EXTERNAL_ATTRIBUTES, offset_field) + self.name + extra
+
+    def central_header_size(self):
+        fields = (2 if self.zip64 else 0) + (1 if self.offset >= ZIP64_LIMIT else 0)
+        return CENTRAL_HEADER.size + len(self.name) + (4 + 8 * fields if fields else 0)
+
+    def open(self):
+        file = open(self.path, 'rb')
+        stat = os.fstat(file.fileno())
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self.identity:
+            file.close()
+            raise ZipStreamError(f'文件在打包过程中被修改: {self.arcname}')
+        return file
+
+    # 读取整个文件计算 CRC（续传时跳过了该条目的数据，且缓存中没有 CRC）
+    def compute_crc(self):
+        if self.crc is None:
+            crc = 0
+            with self.open() as file:
+                while True:
+                    data = file.read(READ_CHUNK_SIZE)
+                    if not data:
+                        break
+                    crc = zlib.crc32(data, crc)
+            self.crc = crc
+            _store_crc(self.identity, crc)
+        return self.crc
+
+
+class ZipArchive:
+    # files: [(压缩包内文件名, 文件路径, os.stat 结果), ...]
+    def __init__(self, files):
+        self.entries = [ZipEntry(arcname, path, stat) for arcname, path, stat in files]
+        position = 0
+        for entry in self.entries:
+            entry.offset = position
+            position += entry.local_header_size() + entry.size + entry.data_descriptor_size()
+        self.central_offset = position
+        self.central_size = sum(entry.central_header_size() for entry in self.entries)
+        self.zip64_end = (len(self.entries) > ZIP64_COUNT_LIMIT or self.central_offset >= ZIP64_LIMIT
+                          or self.central_size >= ZIP64_LIMIT)
+        self.size = self.central_offset + self.central_size + len(self._end_records())
+        self.mtime = max((entry.mtime for entry in self.entries), default=time.time())
+
+    # 由压缩包内容（文件名、大小、修改时间、inode）确定的 ETag，内容不变时续传可以使用 If-Range
+    def etag(self):
+        digest = hashlib.sha256()
+        for entry in self.entries:
+            digest.update(entry.name + b'\0' + repr(entry.identity).encode('ascii') + b'\0')
+        return f'"zip-{digest.hexdigest()[:32]}"'
+
+    def _end_records(self):
+        count = len(self.entries)
+        end_offset = self.central_offset + self.central_size
+        records = b''
+        if self.zip64_end:
+            records += END_RECORD64.pack(0x06064b50, END_RECORD64.size - 12, VERSION_MADE_BY, 45, 0, 0,
+                                         count, count, self.central_size, self.central_offset)
+            records += END_LOCATOR64.pack(0x07064b50, 0, end_offset, 1)
+        return records + END_RECORD.pack(0x06054b50, 0, 0, min(count, ZIP64_COUNT_LIMIT),
+                                         min(count, ZIP64_COUNT_LIMIT), min(self.central_size, ZIP64_LIMIT),
+                                         min(self.central_offset, ZIP64_LIMIT), 0)
+
+    # 生成 [start, end) 区间的内容
+    def iter_range(self, start, end):
+        for entry in self.entries:
+            if entry.offset >= end:
+                return
+            header_end = entry.offset + entry.local_header_size()
+            data_end = header_end + entry.size
+            entry_end = data_end + entry.data_descriptor_size()
+            if entry_end <= start:
+                continue
+            if start < header_end:
+                yield entry.local_header()[max(start - entry.offset, 0):end - entry.offset]
+            if start < data_end and end > header_end:
+                yield from self._iter_data(entry, max(start, header_end) - header_end,
+                                           min(end, data_end) - header_end)
+            if end > data_end:
+                entry.compute_crc()
+                yield entry.data_descriptor()[max(start - data_end, 0):end - data_end]
+
+        if end > self.central_offset:
+            for entry in self.entries:
+                entry.compute_crc()
+            trailer = b''.join(entry.central_header() for entry in self.entries) + self._end_records()
+            yield trailer[max(start - self.central_offset, 0):end - self.central_offset]
+
+    # 发送条目数据 [first, last)；发送整个文件时同时计算 CRC
+    def _iter_data(self, entry, first, last):
+        whole = first == 0 and last == entry.size and entry.crc is None
+        crc = 0
+        with entry.open() as file:
+            file.seek(first)
+            remaining = last - first
+            while remaining > 0:
+                data = file.read(min(READ_CHUNK_SIZE, remaining))
+                if not data:
+                    raise ZipStreamError(f'文件在打包过程中被截断: {entry.arcname}')
+                remaining -= len(data)
+                if whole:
+                    crc = zlib.crc32(data, crc)
+                yield data
+        if whole:
+            entry.crc = crc
+            _store_crc(entry.identity, crc)
@@ -0,0 +1,134 @@
+# faststart 基准测试：生成 moov 位于末尾的 MP4（或使用 --input 指定的文件），执行 faststart 重排，
+# 记录重排耗时和峰值内存，并按网络条件估算支持 Range 的播放器开始播放前的请求数、传输字节数与等待时间。
+#
+# 估算模型：播放器从头顺序读取；遇到 mdat 时若还没有 moov，放弃当前响应（已在途的约一个带宽时延积的数据作废），
+# 用 Range 请求跳到 moov，再用 Range 请求第一个样本所在分块。moov 在前时一个请求即可连续读到首帧数据。
+# 等待时间 = 请求数 × RTT + 传输字节数 / 带宽
+#
+# 用法：python benchmarks/bench_faststart.py --size-mb 200
+#       python benchmarks/bench_faststart.py --input phone_recording.mp4
+import argparse
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Web_Server'))
+
+from mp4_tools import Box, chunk_offset_boxes, faststart, read_chunk_offsets, read_moov, read_top_level_boxes
+
+# 网络条件：(名称, 带宽 Mbit/s, RTT 毫秒)
+NETWORKS = [('wifi', 100, 20), ('4g', 20, 60), ('3g', 2, 200)]
+SAMPLE_SIZE = 64 * 1024
+FPS = 25
+
+
+def full_box(box_type, payload, version=0):
+    return Box(box_type, struct.pack('>I', version << 24) + payload)
+
+
+# 生成只有一条视频轨、每个分块一个样本的 MP4，moov 位于 mdat 之后（与手机录制的文件布局相同）
+def build_moov_last_mp4(path, size):
+    samples = max(1, size // SAMPLE_SIZE)
+    mdat_header = 16
+    offsets = [32 + mdat_header + i * SAMPLE_SIZE for i in range(samples)]
+
+    stbl = Box(b'stbl', None, [
+        full_box(b'stsd', struct.pack('>I', 1) + Box(b'avc1', bytes(78)).to_bytes()),
+        full_box(b'stts', struct.pack('>III', 1, samples, 1)),
+        full_box(b'stsc', struct.pack('>IIII', 1, 1, 1, 1)),
+        full_box(b'stsz', struct.pack('>II', SAMPLE_SIZE, samples)),
+        full_box(b'stco', struct.pack(f'>I{samples}I', samples, *offsets)),
+    ])
+    trak = Box(b'trak', None, [
+        full_box(b'tkhd', bytes(76) + struct.pack('>II', 1920 << 16, 1080 << 16)),
+        Box(b'mdia', None, [
+            full_box(b'mdhd', struct.pack('>IIIII', 0, 0, FPS, samples, 0)),
+            full_box(b'hdlr', struct.pack('>I4s', 0, b'vide') + bytes(13)),
+            Box(b'minf', None, [stbl]),
+        ]),
+    ])
+    moov = Box(b'moov', None, [
+        full_box(b'mvhd', struct.pack('>IIII', 0, 0, FPS, samples) + bytes(80)),
+        trak,
+    ])
+
+    block = os.urandom(SAMPLE_SIZE)
+    with open(path, 'wb') as f:
+        f.write(Box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2avc1mp41').to_bytes())
+        f.write(struct.pack('>I4sQ', 1, b'mdat', mdat_header + samples * SAMPLE_SIZE))
+        for _ in range(samples):
+            f.write(block)
+        f.write(moov.to_bytes())
+
+
+# 估算开始播放前需要的请求数和传输字节数
+def playback_start_cost(path, bandwidth, rtt):
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        boxes = read_top_level_boxes(f, size)
+        moov, moov_start, moov_size = read_moov(f, boxes)
+    first_chunk = min(read_chunk_offsets(box)[0] for box in chunk_offset_boxes(moov))
+    mdat_start = next(offset for box_type, offset, _ in boxes if box_type == b'mdat')
+
+    if moov_start < mdat_start:
+        return 1, first_chunk + SAMPLE_SIZE
+    # 第一个响应读到 mdat 头后放弃，已在途的数据约为一个带宽时延积
+    in_flight = int(bandwidth * rtt)
+    return 3, mdat_start + 16 + in_flight + moov_size + SAMPLE_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MP4 faststart 重排耗时与首帧等待时间估算')
+    parser.add_argument('--size-mb', type=int, default=200)
+    parser.add_argument('--input', help='使用已有的 MP4 文件（moov 需位于末尾）')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench-faststart-')
+    try:
+        source = args.input or os.path.join(work_dir, 'moov_last.mp4')
+        if not args.input:
+            build_moov_last_mp4(source, args.size_mb * 1024 * 1024)
+        target = os.path.join(work_dir, 'faststart.mp4')
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(target, 'wb') as f:
+            faststart(source, f)
+        elapsed = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        networks = {}
+        for name, mbit, rtt_ms in NETWORKS:
+            bandwidth = mbit * 1000 * 1000 / 8
+            rtt = rtt_ms / 1000
+            result = {}
+            for label, path in (('moov_last', source), ('faststart', target)):
+                requests, transferred = playback_start_cost(path, bandwidth, rtt)
+                result[label] = {
+                    'requests': requests,
+                    'bytes': transferred,
+                    'time_to_first_frame_ms': round((requests * rtt + transferred / bandwidth) * 1000, 1)
+                }
+            result['improvement_ms'] = round(result['moov_last']['time_to_first_frame_ms']
+                                             - result['faststart']['time_to_first_frame_ms'], 1)
+            networks[name] = result
+
+        print(json.dumps({
+            'file_size_mb': round(os.path.getsize(source) / 1024 / 1024, 1),
+            'remux_seconds': round(elapsed, 3),
+            'remux_throughput_mb_s': round(os.path.getsize(source) / 1024 / 1024 / elapsed, 1),
+            'remux_peak_python_memory_mb': round(peak_memory / 1024 / 1024, 2),
+            'networks': networks
+        }, ensure_ascii=False, indent=2))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
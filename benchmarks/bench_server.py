@@ -0,0 +1,139 @@
+# 服务器模式基准测试：分别以 Flask 开发服务器和 gunicorn 生产模式启动服务，
+# 用多个并发客户端反复下载同一文件，比较总吞吐量和请求延迟。
+#
+# 用法：python benchmarks/bench_server.py --size-mb 50 --clients 16 --requests 8
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Web_Server', 'video_server.py')
+FILENAME = '20250101_000000_0badc0de_bench.mp4'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'服务器未在 {timeout} 秒内启动')
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run_clients(port, clients, requests_per_client):
+    latencies = []
+    errors = []
+    received = [0]
+    lock = threading.Lock()
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        try:
+            for _ in range(requests_per_client):
+                start = time.perf_counter()
+                conn.request('GET', f'/files/{FILENAME}')
+                response = conn.getresponse()
+                size = 0
+                while True:
+                    data = response.read(1024 * 1024)
+                    if not data:
+                        break
+                    size += len(data)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    if response.status != 200:
+                        errors.append(response.status)
+                    latencies.append(elapsed)
+                    received[0] += size
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'seconds': round(elapsed, 3),
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput_mb_s': round(received[0] / 1024 / 1024 / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None
+    }
+
+
+def bench_mode(mode, video_dir, args):
+    port = free_port()
+    env = dict(os.environ, VIDEO_DIR=video_dir, INDEX_RECONCILE_INTERVAL='0')
+    command = [sys.executable, SERVER_SCRIPT, '--server', mode, '--host', '127.0.0.1', '--port', str(port),
+               '--threads', str(args.threads), '--workers', str(args.workers)]
+    process = subprocess.Popen(command, env=env, cwd=os.path.dirname(SERVER_SCRIPT),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        return run_clients(port, args.clients, args.requests)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='开发服务器与生产模式并发下载吞吐量对比')
+    parser.add_argument('--size-mb', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=8, help='每个客户端的下载次数')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--modes', default='dev,gunicorn')
+    args = parser.parse_args()
+
+    video_dir = tempfile.mkdtemp(prefix='bench-server-')
+    try:
+        with open(os.path.join(video_dir, FILENAME), 'wb') as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+
+        results = {mode: bench_mode(mode, video_dir, args) for mode in args.modes.split(',')}
+        print(json.dumps({
+            'size_mb': args.size_mb,
+            'clients': args.clients,
+            'requests_per_client': args.requests,
+            'results': results
+        }, ensure_ascii=False, indent=2))
+    finally:
+        shutil.rmtree(video_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
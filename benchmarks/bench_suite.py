@@ -0,0 +1,588 @@
+# 基准测试套件：合成指定规模（1k/10k/100k/1m 个文件，按 FILE_TYPES 各类文件混合）的文件目录，启动本地服务实例，
+# 并发执行上传、整文件/Range 下载和列表类接口（/api/files、/api/stats、/videos）请求，
+# 记录各场景的吞吐量、p50/p99 延迟、服务启动耗时以及服务进程的峰值内存（RSS），结果保存为 JSON，可与之前的结果比较。
+#
+# 合成目录按种子确定（文件名、大小、上传时间均可复现），缓存在 --tree-dir 中供后续运行复用；
+# 除少量整文件下载用的数据文件外都是稀疏文件，几乎不占用磁盘空间。每次运行前删除服务生成的元数据目录与缓存，
+# 启动耗时包含从磁盘重建元数据目录，测试前等待后台搜索索引建立完成；上传的文件在测试结束后删除。
+#
+# 用法：python benchmarks/bench_suite.py run --sizes 1k,100k --output baseline.json
+#       python benchmarks/bench_suite.py run --sizes 100k --output current.json --baseline baseline.json
+#       python benchmarks/bench_suite.py compare baseline.json current.json --threshold 10
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Web_Server')
+sys.path.insert(0, SERVER_DIR)
+
+from storage_layout import StorageLayout
+
+SERVER_SCRIPT = os.path.join(SERVER_DIR, 'video_server.py')
+TREE_SIZES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+TREE_FORMAT_VERSION = 1
+# 合成文件的上传时间分布在该日期之前的一年内（固定日期，保证可复现）
+TREE_BASE_TIME = datetime(2025, 1, 1)
+
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+# 合成文件的类型分布（覆盖 FILE_TYPES 中的各类文件）：(扩展名, 权重, 最小大小, 最大大小)，大小按对数均匀分布
+FILE_MIX = [
+    (['mp4', 'mov', 'mkv', 'webm', 'mp3', 'wav'], 20, 1 * MB, 2 * GB),
+    (['pdf', 'docx', 'txt', 'csv', 'xlsx', 'pptx'], 35, 1 * KB, 20 * MB),
+    (['jpg', 'png', 'gif', 'webp'], 30, 20 * KB, 8 * MB),
+    (['zip', 'json', 'py', 'html', 'js', 'tar'], 15, 1 * KB, 100 * MB),
+]
+# 整文件下载使用的实际数据文件数；Range 下载从大于 RANGE_TARGET_MIN_SIZE 的音视频文件中随机选取
+DOWNLOAD_FIXTURES = 8
+RANGE_TARGETS = 200
+RANGE_TARGET_MIN_SIZE = 16 * MB
+RANGE_SIZE = 256 * KB
+LIST_PER_PAGE = 50
+UPLOAD_EXTENSIONS = ['mp4', 'jpg', 'pdf', 'txt', 'zip']
+
+# 场景执行顺序：只读场景在前，上传场景最后（上传的文件在结束后删除，目录恢复原状）
+SCENARIOS = ['stats', 'list_files', 'videos', 'download_full', 'download_range', 'upload']
+# 各场景的默认最大请求数（/videos 返回全部文件，大目录下单次请求很慢）
+SCENARIO_MAX_REQUESTS = {'videos': 20}
+
+SERVER_STATE_FILES = ['.catalog.db', '.catalog.db-wal', '.catalog.db-shm',
+                      '.search.db', '.search.db-wal', '.search.db-shm',
+                      '.blobs.db', '.blobs.db-wal', '.blobs.db-shm', '.bandwidth.json']
+SERVER_STATE_DIRS = ['.compressed', '.thumbs', '.sessions', '.blobs']
+TREE_MARKER = '.benchmark-tree.json'
+
+
+def parse_size(value):
+    value = value.strip().lower()
+    if value in TREE_SIZES:
+        return TREE_SIZES[value]
+    return int(value)
+
+
+def size_label(count):
+    for label, size in TREE_SIZES.items():
+        if size == count:
+            return label
+    return str(count)
+
+
+# ---------- 合成文件目录 ----------
+
+def _pick_file(rng, index):
+    extensions, _, min_size, max_size = rng.choices(FILE_MIX, weights=[group[1] for group in FILE_MIX])[0]
+    extension = rng.choice(extensions)
+    size = int(2 ** rng.uniform(math.log2(min_size), math.log2(max_size)))
+    upload_time = TREE_BASE_TIME - timedelta(seconds=rng.randrange(365 * 86400))
+    filename = f"{upload_time.strftime('%Y%m%d_%H%M%S')}_{rng.getrandbits(32):08x}_file{index}.{extension}"
+    return filename, size
+
+
+# 生成（或复用）count 个文件的目录，返回目录信息 {'files', 'fixtures', 'range_targets'}
+def synthesize_tree(root, count, seed, download_size):
+    marker_path = os.path.join(root, TREE_MARKER)
+    expected = {'version': TREE_FORMAT_VERSION, 'files': count, 'seed': seed, 'download_size': download_size}
+    try:
+        with open(marker_path, encoding='utf-8') as f:
+            info = json.load(f)
+        if {key: info.get(key) for key in expected} == expected:
+            print(f"♻️ 复用已生成的目录: {root}")
+            return info
+    except (OSError, ValueError):
+        pass
+
+    print(f"🏗️ 生成 {count} 个文件: {root}")
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root)
+    layout = StorageLayout(root)
+    rng = random.Random(seed)
+    range_targets = []
+    started = time.perf_counter()
+    for index in range(count):
+        filename, size = _pick_file(rng, index)
+        with open(layout.new_path(filename), 'wb') as f:
+            f.truncate(size)
+        if size >= RANGE_TARGET_MIN_SIZE and filename.rsplit('.', 1)[1] in ('mp4', 'mov', 'mkv', 'webm'):
+            if len(range_targets) < RANGE_TARGETS:
+                range_targets.append({'filename': filename, 'size': size})
+        if (index + 1) % 100000 == 0:
+            print(f"   {index + 1}/{count} ({time.perf_counter() - started:.0f}s)")
+
+    fixtures = []
+    for index in range(DOWNLOAD_FIXTURES):
+        filename = f"{TREE_BASE_TIME.strftime('%Y%m%d_%H%M%S')}_{index:08x}_download{index}.mp4"
+        with open(layout.new_path(filename), 'wb') as f:
+            f.write(rng.randbytes(download_size))
+        fixtures.append(filename)
+
+    info = dict(expected, fixtures=fixtures, range_targets=range_targets)
+    with open(marker_path, 'w', encoding='utf-8') as f:
+        json.dump(info, f)
+    return info
+
+
+# 删除服务生成的状态（元数据目录、搜索索引、缓存），每次运行都从相同的初始状态启动
+def reset_server_state(root):
+    for name in SERVER_STATE_FILES:
+        try:
+            os.remove(os.path.join(root, name))
+        except FileNotFoundError:
+            pass
+    for name in SERVER_STATE_DIRS:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+# ---------- 服务进程 ----------
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# 进程及其所有子进程（gunicorn 工作进程）的 RSS 之和（字节），仅支持 Linux（/proc）
+def process_tree_rss(pid):
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class ServerProcess:
+    def __init__(self, root, port, server_mode, log_path=None, env=None):
+        self.root = root
+        self.port = port
+        self.server_mode = server_mode
+        self.log_path = log_path
+        self.env = env or {}
+        self.process = None
+        self.peak_rss = 0
+        self._stop_event = threading.Event()
+        self._monitor = None
+
+    def start(self, timeout):
+        env = dict(os.environ, VIDEO_DIR=self.root, INDEX_RECONCILE_INTERVAL='0', PYTHONUNBUFFERED='1', **self.env)
+        log = open(self.log_path, 'ab') if self.log_path else subprocess.DEVNULL
+        started = time.perf_counter()
+        self.process = subprocess.Popen(
+            [sys.executable, SERVER_SCRIPT, '--server', self.server_mode, '--host', '127.0.0.1',
+             '--port', str(self.port)],
+            cwd=SERVER_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+        if log is not subprocess.DEVNULL:
+            log.close()
+        self._monitor = threading.Thread(target=self._monitor_rss, daemon=True)
+        self._monitor.start()
+
+        client = Client(self.port)
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'服务进程退出（返回码 {self.process.returncode}），可用 --server-log 查看输出')
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError('等待服务启动超时')
+            try:
+                if client.request('GET', '/api/stats')[0] == 200:
+                    return time.perf_counter() - started
+            except OSError:
+                pass
+            time.sleep(0.2)
+
+    # 等待后台任务（搜索索引建立）完成，返回等待时间
+    def wait_idle(self, timeout):
+        started = time.perf_counter()
+        client = Client(self.port)
+        while time.perf_counter() - started < timeout:
+            status, _, body = client.request('GET', '/metrics', keep_body=True)
+            pending = None
+            if status == 200:
+                for line in body.decode('utf-8').splitlines():
+                    if line.startswith('search_index_pending '):
+                        pending = float(line.split()[1])
+            if not pending:
+                return time.perf_counter() - started
+            time.sleep(0.5)
+        print("⚠️ 等待后台任务超时，继续测试")
+        return time.perf_counter() - started
+
+    def _monitor_rss(self):
+        while not self._stop_event.wait(0.1):
+            self.peak_rss = max(self.peak_rss, process_tree_rss(self.process.pid))
+
+    def stop(self):
+        self._stop_event.set()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+
+# ---------- 客户端 ----------
+
+# 每个并发线程一个 HTTP 连接（keep-alive，服务端关闭连接时重新建立）
+class Client:
+    def __init__(self, port, timeout=600):
+        self.port = port
+        self.timeout = timeout
+        self.connection = None
+
+    # 返回 (状态码, 响应体字节数, 响应体)；keep_body 为 False 时只计数不保留响应体
+    def request(self, method, path, body=None, headers=None, keep_body=False):
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, path, body=body, headers=headers or {})
+                response = self.connection.getresponse()
+                chunks = []
+                received = 0
+                while True:
+                    chunk = response.read(MB)
+                    if not chunk:
+                        break
+                    received += len(chunk)
+                    if keep_body:
+                        chunks.append(chunk)
+                if response.will_close:
+                    self.close()
+                return response.status, received, b''.join(chunks)
+            except (ConnectionError, http.client.HTTPException):
+                # keep-alive 连接已被服务端关闭，重新连接后重试一次
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    # 最近秩法
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+# 以 concurrency 个线程执行 make_request(client, rng, index)（返回 (状态码, 字节数)），
+# 直到达到 duration 秒或 max_requests 个请求
+def run_scenario(port, make_request, concurrency, duration, max_requests, seed):
+    counter = itertools.count()
+    results = []
+    results_lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def worker(worker_index):
+        client = Client(port)
+        rng = random.Random(seed * 1000 + worker_index)
+        latencies = []
+        errors = 0
+        transferred = 0
+        try:
+            while time.perf_counter() < deadline:
+                index = next(counter)
+                if max_requests is not None and index >= max_requests:
+                    break
+                request_start = time.perf_counter()
+                try:
+                    status, size = make_request(client, rng, index)
+                    if status >= 400:
+                        errors += 1
+                    transferred += size
+                except OSError:
+                    errors += 1
+                    client.close()
+                latencies.append(time.perf_counter() - request_start)
+        finally:
+            client.close()
+            with results_lock:
+                results.append((latencies, errors, transferred))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for worker_latencies, _, _ in results for latency in worker_latencies)
+    count = len(latencies)
+    transferred = sum(size for _, _, size in results)
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        'requests': count,
+        'errors': sum(errors for _, errors, _ in results),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0,
+        'throughput_mbps': round(transferred / MB / elapsed, 2) if elapsed else 0,
+        'latency_ms': {
+            'mean': ms(sum(latencies) / count) if count else None,
+            'p50': ms(percentile(latencies, 0.50)),
+            'p90': ms(percentile(latencies, 0.90)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(latencies[-1]) if latencies else None,
+        }
+    }
+
+
+def multipart_body(filename, payload, boundary):
+    return (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8') + payload + \
+        f'\r\n--{boundary}--\r\n'.encode('ascii')
+
+
+# 各场景的请求函数：返回 (状态码, 传输字节数)
+def build_scenarios(tree, args, uploaded, uploaded_lock):
+    total_pages = max(1, (tree['files'] + len(tree['fixtures'])) // LIST_PER_PAGE)
+    range_targets = tree['range_targets'] or [{'filename': name, 'size': args.download_size}
+                                              for name in tree['fixtures']]
+    boundary = 'benchmark-boundary-7d4a1c'
+    payload = random.Random(args.seed).randbytes(args.upload_size)
+
+    def stats(client, rng, index):
+        return client.request('GET', '/api/stats')[:2]
+
+    def list_files(client, rng, index):
+        sort = ('date', 'size', 'name')[index % 3]
+        return client.request('GET', f'/api/files?page={rng.randint(1, total_pages)}'
+                                     f'&per_page={LIST_PER_PAGE}&sort={sort}')[:2]
+
+    def videos(client, rng, index):
+        return client.request('GET', '/videos')[:2]
+
+    def download_full(client, rng, index):
+        return client.request('GET', f"/files/{rng.choice(tree['fixtures'])}")[:2]
+
+    def download_range(client, rng, index):
+        target = rng.choice(range_targets)
+        start = rng.randrange(max(1, target['size'] - RANGE_SIZE))
+        return client.request('GET', f"/files/{target['filename']}",
+                              headers={'Range': f'bytes={start}-{start + RANGE_SIZE - 1}'})[:2]
+
+    def upload(client, rng, index):
+        body = multipart_body(f'benchmark_{index}.{UPLOAD_EXTENSIONS[index % len(UPLOAD_EXTENSIONS)]}',
+                              payload, boundary)
+        status, size, data = client.request(
+            'POST', '/upload', body=body, keep_body=True,
+            headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+        if status == 200:
+            with uploaded_lock:
+                uploaded.append(json.loads(data)['filename'])
+        return status, len(body)
+
+    return {'stats': stats, 'list_files': list_files, 'videos': videos, 'download_full': download_full,
+            'download_range': download_range, 'upload': upload}
+
+
+def delete_uploaded(port, filenames):
+    client = Client(port)
+    for i in range(0, len(filenames), 1000):
+        body = json.dumps({'filenames': filenames[i:i + 1000]}).encode('utf-8')
+        client.request('POST', '/api/files/batch/delete', body=body, headers={'Content-Type': 'application/json'})
+    client.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVER_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(args):
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            raise SystemExit(f'未知场景: {name}（可选: {", ".join(SCENARIOS)}）')
+
+    result = {
+        'version': 1,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'commit': git_commit(),
+            'server': args.server,
+            'file_catalog': os.environ.get('FILE_CATALOG', 'sqlite'),
+        },
+        'config': {
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'upload_size': args.upload_size,
+            'download_size': args.download_size,
+            'seed': args.seed,
+            'scenarios': scenarios,
+        },
+        'runs': {}
+    }
+
+    for count in [parse_size(size) for size in args.sizes.split(',')]:
+        label = size_label(count)
+        root = os.path.join(args.tree_dir, label)
+        tree = synthesize_tree(root, count, args.seed, args.download_size)
+        reset_server_state(root)
+
+        server = ServerProcess(root, free_port(), args.server, log_path=args.server_log)
+        try:
+            startup = server.start(args.startup_timeout)
+            print(f"🚀 [{label}] 服务已启动: {startup:.2f}s")
+            settle = server.wait_idle(args.settle_timeout)
+            run = {'files': count, 'startup_seconds': round(startup, 3), 'settle_seconds': round(settle, 3),
+                   'scenarios': {}}
+
+            uploaded = []
+            request_functions = build_scenarios(tree, args, uploaded, threading.Lock())
+            for name in SCENARIOS:
+                if name not in scenarios:
+                    continue
+                max_requests = args.max_requests or SCENARIO_MAX_REQUESTS.get(name)
+                summary = run_scenario(server.port, request_functions[name], args.concurrency, args.duration,
+                                       max_requests, args.seed)
+                run['scenarios'][name] = summary
+                latency = summary['latency_ms']
+                print(f"   {name:<15} {summary['throughput_rps']:>9.1f} req/s {summary['throughput_mbps']:>9.1f} MB/s"
+                      f"  p50 {latency['p50']} ms  p99 {latency['p99']} ms  错误 {summary['errors']}")
+            if uploaded:
+                delete_uploaded(server.port, uploaded)
+            run['peak_rss_bytes'] = server.peak_rss or None
+            print(f"   峰值内存: {server.peak_rss / MB:.1f} MB")
+        finally:
+            server.stop()
+        result['runs'][label] = run
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"✅ 结果已保存: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        return 1 if compare_results(baseline, result, args.threshold) else 0
+    return 0
+
+
+# ---------- 比较 ----------
+
+# (名称, 取值函数, 越大越好)
+COMPARED_METRICS = [
+    ('throughput_rps', lambda s: s['throughput_rps'], True),
+    ('p50_ms', lambda s: s['latency_ms']['p50'], False),
+    ('p99_ms', lambda s: s['latency_ms']['p99'], False),
+]
+
+
+# 打印两次结果的差异，返回变差超过 threshold（百分比）的项目列表
+def compare_results(baseline, current, threshold):
+    regressions = []
+    for section in ('config', 'environment'):
+        for key, value in current.get(section, {}).items():
+            if key not in ('commit', 'scenarios') and baseline.get(section, {}).get(key) != value:
+                print(f"⚠️ 两次运行的 {key} 不同: {baseline.get(section, {}).get(key)} -> {value}，结果可能不可比")
+    print(f"基准: {baseline.get('environment', {}).get('commit')} ({baseline.get('created')})  "
+          f"当前: {current.get('environment', {}).get('commit')} ({current.get('created')})")
+
+    def report(label, name, old, new, higher_is_better):
+        if old is None or new is None:
+            return
+        change = (new - old) / old * 100 if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = '⚠️' if worse > threshold else ('✅' if -worse > threshold else '  ')
+        print(f"{flag} {label:<28} {name:<16} {old:>12.2f} -> {new:>12.2f}  ({change:+.1f}%)")
+        if worse > threshold:
+            regressions.append((label, name, change))
+
+    for size, run in current['runs'].items():
+        base_run = baseline.get('runs', {}).get(size)
+        if base_run is None:
+            continue
+        for name, summary in run['scenarios'].items():
+            base_summary = base_run['scenarios'].get(name)
+            if base_summary is None:
+                continue
+            for metric, value, higher_is_better in COMPARED_METRICS:
+                report(f'{size}/{name}', metric, value(base_summary), value(summary), higher_is_better)
+        report(f'{size}', 'startup_seconds', base_run.get('startup_seconds'), run.get('startup_seconds'), False)
+        if base_run.get('peak_rss_bytes') and run.get('peak_rss_bytes'):
+            report(f'{size}', 'peak_rss_mb', base_run['peak_rss_bytes'] / MB, run['peak_rss_bytes'] / MB, False)
+
+    if regressions:
+        print(f"⚠️ {len(regressions)} 项变差超过 {threshold}%")
+    else:
+        print(f"✅ 没有变差超过 {threshold}% 的项目")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文件服务基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='生成目录、启动服务并执行测试')
+    run_parser.add_argument('--sizes', default='1k', help='目录规模，逗号分隔：1k、10k、100k、1m 或文件数（默认 1k）')
+    run_parser.add_argument('--tree-dir', default=os.path.join(os.getcwd(), 'benchmark-trees'),
+                            help='合成目录的保存位置（可复用，默认 ./benchmark-trees）')
+    run_parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='执行的场景，逗号分隔')
+    run_parser.add_argument('--concurrency', type=int, default=8, help='并发请求数')
+    run_parser.add_argument('--duration', type=float, default=10, help='每个场景的持续时间（秒）')
+    run_parser.add_argument('--max-requests', type=int, default=None, help='每个场景的最大请求数')
+    run_parser.add_argument('--upload-size', type=int, default=1 * MB, help='上传文件大小（字节）')
+    run_parser.add_argument('--download-size', type=int, default=4 * MB, help='整文件下载的文件大小（字节）')
+    run_parser.add_argument('--seed', type=int, default=1, help='随机种子（目录内容与请求序列）')
+    run_parser.add_argument('--server', choices=['dev', 'gunicorn'], default='dev', help='服务运行模式')
+    run_parser.add_argument('--server-log', default=None, help='服务输出保存到该文件')
+    run_parser.add_argument('--startup-timeout', type=float, default=1800, help='等待服务启动的时间（秒）')
+    run_parser.add_argument('--settle-timeout', type=float, default=1800, help='等待后台索引完成的时间（秒）')
+    run_parser.add_argument('--output', default='benchmark-result.json', help='结果文件')
+    run_parser.add_argument('--baseline', default=None, help='与该结果文件比较，变差超过阈值时返回码为 1')
+    run_parser.add_argument('--threshold', type=float, default=10, help='比较阈值（百分比）')
+
+    compare_parser = subparsers.add_parser('compare', help='比较两次测试结果')
+    compare_parser.add_argument('baseline', help='基准结果文件')
+    compare_parser.add_argument('current', help='当前结果文件')
+    compare_parser.add_argument('--threshold', type=float, default=10, help='变差超过该百分比时返回码为 1')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        sys.exit(run_benchmark(args))
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    sys.exit(1 if compare_results(baseline, current, args.threshold) else 0)
+
+
+if __name__ == '__main__':
+    main()
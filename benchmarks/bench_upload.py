@@ -0,0 +1,139 @@
+# 上传路径基准测试：对比 Werkzeug 表单解析 + file.save()（旧实现）与流式 multipart 解析（新实现）
+# 的吞吐量、峰值内存（RSS）和写入字节数。每种模式在独立子进程中运行，避免相互影响峰值内存统计。
+# legacy+hash 模式在旧实现基础上再读一遍文件计算 SHA-256，与新实现的功能对等。
+#
+# 用法：python benchmarks/bench_upload.py --size-mb 200 --rounds 3
+import argparse
+import hashlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Web_Server'))
+
+BOUNDARY = 'benchboundary7d1f0a'
+
+
+def build_body(path, size):
+    head = (f'--{BOUNDARY}\r\n'
+            'Content-Disposition: form-data; name="file"; filename="bench.mp4"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n').encode('ascii')
+    tail = f'\r\n--{BOUNDARY}--\r\n'.encode('ascii')
+    block = os.urandom(1024 * 1024)
+    with open(path, 'wb') as f:
+        f.write(head)
+        remaining = size
+        while remaining > 0:
+            f.write(block[:min(remaining, len(block))])
+            remaining -= len(block)
+        f.write(tail)
+
+
+def make_environ(body_path):
+    return {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': '/upload',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '8080',
+        'wsgi.url_scheme': 'http',
+        'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+        'CONTENT_LENGTH': str(os.path.getsize(body_path)),
+        'wsgi.input': open(body_path, 'rb'),
+    }
+
+
+# 进程通过 write 系列系统调用写出的字节数（Linux /proc/self/io 的 wchar）
+def written_bytes():
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def run_child(mode, body_path, dest_dir):
+    from werkzeug.wrappers import Request
+    from upload_stream import receive_multipart_file
+
+    environ = make_environ(body_path)
+    request = Request(environ)
+    target = os.path.join(dest_dir, 'bench.mp4')
+
+    written_before = written_bytes()
+    start = time.perf_counter()
+    if mode.startswith('legacy'):
+        request.files['file'].save(target)
+        if mode == 'legacy+hash':
+            hasher = hashlib.sha256()
+            with open(target, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(chunk)
+    else:
+        upload = receive_multipart_file(request.stream, request.content_type, dest_dir)
+        os.replace(upload['temp_path'], target)
+    elapsed = time.perf_counter() - start
+    written_after = written_bytes()
+    environ['wsgi.input'].close()
+
+    size = os.path.getsize(target)
+    os.remove(target)
+    # Linux 下 ru_maxrss 单位为 KB
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    written = written_after - written_before if written_before is not None else None
+    print(json.dumps({'seconds': elapsed, 'size': size, 'peak_rss_kb': peak_rss_kb, 'written': written}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='上传路径吞吐量与峰值内存基准测试')
+    parser.add_argument('--size-mb', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--child', choices=['legacy', 'legacy+hash', 'streaming'])
+    parser.add_argument('--body')
+    parser.add_argument('--dest')
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.body, args.dest)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='bench-upload-')
+    try:
+        body_path = os.path.join(work_dir, 'body.bin')
+        dest_dir = os.path.join(work_dir, 'files')
+        os.makedirs(dest_dir)
+        build_body(body_path, args.size_mb * 1024 * 1024)
+
+        results = {}
+        for mode in ('legacy', 'legacy+hash', 'streaming'):
+            runs = []
+            for _ in range(args.rounds):
+                output = subprocess.check_output([
+                    sys.executable, __file__, '--child', mode,
+                    '--body', body_path, '--dest', dest_dir
+                ])
+                runs.append(json.loads(output))
+            best = min(run['seconds'] for run in runs)
+            results[mode] = {
+                'best_seconds': round(best, 3),
+                'throughput_mb_s': round(args.size_mb / best, 1),
+                'peak_rss_mb': round(max(run['peak_rss_kb'] for run in runs) / 1024, 1),
+                'written_mb': (round(runs[0]['written'] / 1024 / 1024, 1)
+                               if runs[0]['written'] is not None else None)
+            }
+
+        print(json.dumps({'size_mb': args.size_mb, 'rounds': args.rounds, 'results': results},
+                         ensure_ascii=False, indent=2))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()